@@ -2,6 +2,7 @@ import streamlit as st
 import pandas as pd
 import os
 from src.SecondModule.module2 import SimilarQuestionGenerator
+from src.data_store import load_train_data
 import logging
 from typing import Optional, Tuple
 
@@ -47,7 +48,7 @@ def load_question_generator():
 def load_data(data_file = '/train.csv'):
     try:
         file_path = os.path.join(data_path, data_file.lstrip('/'))
-        df = pd.read_csv(file_path)
+        df = load_train_data(file_path)
         logger.info(f"Data loaded successfully from {file_path}")
         return df
     except FileNotFoundError:
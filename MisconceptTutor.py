@@ -2,6 +2,8 @@ import streamlit as st
 import pandas as pd
 import os
 from src.SecondModule.module2 import SimilarQuestionGenerator
+from src.data_store import load_train_data
+from src.question_bank import QuestionBank
 import logging
 from typing import Optional, Tuple
 logging.basicConfig(level=logging.DEBUG)
@@ -31,7 +33,6 @@ if 'initialized' not in st.session_state:
     st.session_state.current_question_index = 0
     st.session_state.generated_questions = []
     st.session_state.current_step = 'initial'
-    st.session_state.selected_wrong_answer = None
     st.session_state.questions = []
     logger.info("Session state initialized")
 
@@ -49,7 +50,7 @@ def load_question_generator():
 def load_data(data_file = '/train.csv'):
     try:
         file_path = os.path.join(data_path, data_file.lstrip('/'))
-        df = pd.read_csv(file_path)
+        df = load_train_data(file_path)
         logger.info(f"Data loaded successfully from {file_path}")
         return df
     except FileNotFoundError:
@@ -57,14 +58,23 @@ def load_data(data_file = '/train.csv'):
         logger.error(f"File not found: {data_file}")
         return None
 
+# 문제 은행 로드 함수 (모든 세션이 공유하는 읽기 전용 인덱스)
+@st.cache_resource
+def load_question_bank(data_file = '/train.csv'):
+    df = load_data(data_file)
+    if df is None or df.empty:
+        return None
+    return QuestionBank(df)
+
 def start_quiz():
     """퀴즈 시작 및 초기화"""
-    df = load_data()
-    if df is None or df.empty:
+    bank = load_question_bank()
+    if bank is None:
         st.error("데이터를 불러올 수 없습니다. 데이터셋을 확인해주세요.")
         return
 
-    st.session_state.questions = df.sample(n=10, random_state=42)
+    # 세션에는 문제 은행의 행 위치만 저장하고, 실제 문제는 공유 문제 은행에서 조회
+    st.session_state.questions = [int(position) for position in bank.sample(10, random_state=42)]
     st.session_state.current_step = 'quiz'
     st.session_state.current_question_index = 0
     st.session_state.wrong_questions = []
@@ -208,7 +218,7 @@ def start_quiz():
 #         'explanation': f"이 문제는 Misconception ID {misconception_id}와 관련되어 있습니다."
 #     }
 
-def generate_similar_question(wrong_q, misconception_id, generator):
+def generate_similar_question(wrong_q, wrong_answer, misconception_id, generator):
     """유사 문제 생성"""
     logger.info(f"Generating similar question for misconception_id: {misconception_id}")
     
@@ -230,7 +240,7 @@ def generate_similar_question(wrong_q, misconception_id, generator):
             'subject_name': str(wrong_q.get('SubjectName', '')),
             'question_text': str(wrong_q.get('QuestionText', '')),
             'correct_answer_text': str(wrong_q.get(f'Answer{wrong_q["CorrectAnswer"]}Text', '')),
-            'wrong_answer_text': str(wrong_q.get(f'Answer{st.session_state.selected_wrong_answer}Text', '')),
+            'wrong_answer_text': str(wrong_q.get(f'Answer{wrong_answer}Text', '')),
             'misconception_id': int(misconception_id)
         }
         
@@ -261,16 +271,14 @@ def generate_similar_question(wrong_q, misconception_id, generator):
 
     return None
 
-def handle_answer(answer, current_q):
-    """답변 처리"""
+def handle_answer(answer, current_q, position):
+    """답변 처리 - 세션에는 (문제 위치, 고른 선지)와 misconception id만 저장"""
     if answer != current_q['CorrectAnswer']:
-        wrong_q_dict = current_q.to_dict()
-        st.session_state.wrong_questions.append(wrong_q_dict)
-        st.session_state.selected_wrong_answer = answer
+        st.session_state.wrong_questions.append((position, answer))
         
         misconception_key = f'Misconception{answer}Id'
         misconception_id = current_q.get(misconception_key)
-        st.session_state.misconceptions.append(misconception_id)
+        st.session_state.misconceptions.append(None if pd.isna(misconception_id) else int(misconception_id))
     
     st.session_state.current_question_index += 1
     if st.session_state.current_question_index >= 10:
@@ -292,7 +300,8 @@ def main():
 
     # 퀴즈 화면
     elif st.session_state.current_step == 'quiz':
-        current_q = st.session_state.questions.iloc[st.session_state.current_question_index]
+        position = st.session_state.questions[st.session_state.current_question_index]
+        current_q = load_question_bank().row(position)
         
         # 진행 상황 표시
         progress = st.session_state.current_question_index / 10
@@ -307,17 +316,17 @@ def main():
         col1, col2 = st.columns(2)
         with col1:
             if st.button(f"A) {current_q['AnswerAText']}", key="A"):
-                handle_answer('A', current_q)
+                handle_answer('A', current_q, position)
                 st.rerun()
             if st.button(f"C) {current_q['AnswerCText']}", key="C"):
-                handle_answer('C', current_q)
+                handle_answer('C', current_q, position)
                 st.rerun()
         with col2:
             if st.button(f"B) {current_q['AnswerBText']}", key="B"):
-                handle_answer('B', current_q)
+                handle_answer('B', current_q, position)
                 st.rerun()
             if st.button(f"D) {current_q['AnswerDText']}", key="D"):
-                handle_answer('D', current_q)
+                handle_answer('D', current_q, position)
                 st.rerun()
 
     # 복습 화면
@@ -357,11 +366,13 @@ def main():
         # 틀린 문제 분석
         if st.session_state.wrong_questions:
             st.write("### ✍️ 틀린 문제 분석")
-            for i, (wrong_q, misconception_id) in enumerate(zip(
+            bank = load_question_bank()
+            for i, ((position, wrong_answer), misconception_id) in enumerate(zip(
                 st.session_state.wrong_questions,
                 st.session_state.misconceptions
             )):
                 with st.expander(f"📝 틀린 문제 #{i + 1}"):
+                    wrong_q = bank.row(position).to_dict()
                     st.write("**📋 문제:**")
                     st.write(wrong_q['QuestionText'])
                     st.write("**✅ 정답:**", wrong_q['CorrectAnswer'])
@@ -385,7 +396,7 @@ def main():
                     if st.button(f"📚 유사 문제 풀기 #{i + 1}", key=f"retry_{i}"):
                         with st.spinner("유사 문제를 생성하고 있습니다..."):
                             logger.info(f"Generating similar question for misconception_id: {misconception_id}")
-                            new_question = generate_similar_question(wrong_q, misconception_id, generator)
+                            new_question = generate_similar_question(wrong_q, wrong_answer, misconception_id, generator)
                             if new_question:
                                 st.write("### 🎯 유사 문제")
                                 st.write(new_question['question'])
@@ -3,13 +3,10 @@ import warnings
 warnings.filterwarnings("ignore", category=DeprecationWarning)  # 경고 메시지 무시
 import streamlit as st  # 웹 애플리케이션 프레임워크
 import pandas as pd    # 데이터 처리
-import numpy as np     # 수치 연산
-import random         # 랜덤 기능
-from transformers import AutoTokenizer, AutoModelForCausalLM  # 자연어 처리 모델
-import torch          # 딥러닝 프레임워크
-from dotenv import load_dotenv  # 환경 변수 관리
 import os             # 파일 및 경로 처리
 import time 
+from src.data_store import load_train_data  # CSV 바이너리 캐시 로더
+from src.question_bank import QuestionBank  # 세션 간 공유하는 읽기 전용 문제 은행
 
 # Streamlit 페이지 기본 설정
 st.set_page_config(
@@ -25,7 +22,7 @@ def load_data(data_file = '/train.csv'):
         # Data 폴더에서 train.csv 파일 로드
         base_path = os.path.dirname(os.path.abspath(__file__))        
         data_path = os.path.join(base_path, 'Data')
-        df = pd.read_csv(data_path + data_file)
+        df = load_train_data(data_path + data_file)
         print(f"{data_file} loaded")
         return df
     
@@ -34,6 +31,14 @@ def load_data(data_file = '/train.csv'):
         st.error("train.csv 파일을 찾을 수 없습니다.")
         return None
 
+# 문제 은행 로드 함수 (모든 세션이 같은 객체를 공유)
+@st.cache_resource
+def load_question_bank(data_file = '/train.csv'):
+    df = load_data(data_file)
+    if df is None:
+        return None
+    return QuestionBank(df)
+
 # 세션 상태 초기화 함수
 def initialize_session_state():
     """
@@ -45,11 +50,11 @@ def initialize_session_state():
     if 'current_step' not in st.session_state:
         st.session_state.current_step = 'initial'  # 현재 화면 상태
     if 'questions' not in st.session_state:
-        st.session_state.questions = None  # 선택된 문제들
+        st.session_state.questions = None  # 선택된 문제들 (문제 은행 행 위치)
     if 'current_question_index' not in st.session_state:
         st.session_state.current_question_index = 0  # 현재 문제 인덱스
     if 'wrong_questions' not in st.session_state:
-        st.session_state.wrong_questions = []  # 틀린 문제 목록
+        st.session_state.wrong_questions = []  # 틀린 문제 목록 (행 위치, 고른 선지)
     if 'misconceptions' not in st.session_state:
         st.session_state.misconceptions = []  # 관련된 misconception 목록
     if 'generated_questions' not in st.session_state:
@@ -61,13 +66,13 @@ def start_quiz():
     퀴즈를 시작하기 위한 초기 설정을 수행하는 함수
     10개의 랜덤 문제를 선택하고 세션 상태를 초기화
     """
-    df = load_data()
-    if df is not None:
-        # 10개의 랜덤 문제 선택
+    bank = load_question_bank()
+    if bank is not None:
+        # 10개의 랜덤 문제 선택 (세션에는 행 위치만 저장)
                 
         #random_seed = int(time.time()) # 현재 시간을 기반으로 랜덤 시드 생성
-        st.session_state.questions = df.sample(n=10, random_state=42) # 🐯 문제 중에 제대로 안나오는 것 있어서 일단 괜찮은 42로 설정 
-        #st.session_state.questions = df.sample(n=10, random_state=random_seed)
+        st.session_state.questions = [int(p) for p in bank.sample(10, random_state=42)] # 🐯 문제 중에 제대로 안나오는 것 있어서 일단 괜찮은 42로 설정 
+        #st.session_state.questions = [int(p) for p in bank.sample(10, random_state=random_seed)]
 
         # 세션 상태 초기화
         st.session_state.started = True
@@ -78,28 +83,21 @@ def start_quiz():
         st.session_state.generated_questions = []
 
 # 답변 처리 함수
-def handle_answer(answer, current_q):
+def handle_answer(answer, current_q, position):
     """
     사용자의 답변을 처리하는 함수
     
     Parameters:
         answer (str): 사용자가 선택한 답변 (A, B, C, D)
         current_q (pandas.Series): 현재 문제의 데이터
+        position (int): 문제 은행에서의 행 위치 (세션에는 이 값만 저장)
     """
     # 오답인 경우 처리
     if answer != current_q['CorrectAnswer']:
-        st.session_state.wrong_questions.append(current_q)
+        st.session_state.wrong_questions.append((position, answer))
         # 선택한 답변에 해당하는 misconception ID 찾기
-        misconception_id = None
-        if answer == 'A':
-            misconception_id = current_q.get('MisconceptionAId')
-        elif answer == 'B':
-            misconception_id = current_q.get('MisconceptionBId')
-        elif answer == 'C':
-            misconception_id = current_q.get('MisconceptionCId')
-        elif answer == 'D':
-            misconception_id = current_q.get('MisconceptionDId')
-        st.session_state.misconceptions.append(misconception_id)
+        misconception_id = current_q.get(f'Misconception{answer}Id')
+        st.session_state.misconceptions.append(None if pd.isna(misconception_id) else int(misconception_id))
     
     # 다음 문제로 이동
     st.session_state.current_question_index += 1
@@ -126,7 +124,8 @@ def main():
 
     # 퀴즈 화면
     elif st.session_state.current_step == 'quiz':
-        current_q = st.session_state.questions.iloc[st.session_state.current_question_index]
+        position = st.session_state.questions[st.session_state.current_question_index]
+        current_q = load_question_bank().row(position)
         
         # 진행 상황 표시
         progress = st.session_state.current_question_index / 10
@@ -142,20 +141,20 @@ def main():
         # 왼쪽 열 (A, C 보기)
         with col1:
             if st.button(f"A. {current_q['AnswerAText']}", key='A', use_container_width=True):
-                handle_answer('A', current_q)
+                handle_answer('A', current_q, position)
                 st.rerun()
             
             if st.button(f"C. {current_q['AnswerCText']}", key='C', use_container_width=True):
-                handle_answer('C', current_q)
+                handle_answer('C', current_q, position)
                 st.rerun()
         # 오른쪽 열 (B, D 보기)
         with col2:
             if st.button(f"B. {current_q['AnswerBText']}", key='B', use_container_width=True):
-                handle_answer('B', current_q)
+                handle_answer('B', current_q, position)
                 st.rerun()
             
             if st.button(f"D. {current_q['AnswerDText']}", key='D', use_container_width=True):
-                handle_answer('D', current_q)
+                handle_answer('D', current_q, position)
                 st.rerun()
 
     # 복습 화면
@@ -201,11 +200,13 @@ def main():
             st.markdown("---")
             st.write("### ✍️ 틀린 문제 분석")
             # 각 틀린 문제에 대해 분석 정보 표시
-            for i, (wrong_q, misconception_id) in enumerate(zip(
+            bank = load_question_bank()
+            for i, ((position, _), misconception_id) in enumerate(zip(
                 st.session_state.wrong_questions,
                 st.session_state.misconceptions
             )):
                 with st.expander(f"📝 틀린 문제 #{i+1}"):
+                    wrong_q = bank.row(position)
                     st.write("**📋 문제:**")
                     st.write(wrong_q['QuestionText'])
                     st.write("**✅ 정답:**", wrong_q['CorrectAnswer'])
@@ -1,7 +1,13 @@
 import streamlit as st
 import pandas as pd
 import os
-from src.SecondModule.module2 import SimilarQuestionGenerator
+import uuid
+from src.data_store import load_train_data
+from src.question_bank import QuestionBank
+from src.SecondModule.budgeted_generator import BudgetedQuestionGenerator, SOURCE_BANK
+from src.SecondModule.semantic_cache import SemanticQuestionCache
+from src.attempt_log import Attempt, get_attempt_log
+from src.session_store import get_session_writer, is_valid_session_id, restore_state, snapshot_state
 import logging
 from typing import Optional, Tuple
 logging.basicConfig(level=logging.DEBUG)
@@ -23,22 +29,65 @@ misconception_csv_path = os.path.join(data_path, 'misconception_mapping.csv')
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def _query_session_id() -> Optional[str]:
+    """URL의 ?sid= 값 (재접속/다른 replica에서 같은 세션을 이어가기 위한 키)"""
+    if hasattr(st, 'query_params'):
+        return st.query_params.get('sid')
+    return st.experimental_get_query_params().get('sid', [None])[0]
+
+
+def _set_query_session_id(session_id: str):
+    if hasattr(st, 'query_params'):
+        st.query_params['sid'] = session_id
+    else:
+        st.experimental_set_query_params(sid=session_id)
+
+
+def persist_session():
+    """현재 진행 상태를 세션 저장소에 스냅샷 (바뀌지 않았으면 쓰지 않고, 쓰기는 백그라운드에서 모아서 처리)"""
+    session_writer = get_session_writer()
+    if session_writer is not None and 'session_id' in st.session_state:
+        session_writer.save(st.session_state.session_id, snapshot_state(st.session_state))
+
+
+def reset_session():
+    """처음으로 돌아가기: 저장된 스냅샷도 지워서 다시 불러오지 않도록 함 (sid는 그대로 재사용)"""
+    session_writer = get_session_writer()
+    if session_writer is not None and 'session_id' in st.session_state:
+        session_writer.delete(st.session_state.session_id)
+    st.session_state.clear()
+
+
 # 세션 상태 초기화 - 가장 먼저 실행되도록 최상단에 배치
 if 'initialized' not in st.session_state:
     st.session_state.initialized = True
-    st.session_state.wrong_questions = []
-    st.session_state.misconceptions = []
-    st.session_state.current_question_index = 0
-    st.session_state.generated_questions = []
-    st.session_state.current_step = 'initial'
-    st.session_state.selected_wrong_answer = None
-    st.session_state.questions = []
-    logger.info("Session state initialized")
+    session_writer = get_session_writer()
+    query_session_id = _query_session_id()
+    if not is_valid_session_id(query_session_id):
+        query_session_id = None
+    snapshot = session_writer.load(query_session_id) if session_writer is not None and query_session_id else None
+    if snapshot:
+        # 재시작/재접속/다른 replica: 저장된 진행 상태에서 이어감
+        restore_state(st.session_state, snapshot)
+        st.session_state.setdefault('generated_questions', [])
+        logger.info(f"Session state restored: {query_session_id}")
+    else:
+        st.session_state.session_id = query_session_id or uuid.uuid4().hex  # 생성 스케줄러의 세션별 공평 분배 키
+        st.session_state.wrong_questions = []
+        st.session_state.misconceptions = []
+        st.session_state.current_question_index = 0
+        st.session_state.generated_questions = []
+        st.session_state.current_step = 'initial'
+        st.session_state.questions = []
+        logger.info("Session state initialized")
+    _set_query_session_id(st.session_state.session_id)
 
 # 문제 생성기 초기화
 @st.cache_resource
 def load_question_generator():
-    """문제 생성 모델 로드"""
+    """문제 생성 모델 로드 (API 클라이언트는 처음 필요할 때 import해서 첫 화면을 늦추지 않음)"""
+    from src.SecondModule.module2 import SimilarQuestionGenerator
+
     if not os.path.exists(misconception_csv_path):
         st.error(f"CSV 파일이 존재하지 않습니다: {misconception_csv_path}")
         raise FileNotFoundError(f"CSV 파일이 존재하지 않습니다: {misconception_csv_path}")
@@ -49,7 +98,7 @@ def load_question_generator():
 def load_data(data_file = '/train.csv'):
     try:
         file_path = os.path.join(data_path, data_file.lstrip('/'))
-        df = pd.read_csv(file_path)
+        df = load_train_data(file_path)
         logger.info(f"Data loaded successfully from {file_path}")
         return df
     except FileNotFoundError:
@@ -57,23 +106,55 @@ def load_data(data_file = '/train.csv'):
         logger.error(f"File not found: {data_file}")
         return None
 
+# 문제 은행 로드 함수 (모든 세션이 공유하는 읽기 전용 인덱스)
+@st.cache_resource
+def load_question_bank(data_file = '/train.csv'):
+    df = load_data(data_file)
+    if df is None or df.empty:
+        return None
+    return QuestionBank(df)
+
+# 생성된 문제의 정답 검증기 (의미 캐시에는 검증을 통과한 문제만 넣음)
+@st.cache_resource
+def load_answer_verifier():
+    from src.ThirdModule.module3_current import AnswerVerifier
+
+    return AnswerVerifier()
+
+# 시간 한도가 있는 유사 문제 생성기 (한도 초과 시 문제 은행 문제로 대체)
+@st.cache_resource
+def load_budgeted_generator():
+    return BudgetedQuestionGenerator(
+        load_question_generator(),
+        load_question_bank(),
+        semantic_cache=SemanticQuestionCache(),  # 비슷한 입력에는 이전 생성 결과를 재사용
+        verifier=load_answer_verifier()
+    )
+
+# 틀린 문제별 유사 문제 상태 키 (show_similar_question_{i}, similar_question_{i}, similar_question_answered_{i}, selected_answer_{i})
+SIMILAR_QUESTION_STATE_PREFIXES = ('show_similar_question_', 'similar_question_', 'selected_answer_')
+
 def start_quiz():
     """퀴즈 시작 및 초기화"""
-    df = load_data()
-    if df is None or df.empty:
+    bank = load_question_bank()
+    if bank is None:
         st.error("데이터를 불러올 수 없습니다. 데이터셋을 확인해주세요.")
         return
 
-    st.session_state.questions = df.sample(n=10, random_state=42)
+    # 세션에는 문제 은행의 행 위치만 저장하고, 실제 문제는 공유 문제 은행에서 조회
+    st.session_state.questions = [int(position) for position in bank.sample(10, random_state=42)]
     st.session_state.current_step = 'quiz'
     st.session_state.current_question_index = 0
     st.session_state.wrong_questions = []
     st.session_state.misconceptions = []
     st.session_state.generated_questions = []
+    # 틀린 문제별 유사 문제 상태는 표시 순서(i)로 저장되므로, 이전 세트의 상태가 새 세트의 i번째 문제에 남지 않도록 지움
+    for key in [key for key in st.session_state.keys() if str(key).startswith(SIMILAR_QUESTION_STATE_PREFIXES)]:
+        del st.session_state[key]
     logger.info("Quiz started")
 
 
-def generate_similar_question(wrong_q, misconception_id, generator):
+def generate_similar_question(wrong_q, wrong_answer, misconception_id, generator):
     """유사 문제 생성"""
     logger.info(f"Generating similar question for misconception_id: {misconception_id}")
     
@@ -95,20 +176,22 @@ def generate_similar_question(wrong_q, misconception_id, generator):
             'subject_name': str(wrong_q.get('SubjectName', '')),
             'question_text': str(wrong_q.get('QuestionText', '')),
             'correct_answer_text': str(wrong_q.get(f'Answer{wrong_q["CorrectAnswer"]}Text', '')),
-            'wrong_answer_text': str(wrong_q.get(f'Answer{st.session_state.selected_wrong_answer}Text', '')),
+            'wrong_answer_text': str(wrong_q.get(f'Answer{wrong_answer}Text', '')),
             'misconception_id': int(misconception_id)
         }
         
         logger.info(f"Prepared input data: {input_data}")
         
-        # 유사 문제 생성 호출
-        generated_q, _ = generator.generate_similar_question_with_text(
+        # 유사 문제 생성 호출 (시간 한도 초과 시 문제 은행 문제로 대체)
+        generated_q, source = generator.generate(
             construct_name=input_data['construct_name'],
             subject_name=input_data['subject_name'],
             question_text=input_data['question_text'],
             correct_answer_text=input_data['correct_answer_text'],
             wrong_answer_text=input_data['wrong_answer_text'],
-            misconception_id=input_data['misconception_id']
+            misconception_id=input_data['misconception_id'],
+            exclude_question_id=wrong_q.get('QuestionId'),
+            session_id=st.session_state.session_id
         )
         
         if generated_q:
@@ -116,7 +199,8 @@ def generate_similar_question(wrong_q, misconception_id, generator):
                 'question': generated_q.question,
                 'choices': generated_q.choices,
                 'correct': generated_q.correct_answer,
-                'explanation': generated_q.explanation
+                'explanation': generated_q.explanation,
+                'source': source
             }
             
     except Exception as e:
@@ -126,16 +210,19 @@ def generate_similar_question(wrong_q, misconception_id, generator):
 
     return None
 
-def handle_answer(answer, current_q):
-    """답변 처리"""
+def handle_answer(answer, current_q, position):
+    """답변 처리 - 세션에는 (문제 위치, 고른 선지)와 misconception id만 저장"""
+    # 코호트 리포트용 풀이 기록 (쓰기는 백그라운드에서 모아서 처리)
+    attempt_log = get_attempt_log()
+    if attempt_log is not None:
+        attempt_log.record(Attempt.from_question(st.session_state.session_id, current_q, answer))
+
     if answer != current_q['CorrectAnswer']:
-        wrong_q_dict = current_q.to_dict()
-        st.session_state.wrong_questions.append(wrong_q_dict)
-        st.session_state.selected_wrong_answer = answer
+        st.session_state.wrong_questions.append((position, answer))
         
         misconception_key = f'Misconception{answer}Id'
         misconception_id = current_q.get(misconception_key)
-        st.session_state.misconceptions.append(misconception_id)
+        st.session_state.misconceptions.append(None if pd.isna(misconception_id) else int(misconception_id))
     
     st.session_state.current_question_index += 1
     if st.session_state.current_question_index >= 10:
@@ -144,9 +231,8 @@ def handle_answer(answer, current_q):
 def main():
     """메인 애플리케이션 로직"""
     st.title("MisconcepTutor")
-    
-    # Generator 초기화
-    generator = load_question_generator()
+
+    # 생성기는 복습 화면에서 처음 필요할 때 로드 (첫 화면/퀴즈 화면은 기다리지 않음)
 
     # 초기 화면
     if st.session_state.current_step == 'initial':
@@ -157,7 +243,8 @@ def main():
 
     # 퀴즈 화면
     elif st.session_state.current_step == 'quiz':
-        current_q = st.session_state.questions.iloc[st.session_state.current_question_index]
+        position = st.session_state.questions[st.session_state.current_question_index]
+        current_q = load_question_bank().row(position)
         
         # 진행 상황 표시
         progress = st.session_state.current_question_index / 10
@@ -172,17 +259,17 @@ def main():
         col1, col2 = st.columns(2)
         with col1:
             if st.button(f"A) {current_q['AnswerAText']}", key="A"):
-                handle_answer('A', current_q)
+                handle_answer('A', current_q, position)
                 st.rerun()
             if st.button(f"C) {current_q['AnswerCText']}", key="C"):
-                handle_answer('C', current_q)
+                handle_answer('C', current_q, position)
                 st.rerun()
         with col2:
             if st.button(f"B) {current_q['AnswerBText']}", key="B"):
-                handle_answer('B', current_q)
+                handle_answer('B', current_q, position)
                 st.rerun()
             if st.button(f"D) {current_q['AnswerDText']}", key="D"):
-                handle_answer('D', current_q)
+                handle_answer('D', current_q, position)
                 st.rerun()
 
     # 복습 화면
@@ -216,17 +303,19 @@ def main():
                 st.rerun()
         with col2:
             if st.button("🏠 처음으로 돌아가기", use_container_width=True):
-                st.session_state.clear()
+                reset_session()
                 st.rerun()
         
         # 틀린 문제 분석
         if st.session_state.wrong_questions:
             st.write("### ✍️ 틀린 문제 분석")
-            for i, (wrong_q, misconception_id) in enumerate(zip(
+            bank = load_question_bank()
+            for i, ((position, wrong_answer), misconception_id) in enumerate(zip(
                 st.session_state.wrong_questions,
                 st.session_state.misconceptions
             )):
                 with st.expander(f"📝 틀린 문제 #{i + 1}"):
+                    wrong_q = bank.row(position).to_dict()
                     st.write("**📋 문제:**")
                     st.write(wrong_q['QuestionText'])
                     st.write("**✅ 정답:**", wrong_q['CorrectAnswer'])
@@ -234,7 +323,7 @@ def main():
                     st.write("---")
                     st.write("**🔍 관련된 Misconception:**")
                     if misconception_id and not pd.isna(misconception_id):
-                        misconception_text = generator.get_misconception_text(misconception_id)
+                        misconception_text = load_question_generator().get_misconception_text(misconception_id)
                         st.info(f"Misconception ID: {int(misconception_id)}\n\n{misconception_text}")
                     else:
                         st.info("Misconception 정보가 없습니다.")
@@ -244,15 +333,22 @@ def main():
                         # 유사 문제 생성 상태를 세션에 저장
                         st.session_state[f"show_similar_question_{i}"] = True
                         st.session_state[f"similar_question_answered_{i}"] = False
-                        # 기존 답변 기록 초기화
+                        # 기존 답변 기록 및 이전에 받은 유사 문제 초기화
+                        st.session_state.pop(f"similar_question_{i}", None)
                         st.rerun()
                     
                     # 유사 문제가 생성된 상태인 경우
                     if st.session_state.get(f"show_similar_question_{i}", False):
                         with st.spinner("유사 문제를 생성하고 있습니다..."):
-                            new_question = generate_similar_question(wrong_q, misconception_id, generator)
+                            # rerun 사이에 문제가 바뀌지 않도록 한 번 받은 문제는 세션에 보관
+                            new_question = st.session_state.get(f"similar_question_{i}")
+                            if new_question is None:
+                                new_question = generate_similar_question(wrong_q, wrong_answer, misconception_id, load_budgeted_generator())
+                                st.session_state[f"similar_question_{i}"] = new_question
                             if new_question:
                                 st.write("### 🎯 유사 문제")
+                                if new_question.get('source') == SOURCE_BANK:
+                                    st.caption("⏱️ 문제 생성이 지연되어 같은 개념을 다루는 기존 문제를 보여드립니다.")
                                 st.write(new_question['question'])
                                 
                                 # 답변 상태 확인
@@ -306,14 +402,20 @@ def main():
                                 # 문제 닫기 버튼
                                 if st.button("❌ 문제 닫기", key=f"close_{i}"):
                                     st.session_state[f"show_similar_question_{i}"] = False
+                                    st.session_state.pop(f"similar_question_{i}", None)
                                     st.rerun()
                             else:
                                 st.error("유사 문제를 생성할 수 없습니다.")
                                 if st.button("❌ 닫기", key=f"close_error_{i}"):
                                     st.session_state[f"show_similar_question_{i}"] = False
+                                    st.session_state.pop(f"similar_question_{i}", None)
                                     st.rerun()
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        # 상태 전환마다 스냅샷 (st.rerun()은 예외로 스크립트를 멈추므로 finally에서 처리)
+        persist_session()
 
 # random_state 42에서 정답
     # D C A A C
@@ -0,0 +1,121 @@
+# bench_cpu_quantization.py
+# GPU 없는 환경에서 로컬 Llama 검증 모델(SelfConsistencyChecker 프롬프트)을 CPU 정밀도별로 비교하는 벤치마크
+#
+# 실행 예:
+#   python -m benchmarks.bench_cpu_quantization --modes float32,bfloat16,int8 --questions 20
+#
+# 모드마다 별도 프로세스에서 모델을 올려 최대 RSS를 따로 재고, 생성 속도(tokens/sec)와
+# float32 대비 정답 일치율(greedy decoding)을 출력합니다.
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+from src.data_store import load_train_data
+from src.model_loading import CPU_PRECISIONS, PRECISION_FLOAT32
+
+base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+train_csv_path = os.path.join(base_path, 'Data', 'train.csv')
+
+DEFAULT_MODEL = 'meta-llama/Meta-Llama-3-8B-Instruct'
+
+
+def load_questions(count: int) -> List[Dict[str, object]]:
+    df = load_train_data(train_csv_path)
+    questions = []
+    for _, row in df.head(count).iterrows():
+        questions.append({
+            'question': row['QuestionText'],
+            'choices': {option: row[f"Answer{option}Text"] for option in ('A', 'B', 'C', 'D')},
+        })
+    return questions
+
+
+def run_mode(mode: str, model_name: str, questions: List[Dict[str, object]], max_new_tokens: int) -> Dict[str, object]:
+    """자식 프로세스에서 실행: 모델 로드 → 문제별 greedy 생성 → 속도/메모리/답 반환"""
+    import torch
+
+    from src.model_loading import load_causal_lm
+    from src.ThirdModule.module3 import SelfConsistencyChecker
+
+    started = time.perf_counter()
+    tokenizer, model = load_causal_lm(model_name, cpu_precision=mode)
+    load_seconds = time.perf_counter() - started
+
+    # 모델을 다시 올리지 않고 프롬프트 생성과 정답 추출만 사용
+    checker = SelfConsistencyChecker.__new__(SelfConsistencyChecker)
+
+    answers, generated_tokens, generate_seconds = [], 0, 0.0
+    for item in questions:
+        prompt = checker._create_prompt(item['question'], item['choices'])
+        inputs = tokenizer(prompt, return_tensors='pt')
+        prompt_length = inputs['input_ids'].shape[1]
+
+        started = time.perf_counter()
+        with torch.no_grad():
+            outputs = model.generate(**inputs, max_new_tokens=max_new_tokens, do_sample=False,
+                                     eos_token_id=tokenizer.eos_token_id, pad_token_id=tokenizer.pad_token_id)
+        generate_seconds += time.perf_counter() - started
+
+        new_tokens = outputs[0, prompt_length:]
+        generated_tokens += int(new_tokens.shape[0])
+        answers.append(checker._extract_answer(tokenizer.decode(new_tokens, skip_special_tokens=True)))
+
+    return {
+        'mode': mode,
+        'load_seconds': load_seconds,
+        'load_phases': getattr(model, 'load_report', {}),
+        'tokens_per_second': generated_tokens / generate_seconds if generate_seconds else 0.0,
+        'seconds_per_question': generate_seconds / len(questions) if questions else 0.0,
+        # Linux에서 ru_maxrss 단위는 KB
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'answers': answers,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare CPU precision modes for the local Llama checker")
+    parser.add_argument('--modes', default=','.join(CPU_PRECISIONS), help="쉼표로 구분한 모드 목록")
+    parser.add_argument('--model', default=DEFAULT_MODEL)
+    parser.add_argument('--questions', type=int, default=20, help="train.csv 앞에서부터 사용할 문제 수")
+    parser.add_argument('--max-new-tokens', type=int, default=10)
+    parser.add_argument('--json', action='store_true', help="결과를 JSON으로 출력")
+    args = parser.parse_args(argv)
+
+    modes = [mode.strip() for mode in args.modes.split(',') if mode.strip()]
+    unknown = [mode for mode in modes if mode not in CPU_PRECISIONS]
+    if unknown:
+        parser.error(f"unknown modes: {unknown}")
+
+    questions = load_questions(args.questions)
+    results = []
+    for mode in modes:
+        # 모드마다 새 프로세스: 이전 모드의 메모리가 최대 RSS에 섞이지 않도록
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+            results.append(pool.submit(run_mode, mode, args.model, questions, args.max_new_tokens).result())
+
+    reference = next((r for r in results if r['mode'] == PRECISION_FLOAT32), results[0])
+    for result in results:
+        matches = sum(a == b for a, b in zip(result['answers'], reference['answers']))
+        result['agreement_with'] = reference['mode']
+        result['agreement'] = matches / len(questions) if questions else 0.0
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return results
+
+    print(f"model: {args.model}, questions: {len(questions)}, max new tokens: {args.max_new_tokens}")
+    print(f"{'mode':<10}{'load s':>9}{'tok/s':>9}{'s/question':>12}{'peak RSS MB':>13}{'agreement':>11}")
+    for result in results:
+        print(f"{result['mode']:<10}{result['load_seconds']:>9.1f}{result['tokens_per_second']:>9.2f}"
+              f"{result['seconds_per_question']:>12.2f}{result['peak_rss_mb']:>13.0f}{result['agreement']:>10.0%}")
+    print(f"(agreement = same extracted answer as {reference['mode']})")
+    return results
+
+
+if __name__ == "__main__":
+    main()
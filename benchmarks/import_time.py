@@ -0,0 +1,102 @@
+# import_time.py
+# 진입점 모듈의 import 비용을 `python -X importtime`으로 재서 모듈별/패키지별로 정리하는 벤치마크
+#
+# 실행 예:
+#   python -m benchmarks.import_time
+#   python -m benchmarks.import_time --module src.SecondModule.module2 --top 15
+#
+# 모듈마다 새 인터프리터에서 import하므로 이미 로드된 모듈 때문에 결과가 작게 나오지 않습니다.
+# cumulative는 그 모듈이 끌어온 하위 import까지 포함한 시간, self는 모듈 자체의 실행 시간입니다.
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List
+
+base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 첫 화면(app.py)이 실제로 import하는 경로와, 필요할 때만 불러오는 API 클라이언트/서버
+DEFAULT_MODULES = (
+    'src.data_store',
+    'src.question_bank',
+    'src.SecondModule.budgeted_generator',
+    'src.SecondModule.module2',
+    'src.ThirdModule.module3_current',
+    'src.server',
+)
+
+# "import time:       123 |       4567 |   package.module"
+_IMPORT_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+
+def profile_module(module: str) -> Dict[str, object]:
+    """새 인터프리터에서 module을 import하고 -X importtime 출력을 파싱"""
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+        cwd=base_path, capture_output=True, text=True,
+    )
+    imports: List[Dict[str, object]] = []
+    for line in completed.stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            imports.append({
+                'module': name,
+                'self_ms': int(self_us) / 1000,
+                'cumulative_ms': int(cumulative_us) / 1000,
+                # 들여쓰기 두 칸이 import 깊이 한 단계
+                'depth': (len(indent) - 1) // 2,
+            })
+
+    total_ms = next((item['cumulative_ms'] for item in reversed(imports) if item['module'] == module), None)
+    error = None
+    if completed.returncode != 0:
+        error = completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else f"exit code {completed.returncode}"
+    return {'module': module, 'total_ms': total_ms, 'imports': imports, 'error': error}
+
+
+def by_package(imports: List[Dict[str, object]]) -> Dict[str, float]:
+    """최상위 패키지별 self 시간 합계 (어느 라이브러리가 import 시간을 쓰는지)"""
+    totals: Dict[str, float] = defaultdict(float)
+    for item in imports:
+        totals[str(item['module']).split('.')[0]] += float(item['self_ms'])
+    return dict(sorted(totals.items(), key=lambda kv: kv[1], reverse=True))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-module import-time breakdown for the app entry points")
+    parser.add_argument('--module', action='append', help="측정할 모듈 (여러 번 지정 가능, 기본: 진입점 모듈들)")
+    parser.add_argument('--top', type=int, default=10, help="모듈별로 출력할 가장 느린 import 수")
+    parser.add_argument('--json', action='store_true', help="결과를 JSON으로 출력")
+    args = parser.parse_args(argv)
+
+    results = []
+    for module in args.module or DEFAULT_MODULES:
+        result = profile_module(module)
+        result['packages'] = by_package(result['imports'])
+        results.append(result)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return results
+
+    for result in results:
+        total = f"{result['total_ms']:.1f} ms" if result['total_ms'] is not None else "n/a"
+        print(f"== {result['module']}: {total}")
+        if result['error']:
+            print(f"   import failed: {result['error']}")
+        slowest = sorted(result['imports'], key=lambda item: item['cumulative_ms'], reverse=True)[:args.top]
+        print(f"   {'cumulative ms':>14}{'self ms':>10}  module")
+        for item in slowest:
+            print(f"   {item['cumulative_ms']:>14.1f}{item['self_ms']:>10.1f}  {'  ' * item['depth']}{item['module']}")
+        packages = ', '.join(f"{name} {ms:.1f}" for name, ms in list(result['packages'].items())[:args.top])
+        print(f"   self ms by package: {packages}")
+        print()
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+# load_test.py
+# 브라우저 없이 여러 학생의 퀴즈 흐름(시작 → 10문제 풀이 → 유사 문제 열기 → 풀이)을 동시에 재현하는 부하 테스트
+#
+# 실행 예:
+#   python -m benchmarks.load_test --sessions 50 --concurrency 50 --wrong-rate 0.4 --model-latency 2.0
+#
+# 모델 호출은 지연 시간을 조절할 수 있는 stub으로 대체하고, 문제 은행/생성 스케줄러/시간 한도 로직은 앱과 같은 코드를 사용합니다.
+import argparse
+import json
+import os
+import pickle
+import random
+import resource
+import statistics
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import pandas as pd
+
+from src.question_bank import OPTIONS, QuestionBank
+from src.scheduler import GenerationScheduler
+from src.SecondModule.budgeted_generator import BudgetedQuestionGenerator
+from src.SecondModule.output_parser import GeneratedQuestion
+
+base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+train_csv_path = os.path.join(base_path, 'Data', 'train.csv')
+
+QUIZ_SIZE = 10
+
+
+class StubQuestionGenerator:
+    """SimilarQuestionGenerator 대신 쓰는 stub. 지연 시간은 평균 latency의 로그정규 분포, error_rate 확률로 실패"""
+
+    def __init__(self, latency: float, jitter: float = 0.5, error_rate: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def get_misconception_text(self, misconception_id: float) -> str:
+        return f"Misconception {misconception_id}"
+
+    def generate_similar_question_with_text(self, construct_name: str, subject_name: str, question_text: str,
+                                            correct_answer_text: str, wrong_answer_text: str,
+                                            misconception_id: float):
+        with self._lock:
+            self.calls += 1
+        if self.latency > 0:
+            time.sleep(random.lognormvariate(0, self.jitter) * self.latency)
+        if random.random() < self.error_rate:
+            raise RuntimeError("stub backend error")
+        question = GeneratedQuestion(
+            question=f"[stub] {question_text}",
+            choices={option: f"choice {option}" for option in OPTIONS},
+            correct_answer=random.choice(OPTIONS),
+            explanation="stub explanation",
+        )
+        return question, "stub output"
+
+
+class LatencyRecorder:
+    def __init__(self):
+        self._samples: Dict[str, List[float]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def record(self, step: str, seconds: float):
+        with self._lock:
+            self._samples[step].append(seconds)
+
+    def summary(self) -> dict:
+        result = {}
+        for step, samples in sorted(self._samples.items()):
+            ordered = sorted(samples)
+            result[step] = {
+                'count': len(ordered),
+                'mean_ms': statistics.fmean(ordered) * 1000,
+                'p50_ms': _percentile(ordered, 50) * 1000,
+                'p90_ms': _percentile(ordered, 90) * 1000,
+                'p99_ms': _percentile(ordered, 99) * 1000,
+                'max_ms': ordered[-1] * 1000,
+            }
+        return result
+
+
+def _percentile(ordered: List[float], pct: float) -> float:
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def run_session(session_id: str, bank: QuestionBank, generator: BudgetedQuestionGenerator,
+                recorder: LatencyRecorder, wrong_rate: float, think_time: float, fixed_quiz: bool) -> dict:
+    """app.py와 같은 순서로 세션 한 개를 진행하고, 마지막 세션 상태를 반환"""
+    rng = random.Random(session_id)
+    state = {'questions': [], 'wrong_questions': [], 'misconceptions': [], 'sources': defaultdict(int)}
+
+    started = time.perf_counter()
+    state['questions'] = [int(p) for p in bank.sample(QUIZ_SIZE, random_state=42 if fixed_quiz else rng.randrange(2**31))]
+    recorder.record('start_quiz', time.perf_counter() - started)
+
+    for position in state['questions']:
+        if think_time:
+            time.sleep(rng.uniform(0, think_time))
+        started = time.perf_counter()
+        row = bank.row(position)
+        correct = row['CorrectAnswer']
+        if rng.random() < wrong_rate:
+            answer = rng.choice([option for option in OPTIONS if option != correct])
+            misconception_id = row[f'Misconception{answer}Id']
+            state['wrong_questions'].append((position, answer))
+            state['misconceptions'].append(None if pd.isna(misconception_id) else int(misconception_id))
+        recorder.record('answer', time.perf_counter() - started)
+
+    for (position, wrong_answer), misconception_id in zip(state['wrong_questions'], state['misconceptions']):
+        if misconception_id is None:
+            continue
+        row = bank.row(position)
+        started = time.perf_counter()
+        generated_question, source = generator.generate(
+            construct_name=str(row['ConstructName']),
+            subject_name=str(row['SubjectName']),
+            question_text=str(row['QuestionText']),
+            correct_answer_text=str(row[f"Answer{row['CorrectAnswer']}Text"]),
+            wrong_answer_text=str(row[f'Answer{wrong_answer}Text']),
+            misconception_id=misconception_id,
+            exclude_question_id=int(row['QuestionId']),
+            session_id=session_id,
+        )
+        elapsed = time.perf_counter() - started
+        recorder.record('open_similar', elapsed)
+        recorder.record(f'open_similar[{source}]', elapsed)
+        state['sources'][source] += 1
+
+        if generated_question is not None:
+            started = time.perf_counter()
+            _ = rng.choice(OPTIONS) == generated_question.correct_answer
+            recorder.record('answer_similar', time.perf_counter() - started)
+
+    state['session_state_bytes'] = len(pickle.dumps({k: state[k] for k in ('questions', 'wrong_questions', 'misconceptions')}))
+    return state
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate concurrent MisconcepTutor quiz sessions")
+    parser.add_argument('--sessions', type=int, default=50, help="전체 세션 수")
+    parser.add_argument('--concurrency', type=int, default=50, help="동시에 진행되는 세션 수")
+    parser.add_argument('--wrong-rate', type=float, default=0.4, help="문항별 오답 확률")
+    parser.add_argument('--think-time', type=float, default=0.0, help="문항 사이 최대 대기 시간(초)")
+    parser.add_argument('--model-latency', type=float, default=2.0, help="stub 모델 평균 지연(초)")
+    parser.add_argument('--model-jitter', type=float, default=0.5, help="지연 시간 로그정규 sigma")
+    parser.add_argument('--model-error-rate', type=float, default=0.0)
+    parser.add_argument('--deadline', type=float, default=None, help="생성 시간 한도(초), 기본값은 config 값")
+    parser.add_argument('--max-concurrency', type=int, default=4, help="생성 스케줄러 동시 호출 한도")
+    parser.add_argument('--random-quiz', action='store_true', help="세션마다 다른 문제 세트 사용 (기본은 앱과 같이 random_state=42)")
+    parser.add_argument('--json', action='store_true', help="결과를 JSON으로 출력")
+    args = parser.parse_args(argv)
+
+    bank = QuestionBank.from_csv(train_csv_path)
+    stub = StubQuestionGenerator(args.model_latency, args.model_jitter, args.model_error_rate)
+    scheduler = GenerationScheduler(max_concurrency=args.max_concurrency, name='load-test')
+    generator = BudgetedQuestionGenerator(stub, bank, scheduler=scheduler,
+                                          **({} if args.deadline is None else {'deadline_seconds': args.deadline}))
+    recorder = LatencyRecorder()
+
+    rss_before_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        states = list(pool.map(
+            lambda i: run_session(f"session-{i}", bank, generator, recorder,
+                                  args.wrong_rate, args.think_time, not args.random_quiz),
+            range(args.sessions),
+        ))
+    elapsed = time.perf_counter() - started
+    scheduler_metrics = scheduler.metrics()
+    scheduler.shutdown(wait=False)
+
+    sources = defaultdict(int)
+    for state in states:
+        for source, count in state['sources'].items():
+            sources[source] += count
+
+    report = {
+        'sessions': args.sessions,
+        'concurrency': args.concurrency,
+        'elapsed_seconds': elapsed,
+        'sessions_per_second': args.sessions / elapsed if elapsed else 0.0,
+        'steps': recorder.summary(),
+        'similar_question_sources': dict(sources),
+        'model_calls': stub.calls,
+        'scheduler': scheduler_metrics,
+        'memory': {
+            # Linux에서 ru_maxrss 단위는 KB
+            'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            'peak_rss_before_run_mb': rss_before_kb / 1024,
+            'avg_session_state_bytes': statistics.fmean(s['session_state_bytes'] for s in states),
+        },
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2, default=str))
+        return report
+
+    print(f"sessions: {args.sessions} (concurrency {args.concurrency}), elapsed {elapsed:.2f}s, "
+          f"{report['sessions_per_second']:.2f} sessions/s")
+    print(f"{'step':<24}{'count':>7}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for step, stats in report['steps'].items():
+        print(f"{step:<24}{stats['count']:>7}{stats['p50_ms']:>10.1f}{stats['p90_ms']:>10.1f}"
+              f"{stats['p99_ms']:>10.1f}{stats['max_ms']:>10.1f}")
+    print(f"similar question sources: {dict(sources)}, model calls: {stub.calls}")
+    print(f"scheduler: max queue depth {scheduler_metrics['max_queue_depth']}, "
+          f"avg wait {scheduler_metrics['avg_wait_seconds']:.2f}s, max wait {scheduler_metrics['max_wait_seconds']:.2f}s")
+    print(f"memory: peak RSS {report['memory']['peak_rss_mb']:.1f} MB "
+          f"(before run {report['memory']['peak_rss_before_run_mb']:.1f} MB), "
+          f"session state ~{report['memory']['avg_session_state_bytes']:.0f} bytes")
+    return report
+
+
+if __name__ == "__main__":
+    main()
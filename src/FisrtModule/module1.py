@@ -1,10 +1,11 @@
 ### module1.py
 # Misconception을 예측하는 모듈 (나중에 따로 구현 후 그 모델을 불러오는 식으로 구현 할 예정이며, 아직은 mock모듈)
 import pandas as pd
+from src.data_store import load_misconception_mapping
 
 class MisconceptionPredictor:
     def __init__(self, misconception_csv_path='misconception_mapping.csv'):
-        self.misconception_df = pd.read_csv(misconception_csv_path)
+        self.misconception_df = load_misconception_mapping(misconception_csv_path)
     
     def get_misconception_text(self, misconception_id: int) -> str:
         row = self.misconception_df[self.misconception_df['MisconceptionId'] == misconception_id]
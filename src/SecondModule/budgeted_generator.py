@@ -0,0 +1,231 @@
+# budgeted_generator.py
+# 유사 문제 생성에 시간 한도를 두고, 한도를 넘기면 문제 은행에서 같은 misconception 문제를 바로 제공합니다.
+import logging
+import random
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Optional, Tuple
+
+from src.config import GENERATION_DEADLINE_SECONDS, GENERATION_MAX_CONCURRENCY
+from src.question_bank import OPTIONS, QuestionBank
+from src.scheduler import GenerationScheduler, PRIORITY_INTERACTIVE, SchedulerQueueFull
+from src.SecondModule.output_parser import GeneratedQuestion
+from src.SecondModule.semantic_cache import SemanticQuestionCache
+
+logger = logging.getLogger(__name__)
+
+SOURCE_CACHE = 'cache'
+SOURCE_SEMANTIC = 'semantic'
+SOURCE_MODEL = 'model'
+SOURCE_BANK = 'bank'
+
+
+class BudgetedQuestionGenerator:
+    """
+    SimilarQuestionGenerator를 감싸서 응답 시간을 deadline_seconds 이내로 제한합니다.
+    한도 안에 생성되지 않으면 문제 은행 문제를 반환합니다. 이미 실행 중인 생성은 백그라운드에서 계속 진행되어 캐시에 저장되고,
+    아직 대기열에 있으면서 기다리는 호출자가 더 없는 생성은 취소해서 떠난 요청이 API를 계속 붙잡지 않게 합니다.
+    생성 호출은 GenerationScheduler를 거치므로 전체 동시 호출 수와 세션 간 순서가 scheduler에서 관리됩니다.
+    semantic_cache가 있으면 입력이 정확히 같지 않아도 충분히 비슷한 이전 생성 결과를 재사용합니다.
+    semantic_cache에는 verifier(verify_answer(question, choices)를 가진 객체)가 생성된 정답과 같은 답을 낸 문제만 넣으며,
+    verifier가 없으면 semantic_cache에 넣지 않습니다. 검증과 임베딩은 생성 슬롯을 잡고 있지 않도록 별도의 작은 스레드 풀에서 실행합니다.
+    """
+
+    def __init__(self, generator, question_bank: QuestionBank,
+                 deadline_seconds: float = GENERATION_DEADLINE_SECONDS,
+                 scheduler: Optional[GenerationScheduler] = None, cache_size: int = 1024,
+                 semantic_cache: Optional[SemanticQuestionCache] = None, verifier=None, cache_workers: int = 2):
+        self.generator = generator
+        self.question_bank = question_bank
+        self.deadline_seconds = deadline_seconds
+        self.cache_size = cache_size
+        self.scheduler = scheduler or GenerationScheduler(max_concurrency=GENERATION_MAX_CONCURRENCY)
+        self.semantic_cache = semantic_cache
+        self.verifier = verifier
+        # 완료 콜백은 scheduler 워커 안에서 실행되므로, 느린 검증 호출/임베딩은 여기로 넘기고 콜백은 바로 반환
+        self._cache_executor = (
+            ThreadPoolExecutor(max_workers=cache_workers, thread_name_prefix='semantic-cache')
+            if semantic_cache is not None and verifier is not None else None
+        )
+        self._cache: 'OrderedDict[tuple, GeneratedQuestion]' = OrderedDict()
+        self._in_flight: dict = {}
+        # 입력 키별로 결과를 기다리고 있는 generate() 호출 수
+        self._waiters: dict = {}
+        self._lock = threading.Lock()
+
+    def _cache_get(self, key: tuple) -> Optional[GeneratedQuestion]:
+        with self._lock:
+            question = self._cache.get(key)
+            if question is not None:
+                self._cache.move_to_end(key)
+            return question
+
+    def _cache_put(self, key: tuple, question: GeneratedQuestion):
+        with self._lock:
+            self._cache[key] = question
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _on_done(self, key: tuple, future: Future):
+        with self._lock:
+            self._in_flight.pop(key, None)
+        if future.cancelled():
+            return
+        try:
+            generated_question, _ = future.result()
+        except Exception as e:
+            logger.error(f"Background generation failed: {e}")
+            return
+        if _is_usable(generated_question):
+            self._cache_put(key, generated_question)
+            if self._cache_executor is not None:
+                self._cache_executor.submit(self._add_to_semantic_cache, key, generated_question)
+
+    def _add_to_semantic_cache(self, key: tuple, generated_question: GeneratedQuestion):
+        """검증을 통과한 생성 결과만 의미 캐시에 추가 (_cache_executor에서 실행)"""
+        if not self._is_verified(generated_question):
+            return
+        construct_name, _, question_text, _, _, misconception_id = key
+        try:
+            self.semantic_cache.add(construct_name, question_text, misconception_id, generated_question,
+                                    misconception_text=self._misconception_text(misconception_id))
+        except Exception as e:
+            logger.error(f"Failed to add to semantic cache: {e}")
+
+    def _is_verified(self, generated_question: GeneratedQuestion) -> bool:
+        """다른 입력에도 재사용되므로, 검증기가 생성된 정답과 같은 답을 낸 문제만 통과"""
+        try:
+            verified_answer = self.verifier.verify_answer(generated_question.question, generated_question.choices)
+        except Exception as e:
+            logger.error(f"Verification before semantic caching failed: {e}")
+            return False
+        if verified_answer is None or verified_answer.strip().upper() != generated_question.correct_answer.strip().upper():
+            logger.info(f"Not caching unverified question (verified: {verified_answer}, "
+                        f"generated: {generated_question.correct_answer})")
+            return False
+        return True
+
+    def _misconception_text(self, misconception_id: float) -> Optional[str]:
+        get_text = getattr(self.generator, 'get_misconception_text', None)
+        if get_text is None:
+            return None
+        try:
+            return get_text(misconception_id)
+        except Exception as e:
+            logger.error(f"Failed to look up misconception text: {e}")
+            return None
+
+    def _submit(self, key: tuple, session_id: str, priority: int, **kwargs) -> Future:
+        """같은 입력으로 진행 중인 생성이 있으면 그 Future를 재사용. 호출한 쪽은 끝나면 _release_waiter를 불러야 함"""
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is None:
+                future = self.scheduler.submit(
+                    session_id, self.generator.generate_similar_question_with_text, priority=priority, **kwargs
+                )
+                self._in_flight[key] = future
+                future.add_done_callback(lambda f: self._on_done(key, f))
+            self._waiters[key] = self._waiters.get(key, 0) + 1
+        return future
+
+    def _release_waiter(self, key: tuple, future: Future, gave_up: bool):
+        """한도 초과로 포기한 마지막 호출자였다면, 아직 대기열에 있는 생성을 취소 (실행 중이면 cancel()은 실패하고 계속 진행)"""
+        with self._lock:
+            remaining = self._waiters.get(key, 1) - 1
+            if remaining > 0:
+                self._waiters[key] = remaining
+            else:
+                self._waiters.pop(key, None)
+        if gave_up and remaining <= 0 and future.cancel():
+            logger.info("Dropped queued generation with no remaining waiters.")
+
+    def fallback_question(self, misconception_id: float,
+                          exclude_question_id: Optional[int] = None) -> Optional[GeneratedQuestion]:
+        """같은 misconception을 가진 기존 문제를 문제 은행 역색인으로 찾아 GeneratedQuestion 형태로 반환"""
+        candidates = [
+            (question_id, option)
+            for question_id, option in self.question_bank.questions_for_misconception(int(misconception_id))
+            if exclude_question_id is None or question_id != int(exclude_question_id)
+        ]
+        if not candidates:
+            logger.warning(f"No bank question found for misconception_id: {misconception_id}")
+            return None
+
+        question_id, _ = random.choice(candidates)
+        row = self.question_bank.row(self.question_bank.position_of(question_id))
+        return GeneratedQuestion(
+            question=str(row['QuestionText']),
+            choices={option: str(row[f'Answer{option}Text']) for option in OPTIONS},
+            correct_answer=str(row['CorrectAnswer']),
+            explanation=f"기존 문제 은행에서 같은 misconception(ID {int(misconception_id)})을 다루는 문제입니다.",
+        )
+
+    def generate(self, construct_name: str, subject_name: str, question_text: str, correct_answer_text: str,
+                 wrong_answer_text: str, misconception_id: float,
+                 exclude_question_id: Optional[int] = None,
+                 deadline_seconds: Optional[float] = None,
+                 session_id: str = 'default',
+                 priority: int = PRIORITY_INTERACTIVE) -> Tuple[Optional[GeneratedQuestion], str]:
+        """
+        (문제, 출처)를 반환합니다. 출처는 'cache' / 'semantic' / 'model' / 'bank' 중 하나.
+        """
+        kwargs = dict(
+            construct_name=construct_name,
+            subject_name=subject_name,
+            question_text=question_text,
+            correct_answer_text=correct_answer_text,
+            wrong_answer_text=wrong_answer_text,
+            misconception_id=misconception_id,
+        )
+        key = tuple(kwargs.values())
+
+        cached = self._cache_get(key)
+        # 정확히 같은 입력의 캐시도 같은 학생에게는 한 번만 (이미 본 문제면 의미 캐시/새 생성으로 넘어감)
+        if cached is not None and (self.semantic_cache is None or self.semantic_cache.claim(session_id, cached)):
+            return cached, SOURCE_CACHE
+
+        if self.semantic_cache is not None:
+            try:
+                similar = self.semantic_cache.lookup(construct_name, question_text, misconception_id, student_id=session_id,
+                                                     misconception_text=self._misconception_text(misconception_id))
+            except Exception as e:
+                logger.error(f"Semantic cache lookup failed: {e}")
+                similar = None
+            if similar is not None:
+                return similar, SOURCE_SEMANTIC
+
+        try:
+            future = self._submit(key, session_id, priority, **kwargs)
+        except SchedulerQueueFull as e:
+            logger.warning(f"{e}; serving bank fallback.")
+            return self.fallback_question(misconception_id, exclude_question_id), SOURCE_BANK
+
+        timeout = self.deadline_seconds if deadline_seconds is None else deadline_seconds
+        gave_up = False
+        try:
+            generated_question, _ = future.result(timeout=timeout)
+            if _is_usable(generated_question):
+                if self.semantic_cache is not None:
+                    self.semantic_cache.mark_served(session_id, generated_question)
+                return generated_question, SOURCE_MODEL
+            logger.warning("Generation returned no usable question; serving bank fallback.")
+        except FutureTimeoutError:
+            gave_up = True
+            logger.warning(f"Generation exceeded {timeout}s budget; serving bank fallback.")
+        except Exception as e:
+            logger.error(f"Generation failed: {e}; serving bank fallback.")
+        finally:
+            self._release_waiter(key, future, gave_up)
+
+        return self.fallback_question(misconception_id, exclude_question_id), SOURCE_BANK
+
+
+def _is_usable(generated_question: Optional[GeneratedQuestion]) -> bool:
+    return (
+        generated_question is not None
+        and bool(generated_question.question)
+        and all(generated_question.choices.get(option) for option in OPTIONS)
+        and bool(generated_question.correct_answer)
+    )
@@ -1,47 +1,101 @@
+import json
 import pandas as pd
 import requests
-from typing import Tuple, Optional
-from dataclasses import dataclass
+from typing import Iterator, List, Tuple, Optional
 import logging
-from dotenv import load_dotenv
 import os
+from src.data_store import load_misconception_mapping
+from src.config import (API_REQUEST_TIMEOUT_SECONDS, HF_API_BATCH_INPUTS, MICRO_BATCH_MAX_IN_FLIGHT, MICRO_BATCH_MAX_SIZE,
+                        MICRO_BATCH_WAIT_SECONDS, get_huggingface_api_key)
+from src.micro_batcher import MicroBatcher, split_generated_texts
+from src.rate_limiter import estimate_tokens, get_rate_limiter
+from src.resilience import ResilientCaller
+from src.singleflight import SingleFlight, request_key
+from src.SecondModule.output_parser import (GeneratedQuestion, StreamingQuestionParser, parse_question_output,
+                                            validate_question_structure)
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
+# 로깅 설정은 진입점(app.py, server.py)에서 함
 logger = logging.getLogger(__name__)
 
-# .env 파일 로드
-load_dotenv()
-
-# Hugging Face API 정보
+# Hugging Face API 정보 (API 키는 get_huggingface_api_key()로 처음 필요할 때 읽음)
 API_URL = "https://api-inference.huggingface.co/models/meta-llama/Meta-Llama-3-8B-Instruct"
-API_KEY = os.getenv("HUGGINGFACE_API_KEY")
 
 base_path = os.path.dirname(os.path.abspath(__file__))
 misconception_csv_path = os.path.join(base_path, 'misconception_mapping.csv')
 
-if not API_KEY:
-    raise ValueError("API_KEY가 설정되지 않았습니다. .env 파일을 확인하세요.")
+# assistant 턴을 '---'로 미리 시작해 두면, 형식의 끝을 알리는 두 번째 '---'를 stop sequence로 쓸 수 있음
+ASSISTANT_PREFILL = "\n\n---\n"
+STOP_SEQUENCES = ["\n---", "<|eot_id|>"]
+GENERATION_PARAMETERS = {
+    "max_new_tokens": 300,
+    "return_full_text": False,  # 프롬프트를 다시 돌려받지 않음
+    "stop": STOP_SEQUENCES,
+}
 
-#유사 문제 생성기 클래스
+# rate limiter 사용량 보고서에 표시되는 호출자 이름
+RATE_LIMIT_CALLER = "similar_question"
+
+# 프로세스 전체에서 같은 프롬프트/파라미터로 동시에 들어온 생성 요청을 한 번의 API 호출로 합침
+_generation_flight = SingleFlight()
+
+# 요청 제한 시간 / (설정 시) 헤지 요청 / 실패가 잦으면 바로 실패하는 서킷 브레이커
+_generation_caller = ResilientCaller("similar_question")
+
+
+def _post_prompts(prompts: List[str]) -> List[str]:
+    """Hugging Face API 호출. 프롬프트가 여러 개이면 리스트 입력 한 번으로 보내고 프롬프트별 생성 텍스트를 반환"""
+    logger.info(f"Calling Hugging Face API ({len(prompts)} prompt(s))...")
+    headers = {"Authorization": f"Bearer {get_huggingface_api_key()}"}
+    limiter = get_rate_limiter()
+    prompt_tokens = sum(estimate_tokens(prompt) for prompt in prompts)
+    reserved_tokens = prompt_tokens + GENERATION_PARAMETERS["max_new_tokens"] * len(prompts)
+
+    limiter.acquire(reserved_tokens, caller=RATE_LIMIT_CALLER)
+    completion_tokens = 0
+    try:
+        inputs = prompts[0] if len(prompts) == 1 else prompts
+        response = requests.post(API_URL, headers=headers, json={"inputs": inputs, "parameters": GENERATION_PARAMETERS},
+                                 timeout=API_REQUEST_TIMEOUT_SECONDS)
+        response.raise_for_status()
+
+        response_data = response.json()
+        logger.debug(f"Raw API response: {response_data}")
+        generated_texts = split_generated_texts(response_data, len(prompts))
 
-@dataclass
-class GeneratedQuestion:
-    question: str
-    choices: dict
-    correct_answer: str
-    explanation: str
+        completion_tokens = sum(estimate_tokens(text) for text in generated_texts)
+        logger.info(f"Generated text: {generated_texts}")
+        return generated_texts
+
+    except requests.exceptions.RequestException as e:
+        logger.error(f"API request failed: {e}")
+        raise
+    except Exception as e:
+        logger.error(f"Unexpected error in call_model_api: {e}")
+        raise
+    finally:
+        # 실패한 호출(HTTP 오류, timeout, 파싱 실패)도 잡아 둔 토큰을 정산해서 장애 중에 버킷이 바닥나지 않게 함
+        limiter.record_usage(RATE_LIMIT_CALLER, prompt_tokens, completion_tokens, reserved_tokens)
+
+
+# 동시에 들어온 생성 요청을 모아 리스트 입력 한 번으로 보냄 (HF_API_BATCH_INPUTS가 켜진 경우)
+_generation_batcher = MicroBatcher(_post_prompts, max_batch_size=MICRO_BATCH_MAX_SIZE,
+                                   max_wait_seconds=MICRO_BATCH_WAIT_SECONDS, name="similar-question-batcher",
+                                   max_in_flight=MICRO_BATCH_MAX_IN_FLIGHT)
+
+#유사 문제 생성기 클래스
 
 class SimilarQuestionGenerator:
     def __init__(self, misconception_csv_path: str = 'misconception_mapping.csv'):
         """
         Initialize the generator by loading the misconception mapping and the language model.
         """
+        # 키가 없으면 생성기를 만들 때 바로 실패 (예전에는 import 시점에 실패)
+        get_huggingface_api_key()
         self._load_data(misconception_csv_path)
 
     def _load_data(self, misconception_csv_path: str):
         logger.info("Loading misconception mapping...")
-        self.misconception_df = pd.read_csv(misconception_csv_path)
+        self.misconception_df = load_misconception_mapping(misconception_csv_path)
 
     def get_misconception_text(self, misconception_id: float) -> Optional[str]:
         # MisconceptionId를 받아 해당 ID에 매칭되는 오개념 설명 텍스트를 반환합니다
@@ -92,73 +146,94 @@ class SimilarQuestionGenerator:
             Ensure that the question is conceptually similar but not identical to the original. Ensure clarity and educational value.
             <|eot_id|>
             <|start_header_id|>assistant<|end_header_id|>
-        """.strip()
+        """.strip() + ASSISTANT_PREFILL
         logger.debug(f"Generated prompt: {prompt}")
         return prompt
 
     def call_model_api(self, prompt: str) -> str:
-        """Hugging Face API 호출"""
-        logger.info("Calling Hugging Face API...")
-        headers = {"Authorization": f"Bearer {API_KEY}"}
-        
+        """Hugging Face API 호출 (같은 요청이 이미 진행 중이면 그 결과를 함께 받음)"""
+        return _generation_flight.do(request_key(prompt, GENERATION_PARAMETERS), self._post_model_api, prompt)
+
+    def _post_model_api(self, prompt: str) -> str:
+        """서킷이 열려 있으면 CircuitOpenError로 바로 실패 (호출한 쪽은 문제 은행 등 대체 경로 사용)"""
+        return _generation_caller.call(self._post_once, prompt)
+
+    def _post_once(self, prompt: str) -> str:
+        if HF_API_BATCH_INPUTS:
+            return _generation_batcher.submit(prompt)
+        return _post_prompts([prompt])[0]
+
+    def call_model_api_stream(self, prompt: str) -> Iterator[str]:
+        """Hugging Face API 스트리밍 호출 - 생성된 토큰 텍스트를 도착하는 대로 yield"""
+        logger.info("Calling Hugging Face API (stream)...")
+        headers = {"Authorization": f"Bearer {get_huggingface_api_key()}"}
+
+        limiter = get_rate_limiter()
+        prompt_tokens = estimate_tokens(prompt)
+        reserved_tokens = prompt_tokens + GENERATION_PARAMETERS["max_new_tokens"]
+        breaker = _generation_caller.breaker
+        breaker.allow()
         try:
-            response = requests.post(API_URL, headers=headers, json={"inputs": prompt})
-            response.raise_for_status()
-            
-            response_data = response.json()
-            logger.debug(f"Raw API response: {response_data}")
-            
-            # API 응답이 리스트인 경우 처리
-            if isinstance(response_data, list):
-                if response_data and isinstance(response_data[0], dict):
-                    generated_text = response_data[0].get('generated_text', '')
-                else:
-                    generated_text = response_data[0] if response_data else ''
-            # API 응답이 딕셔너리인 경우 처리
-            elif isinstance(response_data, dict):
-                generated_text = response_data.get('generated_text', '')
-            else:
-                generated_text = str(response_data)
-                
-            logger.info(f"Generated text: {generated_text}")
-            return generated_text
-            
-        except requests.exceptions.RequestException as e:
-            logger.error(f"API request failed: {e}")
+            limiter.acquire(reserved_tokens, caller=RATE_LIMIT_CALLER)
+        except Exception:
+            # 클라이언트 쪽 rate limit 거절은 상위 API 실패가 아니므로 서킷에 기록하지 않음
+            breaker.release()
             raise
-        except Exception as e:
-            logger.error(f"Unexpected error in call_model_api: {e}")
+
+        # 스트리밍은 토큰 이벤트 하나가 토큰 하나이므로 완성 토큰 수를 그대로 셀 수 있음
+        completion_tokens = 0
+        payload = {"inputs": prompt, "parameters": GENERATION_PARAMETERS, "stream": True}
+        try:
+            # 스트리밍에서는 timeout이 토큰 사이의 최대 대기 시간으로 적용됨
+            with requests.post(API_URL, headers=headers, json=payload, stream=True,
+                               timeout=API_REQUEST_TIMEOUT_SECONDS) as response:
+                response.raise_for_status()
+                # Server-Sent Events: 'data:{"token": {"text": ..., "special": ...}, ...}' 형식의 줄이 이어서 옴
+                for raw_line in response.iter_lines(decode_unicode=True):
+                    if not raw_line or not raw_line.startswith("data:"):
+                        continue
+                    payload = raw_line[len("data:"):].strip()
+                    if payload == "[DONE]":
+                        break
+                    event = json.loads(payload)
+                    if "error" in event:
+                        raise RuntimeError(f"Streaming API error: {event['error']}")
+                    token = event.get("token") or {}
+                    completion_tokens += 1
+                    if token.get("special"):
+                        continue
+                    if token.get("text"):
+                        yield token["text"]
+            breaker.record_success()
+        except GeneratorExit:
+            # 필요한 필드를 다 받아 호출한 쪽이 일찍 닫은 경우도 정상 응답
+            breaker.record_success()
+            raise
+        except Exception:
+            breaker.record_failure()
             raise
+        finally:
+            # 조기 종료(generator close)된 경우에도 그때까지 받은 만큼 정산
+            limiter.record_usage(RATE_LIMIT_CALLER, prompt_tokens, completion_tokens, reserved_tokens)
+
     def parse_model_output(self, output: str) -> GeneratedQuestion:
         if not isinstance(output, str):
             logger.error(f"Invalid output format: {type(output)}. Expected string.")
             raise ValueError("Model output is not a string.")
 
         logger.info(f"Parsing output: {output}")
-        output_lines = output.strip().splitlines()
-        logger.debug(f"Split output into lines: {output_lines}")
-
-        question, choices, correct_answer, explanation = "", {}, "", ""
-
-        for line in output_lines:
-            if line.lower().startswith("question:"):
-                question = line.split(":", 1)[1].strip()
-            elif line.startswith("A)"):
-                choices["A"] = line[2:].strip()
-            elif line.startswith("B)"):
-                choices["B"] = line[2:].strip()
-            elif line.startswith("C)"):
-                choices["C"] = line[2:].strip()
-            elif line.startswith("D)"):
-                choices["D"] = line[2:].strip()
-            elif line.lower().startswith("correct answer:"):
-                correct_answer = line.split(":", 1)[1].strip()
-            elif line.lower().startswith("explanation:"):
-                explanation = line.split(":", 1)[1].strip()
-
-        if not question or len(choices) < 4 or not correct_answer or not explanation:
-            logger.warning("Incomplete generated question.")
-        return GeneratedQuestion(question, choices, correct_answer, explanation)
+        # "A." / "(A)" / 굵은 글씨 / 여러 줄 선지 등 변형을 한 번에 처리하는 파서 사용
+        parsed = parse_question_output(output)
+        return GeneratedQuestion(parsed["question"], parsed["choices"], parsed["correct_answer"], parsed["explanation"])
+
+    def validate_generated_question(self, generated_question: GeneratedQuestion, original_question_text: Optional[str] = None) -> List[str]:
+        """비싼 정답 검증 전에 돌리는 구조 검증. 문제가 없으면 빈 리스트"""
+        return validate_question_structure(
+            generated_question.question,
+            generated_question.choices,
+            generated_question.correct_answer,
+            original_question_text,
+        )
 
     def generate_similar_question_with_text(self, construct_name: str, subject_name: str, question_text: str, correct_answer_text: str, wrong_answer_text: str, misconception_id: float) -> Tuple[Optional[GeneratedQuestion], Optional[str]]:
         logger.info("generate_similar_question_with_text initiated")
@@ -187,6 +262,12 @@ class SimilarQuestionGenerator:
             # 파싱
             generated_question = self.parse_model_output(generated_text)
             logger.info(f"Generated question object: {generated_question}")
+
+            # 형식이 깨진 문제는 검증(추론 여러 번)에 보내기 전에 바로 거절
+            problems = self.validate_generated_question(generated_question, question_text)
+            if problems:
+                logger.warning(f"Rejected generated question: {problems}")
+                return None, generated_text
             return generated_question, generated_text
 
         except Exception as e:
@@ -194,3 +275,35 @@ class SimilarQuestionGenerator:
             logger.debug(f"API output for debugging: {generated_text}")
             return None, generated_text
 
+    def stream_similar_question(self, construct_name: str, subject_name: str, question_text: str, correct_answer_text: str, wrong_answer_text: str, misconception_id: float) -> Iterator[Tuple[str, object]]:
+        """
+        유사 문제를 스트리밍으로 생성합니다.
+        필드가 완성될 때마다 ('question' | 'A'~'D' | 'correct_answer' | 'explanation', 값)을 yield하고,
+        마지막에 ('result', GeneratedQuestion)을 yield합니다. 구조 검증에 실패하면 ('result', None).
+        """
+        misconception_text = self.get_misconception_text(misconception_id)
+        prompt = self.generate_prompt(construct_name, subject_name, question_text, correct_answer_text, wrong_answer_text, misconception_text)
+
+        parser = StreamingQuestionParser()
+        stream = self.call_model_api_stream(prompt)
+        try:
+            for chunk in stream:
+                yield from parser.feed(chunk)
+                if parser.is_complete:
+                    # 해설 줄까지 받았으면 남은 토큰은 기다리지 않고 연결을 닫음
+                    break
+        finally:
+            stream.close()
+        yield from parser.finish()
+
+        generated_question = GeneratedQuestion(
+            parser.fields.get("question", ""),
+            parser.choices,
+            parser.fields.get("correct_answer", ""),
+            parser.fields.get("explanation", ""),
+        )
+        problems = self.validate_generated_question(generated_question, question_text)
+        if problems:
+            logger.warning(f"Rejected generated question (stream): {problems}")
+            generated_question = None
+        yield "result", generated_question
@@ -5,6 +5,7 @@ from dataclasses import dataclass
 import logging
 from dotenv import load_dotenv
 import os
+from src.data_store import load_misconception_mapping
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -41,7 +42,7 @@ class SimilarQuestionGenerator:
 
     def _load_data(self, misconception_csv_path: str):
         logger.info("Loading misconception mapping...")
-        self.misconception_df = pd.read_csv(misconception_csv_path)
+        self.misconception_df = load_misconception_mapping(misconception_csv_path)
 
     def get_misconception_text(self, misconception_id: float) -> Optional[str]:
         # MisconceptionId를 받아 해당 ID에 매칭되는 오개념 설명 텍스트를 반환합니다
@@ -1,16 +1,49 @@
 # module2.py
 import pandas as pd
+import threading
 import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer
-from typing import Tuple, Optional
-from dataclasses import dataclass
+import transformers
+from packaging import version
+from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+from typing import Iterator, List, Tuple, Optional
+from dataclasses import dataclass, field
 import logging
-from config import Llama3_8b_PATH
+from src.config import Llama3_8b_PATH, LOCAL_GENERATION_BATCH_SIZE, MICRO_BATCH_MAX_SIZE, MICRO_BATCH_WAIT_SECONDS
+from src.model_loading import load_causal_lm
+from src.micro_batcher import MicroBatcher
+from src.prefix_cache import PrefixKVCache
+from src.data_store import load_misconception_mapping
+from src.SecondModule.output_parser import StreamingQuestionParser, is_generation_complete, parse_question_output, validate_question_structure
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# assistant 턴을 '---'로 미리 시작해서 모델이 바로 "Question:"부터 쓰도록 함
+ASSISTANT_PREFILL = "\n\n---\n"
+MAX_NEW_TOKENS = 300
+
+# 모든 생성 프롬프트가 공유하는 system 블록 (역할 + 출력 형식). KV cache를 한 번만 계산해 재사용하며,
+# 토큰 경계가 바뀌지 않도록 special token(<|eot_id|>)에서 끝남
+PROMPT_PREFIX = """
+            <|begin_of_text|>
+            <|start_header_id|>system<|end_header_id|>
+            You are an educational assistant designed to generate multiple-choice questions.
+            Given the details of an original question, you create a similar multiple-choice question.
+
+            Please follow this output format:
+            ---
+            Question: <Your Question Text>
+            A) <Choice A>
+            B) <Choice B>
+            C) <Choice C>
+            D) <Choice D>
+            Correct Answer: <Correct Choice (e.g., A)>
+            Explanation: <Brief explanation for the correct answer>
+            ---
+            Ensure that the question is conceptually similar but not identical to the original. Ensure clarity and educational value.
+            <|eot_id|>""".lstrip()
+
 @dataclass
 class GeneratedQuestion:
     question: str
@@ -18,6 +51,44 @@ class GeneratedQuestion:
     correct_answer: str
     explanation: str
 
+@dataclass
+class GenerationRequest:
+    construct_name: str
+    subject_name: str
+    question_text: str
+    correct_answer_text: str
+    wrong_answer_text: str
+    misconception_id: float
+
+@dataclass
+class GenerationOutcome:
+    """generate_batch의 요청별 결과. question이 None이면 problems에 거절/실패 사유가 들어 있음"""
+    question: Optional[GeneratedQuestion]
+    raw_output: Optional[str]
+    problems: List[str] = field(default_factory=list)
+
+# transformers 4.39부터 StoppingCriteria가 시퀀스별 BoolTensor를 반환할 수 있음. 그 이전 버전은 bool 하나만 받음
+PER_SEQUENCE_STOPPING = version.parse(transformers.__version__) >= version.parse("4.39.0")
+
+class QuestionCompleteCriteria(StoppingCriteria):
+    """
+    새로 생성된 부분에 해설과 닫는 구분선까지 나오면 해당 시퀀스의 생성을 멈춤.
+    시퀀스별로 멈출 수 없는 이전 transformers에서는 배치의 모든 시퀀스가 끝났을 때 멈춤
+    """
+
+    def __init__(self, tokenizer, prompt_length: int):
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+
+    def __call__(self, input_ids, scores, **kwargs):
+        # <|eot_id|>로 끝난 시퀀스도 알아볼 수 있도록 special token을 남긴 채 디코딩
+        # (Llama 3 토크나이저의 eos_token은 <|end_of_text|>라 eos_token_id만으로는 턴 종료에서 멈추지 않음)
+        texts = self.tokenizer.batch_decode(input_ids[:, self.prompt_length:], skip_special_tokens=False)
+        completed = [is_generation_complete(text) for text in texts]
+        if not PER_SEQUENCE_STOPPING:
+            return all(completed)
+        return torch.tensor(completed, dtype=torch.bool, device=input_ids.device)
+
 class SimilarQuestionGenerator:
     def __init__(self, misconception_csv_path: str = 'misconception_mapping.csv', model_name: str = 'meta-llama/Meta-Llama-3-8B-Instruct'):
         """
@@ -25,29 +96,21 @@ class SimilarQuestionGenerator:
         """
         self._load_data(misconception_csv_path)
         self._load_model(model_name)
+        # 고정 system 블록(PROMPT_PREFIX)의 KV cache를 재사용해 요청마다 user 블록만 prefill
+        self._prefix_cache = PrefixKVCache(self.model, self.tokenizer)
+        # 동시에 들어온 생성 요청을 모아 model.generate 한 번으로 처리
+        self._batcher = MicroBatcher(self._generate_texts, max_batch_size=MICRO_BATCH_MAX_SIZE,
+                                     max_wait_seconds=MICRO_BATCH_WAIT_SECONDS, name="local-generation-batcher")
 
     def _load_data(self, misconception_csv_path: str):
         """Load misconception mapping data."""
         logger.info("Loading misconception mapping...")
-        self.misconception_df = pd.read_csv(misconception_csv_path)
+        self.misconception_df = load_misconception_mapping(misconception_csv_path)
 
     def _load_model(self, model_name: str):
         """Load the language model."""
         logger.info(f"Loading model '{model_name}' from '{Llama3_8b_PATH}'...")
-        self.tokenizer = AutoTokenizer.from_pretrained(model_name, cache_dir=Llama3_8b_PATH, trust_remote_code=True)
-        self.model = AutoModelForCausalLM.from_pretrained(
-            model_name,
-            cache_dir=Llama3_8b_PATH,
-            torch_dtype=torch.bfloat16 if torch.cuda.is_available() else torch.float32,
-            trust_remote_code=True,
-            device_map="auto"
-        )
-        self.model.eval()
-        if torch.cuda.is_available():
-            self.model.to('cuda')
-            logger.info("Model loaded on GPU.")
-        else:
-            logger.info("Model loaded on CPU.")
+        self.tokenizer, self.model = load_causal_lm(model_name)
 
     def get_misconception_text(self, misconception_id: float) -> Optional[str]:
         """Retrieve the misconception text based on the misconception ID."""
@@ -59,63 +122,36 @@ class SimilarQuestionGenerator:
 
     def generate_prompt(self, construct_name: str, subject_name: str, question_text: str, correct_answer_text: str, wrong_answer_text: str, misconception_text: str) -> str:
         """Create a prompt for the language model."""
-        misconception_clause = (f"that targets the following misconception: \"{misconception_text}\"." if misconception_text != "There is no misconception" else "")
-        prompt = f"""
-            <|begin_of_text|>
-            <|start_header_id|>system<|end_header_id|>
-            You are an educational assistant designed to generate multiple-choice questions {misconception_clause}
-            <|eot_id|>
+        misconception_clause = (f"that targets the following misconception: \"{misconception_text}\" " if misconception_text != "There is no misconception" else "")
+        # 문제마다 달라지는 내용(오개념, 원본 문제)은 공통 system 블록 뒤의 user 블록에 둠
+        prompt = PROMPT_PREFIX + f"""
             <|start_header_id|>user<|end_header_id|>
-            You need to create a similar multiple-choice question based on the following details:
+            You need to create a similar multiple-choice question {misconception_clause}based on the following details:
 
             Construct Name: {construct_name}
             Subject Name: {subject_name}
             Question Text: {question_text}
             Correct Answer: {correct_answer_text}
             Wrong Answer: {wrong_answer_text}
-
-            Please follow this output format:
-            ---
-            Question: <Your Question Text>
-            A) <Choice A>
-            B) <Choice B>
-            C) <Choice C>
-            D) <Choice D>
-            Correct Answer: <Correct Choice (e.g., A)>
-            Explanation: <Brief explanation for the correct answer>
-            ---
-            Ensure that the question is conceptually similar but not identical to the original. Ensure clarity and educational value.
             <|eot_id|>
             <|start_header_id|>assistant<|end_header_id|>
-        """.strip()
+        """.rstrip() + ASSISTANT_PREFILL
         logger.debug(f"Generated prompt: {prompt}")
         return prompt
 
     def parse_model_output(self, output: str) -> GeneratedQuestion:
         """Parse the model's output to extract the question details."""
-        output_lines = output.strip().splitlines()
-        question, choices, correct_answer, explanation = "", {}, "", ""
-
-        for line in output_lines:
-            line = line.strip()
-            if line.lower().startswith("question:"):
-                question = line.split(":", 1)[1].strip()
-            elif line.startswith("A)"):
-                choices["A"] = line[2:].strip()
-            elif line.startswith("B)"):
-                choices["B"] = line[2:].strip()
-            elif line.startswith("C)"):
-                choices["C"] = line[2:].strip()
-            elif line.startswith("D)"):
-                choices["D"] = line[2:].strip()
-            elif line.lower().startswith("correct answer:"):
-                correct_answer = line.split(":",1)[1].strip()
-            elif line.lower().startswith("explanation:"):
-                explanation = line.split(":",1)[1].strip()
-
-        if not question or len(choices) < 4 or not correct_answer or not explanation:
-            logger.warning("Incomplete generated question. Some fields might be missing.")
-        return GeneratedQuestion(question, choices, correct_answer, explanation)
+        parsed = parse_question_output(output)
+        return GeneratedQuestion(parsed["question"], parsed["choices"], parsed["correct_answer"], parsed["explanation"])
+
+    def validate_generated_question(self, generated_question: GeneratedQuestion, original_question_text: Optional[str] = None) -> List[str]:
+        """Cheap structural checks to run before any expensive verification."""
+        return validate_question_structure(
+            generated_question.question,
+            generated_question.choices,
+            generated_question.correct_answer,
+            original_question_text,
+        )
 
     def generate_similar_question_with_text(self, construct_name: str, subject_name: str, question_text: str, correct_answer_text: str, wrong_answer_text: str, misconception_id: float) -> Tuple[Optional[GeneratedQuestion], Optional[str]]:
         """Generate a similar question and return the details."""
@@ -126,34 +162,142 @@ class SimilarQuestionGenerator:
 
         prompt = self.generate_prompt(construct_name, subject_name, question_text, correct_answer_text, wrong_answer_text, misconception_text)
 
-        inputs = self.tokenizer(prompt, return_tensors='pt')
-        if torch.cuda.is_available():
-            inputs = {k: v.to('cuda') for k, v in inputs.items()}
+        # 다른 호출과 함께 배치로 생성되며, 프롬프트 뒤에 새로 생성된 assistant 부분만 돌려받음
+        generated_text = self._batcher.submit(prompt)
+
+        outcome = self._to_outcome(generated_text, question_text)
+        if outcome.question is None:
+            logger.warning(f"Rejected generated question: {outcome.problems}")
+        else:
+            logger.info("Successfully generated a similar question.")
+        return outcome.question, generated_text
+
+    def generate_batch(self, requests: List[GenerationRequest], batch_size: int = LOCAL_GENERATION_BATCH_SIZE) -> List[GenerationOutcome]:
+        """
+        여러 유사 문제를 batch_size개씩 묶어 model.generate 한 번으로 생성합니다. (문제 은행 전체를 오프라인으로 생성할 때 사용)
+        결과는 requests와 같은 순서의 GenerationOutcome 리스트이며, 한 배치가 실패해도 나머지 배치는 계속 진행합니다.
+        """
+        outcomes: List[Optional[GenerationOutcome]] = [None] * len(requests)
+        prompts = {}
+        for index, request in enumerate(requests):
+            misconception_text = self.get_misconception_text(request.misconception_id)
+            if not misconception_text:
+                outcomes[index] = GenerationOutcome(None, None, [f"unknown misconception: {request.misconception_id}"])
+                continue
+            prompts[index] = self.generate_prompt(request.construct_name, request.subject_name, request.question_text,
+                                                  request.correct_answer_text, request.wrong_answer_text, misconception_text)
+
+        # 길이가 비슷한 프롬프트끼리 묶어 패딩 낭비를 줄임
+        order = sorted(prompts, key=lambda index: len(prompts[index]))
+        for start in range(0, len(order), batch_size):
+            chunk = order[start:start + batch_size]
+            try:
+                texts = self._generate_texts([prompts[index] for index in chunk])
+            except Exception as e:
+                logger.error(f"Batch generation failed for {len(chunk)} request(s): {e}")
+                for index in chunk:
+                    outcomes[index] = GenerationOutcome(None, None, [f"generation failed: {e}"])
+                continue
+            for index, text in zip(chunk, texts):
+                outcomes[index] = self._to_outcome(text, requests[index].question_text)
+            logger.info(f"Generated {min(start + batch_size, len(order))}/{len(order)} question(s)")
+        return outcomes
+
+    def _to_outcome(self, generated_text: str, question_text: str) -> GenerationOutcome:
+        """assistant 부분만 남기고 파싱/구조 검증"""
+        assistant_text = generated_text.split("<|eot_id|>", 1)[0].strip()
+        try:
+            generated_question = self.parse_model_output(assistant_text)
+        except Exception as e:
+            logger.error(f"Failed to parse generated question: {e}")
+            return GenerationOutcome(None, generated_text, [f"unparseable output: {e}"])
+        problems = self.validate_generated_question(generated_question, question_text)
+        if problems:
+            return GenerationOutcome(None, generated_text, problems)
+        return GenerationOutcome(generated_question, generated_text)
+
+    def _generate_texts(self, prompts: List[str]) -> List[str]:
+        """
+        프롬프트 여러 개를 패딩과 attention mask로 묶어 model.generate 한 번으로 생성하고, 프롬프트별 생성 텍스트를 반환.
+        공통 system 블록은 캐시된 KV를 재사용하고, 그 뒤의 user 블록만 왼쪽 패딩해서 prefill 합니다.
+        """
+        device = self.model.device
+        inputs = self._prefix_cache.prepare(prompts, PROMPT_PREFIX, device)
 
+        # 패딩이 프롬프트 끝이 아닌 앞쪽에 들어가므로 모든 행의 프롬프트가 같은 위치에서 끝남
+        prompt_length = inputs['input_ids'].shape[1]
         with torch.no_grad():
             outputs = self.model.generate(
                 **inputs,
-                max_length=1000,
+                max_new_tokens=MAX_NEW_TOKENS,
                 num_return_sequences=1,
                 temperature=0.7,
                 top_p=0.9,
                 do_sample=True,
-                eos_token_id=self.tokenizer.eos_token_id
+                eos_token_id=self.tokenizer.eos_token_id,
+                pad_token_id=self.tokenizer.pad_token_id,
+                stopping_criteria=StoppingCriteriaList([QuestionCompleteCriteria(self.tokenizer, prompt_length)])
             )
-        generated_text = self.tokenizer.decode(outputs[0], skip_special_tokens=False)
+        return self.tokenizer.batch_decode(outputs[:, prompt_length:], skip_special_tokens=True)
 
-        assistant_start = generated_text.find("<|start_header_id|>assistant<|end_header_id|>")
-        if assistant_start != -1:
-            assistant_start += len("<|start_header_id|>assistant<|end_header_id|>")
-            assistant_text = generated_text[assistant_start:].strip()
-        else:
-            # If no special tokens found, use whole text
-            assistant_text = generated_text
+    def _generate_stream(self, prompt: str) -> Iterator[str]:
+        """model.generate를 별도 스레드에서 돌리고, 새로 생성된 텍스트를 TextIteratorStreamer로 받는 대로 yield"""
+        device = self.model.device
+        inputs = self._prefix_cache.prepare([prompt], PROMPT_PREFIX, device)
+
+        # skip_prompt=True: 프롬프트는 다시 내보내지 않고 assistant 부분만 스트리밍
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        prompt_length = inputs['input_ids'].shape[1]
+        generation_kwargs = dict(
+            **inputs,
+            max_new_tokens=MAX_NEW_TOKENS,
+            num_return_sequences=1,
+            temperature=0.7,
+            top_p=0.9,
+            do_sample=True,
+            eos_token_id=self.tokenizer.eos_token_id,
+            stopping_criteria=StoppingCriteriaList([QuestionCompleteCriteria(self.tokenizer, prompt_length)]),
+            streamer=streamer,
+        )
 
+        def _run():
+            with torch.no_grad():
+                self.model.generate(**generation_kwargs)
+
+        thread = threading.Thread(target=_run, daemon=True)
+        thread.start()
         try:
-            generated_question = self.parse_model_output(assistant_text)
-            logger.info("Successfully generated a similar question.")
-            return generated_question, generated_text
-        except Exception as e:
-            logger.error(f"Failed to parse generated question: {e}")
-            return None, generated_text
+            for text in streamer:
+                yield text
+        finally:
+            thread.join()
+
+    def stream_similar_question(self, construct_name: str, subject_name: str, question_text: str, correct_answer_text: str, wrong_answer_text: str, misconception_id: float) -> Iterator[Tuple[str, object]]:
+        """
+        유사 문제를 스트리밍으로 생성합니다.
+        필드가 완성될 때마다 (필드 이름, 값)을 yield하고, 마지막에 ('result', GeneratedQuestion)을 yield합니다.
+        구조 검증에 실패하면 ('result', None).
+        """
+        misconception_text = self.get_misconception_text(misconception_id)
+        if not misconception_text:
+            logger.info("Skipping question generation due to lack of misconception.")
+            return
+
+        prompt = self.generate_prompt(construct_name, subject_name, question_text, correct_answer_text, wrong_answer_text, misconception_text)
+
+        parser = StreamingQuestionParser()
+        for chunk in self._generate_stream(prompt):
+            yield from parser.feed(chunk)
+        yield from parser.finish()
+
+        generated_question = GeneratedQuestion(
+            parser.fields.get("question", ""),
+            parser.choices,
+            parser.fields.get("correct_answer", ""),
+            parser.fields.get("explanation", ""),
+        )
+        problems = self.validate_generated_question(generated_question, question_text)
+        if problems:
+            logger.warning(f"Rejected generated question: {problems}")
+            generated_question = None
+        yield "result", generated_question
@@ -0,0 +1,196 @@
+# output_parser.py
+# 모델 출력에서 문제/선지/정답/해설을 한 번에 파싱하고, 비싼 검증 전에 구조가 올바른지 확인합니다.
+# 토큰 단위로 들어오는 스트리밍 출력도 같은 규칙으로 필드가 완성되는 즉시 꺼낼 수 있습니다.
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+FIELD_QUESTION = 'question'
+FIELD_CORRECT_ANSWER = 'correct_answer'
+FIELD_EXPLANATION = 'explanation'
+CHOICE_FIELDS = ('A', 'B', 'C', 'D')
+
+# 필드가 시작되는 줄. "Question:", "**Question:**", "A)", "A.", "(A)", "**A)**", "- B)" 같은 변형을 모두 처리
+_FIELD_LINE = re.compile(r"""
+    ^\s*(?:[-*]\s+)?(?:\*\*|__)?
+    (?:
+        (?P<label>question|correct\s+answer|answer|explanation)(?:\s*\d+)?\s*(?:\*\*|__)?\s*:
+      | \(?(?-i:(?P<option>[A-D]))\s*[).:]
+    )
+    (?:\*\*|__)?\s*(?P<value>.*?)\s*$
+""", re.IGNORECASE | re.VERBOSE)
+_SEPARATOR_LINE = re.compile(r"^\s*-{3,}\s*$")
+_END_OF_TURN = "<|eot_id|>"
+_ANSWER_LETTER = re.compile(r"^\W*([A-D])\b")
+
+
+
+@dataclass
+class GeneratedQuestion:
+    question: str
+    choices: dict
+    correct_answer: str
+    explanation: str
+
+
+_LABEL_FIELDS = {
+    'question': FIELD_QUESTION,
+    'correct answer': FIELD_CORRECT_ANSWER,
+    'answer': FIELD_CORRECT_ANSWER,
+    'explanation': FIELD_EXPLANATION,
+}
+
+# 출력 형식의 마지막 필드인 Explanation 뒤에 닫는 구분선(---)이나 턴 종료 토큰이 나오면 더 이상 쓸 토큰이 없음.
+# 해설은 여러 줄일 수 있으므로 줄바꿈만으로는 끝으로 보지 않음
+_EXPLANATION_DONE = re.compile(
+    r"^\s*(?:\*\*|__)?explanation(?:\*\*|__)?\s*:.*?(?:^[ \t]*-{3,}[ \t]*$|<\|eot_id\|>)",
+    re.IGNORECASE | re.MULTILINE | re.DOTALL,
+)
+
+
+def is_generation_complete(text: str) -> bool:
+    """생성 중인 텍스트에서 필요한 구조(해설과 그 뒤의 구분선/턴 종료)가 끝났는지 확인"""
+    return _EXPLANATION_DONE.search(text) is not None
+
+
+def classify_line(line: str) -> Optional[Tuple[str, str]]:
+    """필드가 시작되는 줄이면 (필드 이름, 값), 아니면 None"""
+    match = _FIELD_LINE.match(line)
+    if match is None:
+        return None
+    if match.group('option'):
+        field = match.group('option')
+    else:
+        field = _LABEL_FIELDS[re.sub(r"\s+", " ", match.group('label').lower())]
+    return field, match.group('value').strip('*_ ')
+
+
+def normalize_answer_letter(value: str, choices: Dict[str, str]) -> str:
+    """'B', 'B) 4', '(B)', '**B**' 같은 정답 표기를 'B'로. 글자가 없으면 선지 텍스트와 비교"""
+    match = _ANSWER_LETTER.match(value)
+    if match:
+        return match.group(1)
+    for option, text in choices.items():
+        if value and _normalize_text(value) == _normalize_text(text):
+            return option
+    return value.strip()
+
+
+def _normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+class StreamingQuestionParser:
+    """
+    feed()로 텍스트 조각을 넣으면 완성된 필드를 (필드 이름, 값)으로 돌려줍니다.
+    여러 줄에 걸친 필드를 지원하므로, 필드는 다음 필드가 시작될 때(또는 finish() 때) 완성된 것으로 봅니다.
+    마지막 필드인 해설은 닫는 구분선(---)이나 턴 종료 토큰이 보이는 즉시 완성되어 is_complete가 참이 됩니다.
+    필드 이름은 'question', 'A'~'D', 'correct_answer', 'explanation' 중 하나입니다.
+    """
+
+    def __init__(self):
+        self._buffer = ''
+        self._current: Optional[str] = None
+        self._lines: List[str] = []
+        self.fields: Dict[str, str] = {}
+
+    def _flush_current(self) -> List[Tuple[str, str]]:
+        if self._current is None:
+            return []
+        field, value = self._current, "\n".join(self._lines).strip()
+        self._current, self._lines = None, []
+        if self.fields.get(field):
+            # 같은 필드가 다시 나오면 처음 값을 유지 (모델이 형식을 반복하는 경우)
+            return []
+        if field == FIELD_CORRECT_ANSWER:
+            value = normalize_answer_letter(value, self.choices)
+        self.fields[field] = value
+        return [(field, value)]
+
+    def _is_continuation(self, field: str) -> bool:
+        """선지처럼 보이는 줄이라도 해설 안이거나 네 선지가 이미 다 나온 뒤라면 ("A. is wrong because...") 본문으로 봄"""
+        if field not in CHOICE_FIELDS:
+            return False
+        if self._current == FIELD_EXPLANATION:
+            return True
+        filled = set(option for option in CHOICE_FIELDS if self.fields.get(option))
+        if self._current in CHOICE_FIELDS and self._lines:
+            filled.add(self._current)
+        return len(filled) == len(CHOICE_FIELDS)
+
+    def _consume_line(self, line: str) -> List[Tuple[str, str]]:
+        if _END_OF_TURN in line:
+            return self._consume_line(line.split(_END_OF_TURN, 1)[0]) + self._flush_current()
+        if _SEPARATOR_LINE.match(line):
+            return self._flush_current()
+        parsed = classify_line(line)
+        if parsed is not None and self._is_continuation(parsed[0]):
+            parsed = None
+        if parsed is not None:
+            events = self._flush_current()
+            self._current, first_value = parsed
+            self._lines = [first_value] if first_value else []
+            return events
+        if self._current is not None and line.strip():
+            self._lines.append(line.strip())
+        return []
+
+    def feed(self, chunk: str) -> List[Tuple[str, str]]:
+        self._buffer += chunk
+        events = []
+        while '\n' in self._buffer:
+            line, self._buffer = self._buffer.split('\n', 1)
+            events.extend(self._consume_line(line))
+        # 해설 뒤의 닫는 구분선/턴 종료 토큰은 스트림 끝에 줄바꿈 없이 올 수 있으므로 줄이 끝나기를 기다리지 않음
+        if self._current == FIELD_EXPLANATION and (_END_OF_TURN in self._buffer or _SEPARATOR_LINE.match(self._buffer)):
+            line, self._buffer = self._buffer, ''
+            events.extend(self._consume_line(line))
+            events.extend(self._flush_current())
+        return events
+
+    def finish(self) -> List[Tuple[str, str]]:
+        """스트림 종료 시 남은 줄과 마지막 필드를 처리"""
+        line, self._buffer = self._buffer, ''
+        return self._consume_line(line) + self._flush_current()
+
+    @property
+    def is_complete(self) -> bool:
+        return all(self.fields.get(field) for field in (FIELD_QUESTION, *CHOICE_FIELDS, FIELD_CORRECT_ANSWER, FIELD_EXPLANATION))
+
+    @property
+    def choices(self) -> Dict[str, str]:
+        return {option: self.fields[option] for option in CHOICE_FIELDS if option in self.fields}
+
+
+def parse_question_output(output: str) -> Dict[str, object]:
+    """전체 출력을 한 번에 파싱해 question / choices / correct_answer / explanation 딕셔너리로 반환"""
+    parser = StreamingQuestionParser()
+    parser.feed(output)
+    parser.finish()
+    return {
+        FIELD_QUESTION: parser.fields.get(FIELD_QUESTION, ''),
+        'choices': parser.choices,
+        FIELD_CORRECT_ANSWER: parser.fields.get(FIELD_CORRECT_ANSWER, ''),
+        FIELD_EXPLANATION: parser.fields.get(FIELD_EXPLANATION, ''),
+    }
+
+
+def validate_question_structure(question: str, choices: Dict[str, str], correct_answer: str,
+                                original_question_text: Optional[str] = None) -> List[str]:
+    """
+    값싼 구조 검증. 문제가 없으면 빈 리스트, 있으면 사유 목록을 반환합니다.
+    (네 개의 서로 다른 비어 있지 않은 선지, A~D 정답, 원본과 다른 문제)
+    """
+    problems = []
+    if not question.strip():
+        problems.append("missing question text")
+    missing = [option for option in CHOICE_FIELDS if not choices.get(option, '').strip()]
+    if missing:
+        problems.append(f"missing choices: {', '.join(missing)}")
+    elif len({_normalize_text(choices[option]) for option in CHOICE_FIELDS}) < len(CHOICE_FIELDS):
+        problems.append("duplicate choices")
+    if correct_answer not in CHOICE_FIELDS:
+        problems.append(f"invalid correct answer: {correct_answer!r}")
+    if original_question_text and _normalize_text(question) == _normalize_text(original_question_text):
+        problems.append("question is identical to the original")
+    return problems
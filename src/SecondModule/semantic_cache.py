@@ -0,0 +1,133 @@
+# semantic_cache.py
+# 숫자만 다른 비슷한 문제들이 같은 misconception으로 들어오면, 이미 생성해 둔 유사 문제를 재사용하는 의미 기반 캐시
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+
+from src.config import EMBEDDING_MODEL_NAME, SEMANTIC_CACHE_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+# modul1.py(misconception 예측)의 질의와 비슷한 형식. id 숫자는 임베딩 모델에 의미가 없으므로 오개념 설명 텍스트를 넣음
+QUERY_TEMPLATE = (
+    "Construct: {construct_name}\n"
+    "Misconception: {misconception_text}\n"
+    "Question: {question_text}"
+)
+
+
+class _Bucket:
+    """misconception 하나에 대한 캐시 항목. 임베딩은 (n, dim) 행렬로 모아 두고 한 번의 행렬곱으로 비교"""
+
+    def __init__(self):
+        self.embeddings: Optional[np.ndarray] = None
+        self.questions: List[object] = []
+
+
+class SemanticQuestionCache:
+    """
+    (construct, misconception, question)을 sentence-transformer로 임베딩해서,
+    같은 misconception 안에서 코사인 유사도가 threshold 이상인 검증된 생성 결과를 돌려줍니다.
+    같은 학생에게는 이미 보여 준 문제를 다시 주지 않습니다.
+    """
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL_NAME, threshold: float = SEMANTIC_CACHE_THRESHOLD,
+                 max_entries_per_misconception: int = 64, encoder=None, max_students: int = 10000):
+        self.model_name = model_name
+        self.threshold = threshold
+        self.max_entries_per_misconception = max_entries_per_misconception
+        self._encoder = encoder
+        self._buckets: Dict[int, _Bucket] = {}
+        # 학생별로 이미 보여 준 문제 텍스트. 오래 쓰지 않은 학생부터 밀어내서 크기를 max_students로 제한
+        self.max_students = max_students
+        self._served: 'OrderedDict[str, Set[str]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._encoder_lock = threading.Lock()
+
+    def _get_encoder(self):
+        # sentence_transformers는 무거우므로 처음 사용할 때 로드
+        if self._encoder is None:
+            with self._encoder_lock:
+                if self._encoder is None:
+                    from sentence_transformers import SentenceTransformer
+                    logger.info(f"Loading embedding model '{self.model_name}' for semantic cache...")
+                    self._encoder = SentenceTransformer(self.model_name)
+        return self._encoder
+
+    def _embed(self, construct_name: str, misconception_text: Optional[str], question_text: str) -> np.ndarray:
+        query = QUERY_TEMPLATE.format(
+            construct_name=construct_name,
+            misconception_text=misconception_text or '',
+            question_text=question_text,
+        )
+        return np.asarray(self._get_encoder().encode(query, normalize_embeddings=True), dtype=np.float32)
+
+    def _served_for(self, student_id: str) -> Set[str]:
+        """self._lock을 잡은 상태에서 호출"""
+        served = self._served.get(student_id)
+        if served is None:
+            served = self._served[student_id] = set()
+            while len(self._served) > self.max_students:
+                self._served.popitem(last=False)
+        else:
+            self._served.move_to_end(student_id)
+        return served
+
+    def lookup(self, construct_name: str, question_text: str, misconception_id: float,
+               student_id: Optional[str] = None, misconception_text: Optional[str] = None):
+        """임계값 이상으로 가장 가까운 (이 학생이 아직 보지 않은) 캐시 결과. 없으면 None"""
+        misconception_id = int(misconception_id)
+        with self._lock:
+            bucket = self._buckets.get(misconception_id)
+            if bucket is None or bucket.embeddings is None:
+                return None
+
+        query = self._embed(construct_name, misconception_text, question_text)
+        with self._lock:
+            scores = bucket.embeddings @ query
+            served = self._served_for(student_id) if student_id is not None else set()
+            for index in np.argsort(-scores):
+                if scores[index] < self.threshold:
+                    break
+                question = bucket.questions[index]
+                if question.question in served:
+                    continue
+                if student_id is not None:
+                    served.add(question.question)
+                logger.info(f"Semantic cache hit for misconception {misconception_id} (similarity {scores[index]:.3f})")
+                return question
+        return None
+
+    def add(self, construct_name: str, question_text: str, misconception_id: float, generated_question,
+            misconception_text: Optional[str] = None):
+        """검증을 통과한 생성 결과를 캐시에 추가. misconception별로 오래된 항목부터 밀어냄"""
+        misconception_id = int(misconception_id)
+        embedding = self._embed(construct_name, misconception_text, question_text)
+        with self._lock:
+            bucket = self._buckets.setdefault(misconception_id, _Bucket())
+            if bucket.embeddings is None:
+                bucket.embeddings = embedding[np.newaxis, :]
+            else:
+                bucket.embeddings = np.vstack([bucket.embeddings, embedding])
+            bucket.questions.append(generated_question)
+            overflow = len(bucket.questions) - self.max_entries_per_misconception
+            if overflow > 0:
+                bucket.embeddings = bucket.embeddings[overflow:]
+                bucket.questions = bucket.questions[overflow:]
+
+    def mark_served(self, student_id: str, generated_question):
+        """캐시 밖에서 받은 문제도 같은 학생에게 다시 나가지 않도록 기록"""
+        with self._lock:
+            self._served_for(student_id).add(generated_question.question)
+
+    def claim(self, student_id: str, generated_question) -> bool:
+        """이 학생이 아직 보지 않은 문제면 본 것으로 기록하고 True, 이미 본 문제면 False"""
+        with self._lock:
+            served = self._served_for(student_id)
+            if generated_question.question in served:
+                return False
+            served.add(generated_question.question)
+            return True
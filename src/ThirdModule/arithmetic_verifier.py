@@ -0,0 +1,261 @@
+# arithmetic_verifier.py
+# 계산 문제(사칙연산, 분수, 거듭제곱, 괄호)를 LLM 없이 정확한 유리수 계산으로 검증하는 빠른 경로.
+# 확실하게 풀 수 있을 때만 답을 내고, 조금이라도 애매하면 None을 반환해서 LLM 검증으로 넘깁니다.
+import re
+from dataclasses import dataclass
+from fractions import Fraction
+from typing import Dict, List, Optional
+
+# 식의 값이 곧 정답이 아닌 질문 (반올림, 어림, 오류 찾기, 부정 질문 등)은 건너뜀
+_SKIP_WORDS = re.compile(
+    r"\b(not|round|rounded|rounding|estimate|approximate|approximately|nearest|significant|error|mistake|"
+    r"incorrect|wrong|correct\s+way|brackets?\s+need|which\s+of|true|false|greater|less|bigger|smaller|order)\b",
+    re.IGNORECASE,
+)
+# 식 앞에 올 수 있는 지시문. 이 외의 문장이 섞여 있으면 문장제이므로 건너뜀
+_LEAD_IN = re.compile(r"^(?:calculate|work\s+out|what\s+is|evaluate|find|simplify|solve)?\s*[:,]?\s*", re.IGNORECASE)
+_MATH_SEGMENT = re.compile(r"\\\((.*?)\\\)|\\\[(.*?)\\\]|\$\$(.*?)\$\$|\$(.*?)\$", re.DOTALL)
+
+MAX_EXPRESSION_LENGTH = 200
+MAX_EXPONENT = 64
+# 거듭제곱 결과의 분자/분모 크기 상한(비트). 중첩 거듭제곱((9^64)^64...)이 메모리/시간을 다 쓰지 않도록
+MAX_RESULT_BITS = 1024
+
+
+class UnsupportedExpression(ValueError):
+    """식을 안전하게 계산할 수 없는 경우 (지원하지 않는 기호, 0으로 나누기, 너무 큰 거듭제곱 등)"""
+
+
+@dataclass
+class ArithmeticVerdict:
+    answer: str
+    value: Fraction
+    explanation: str
+
+
+def _replace_fractions(text: str) -> str:
+    """\\frac{a}{b} (중첩 포함) → ((a)/(b)). 대분수 '2\\frac{1}{3}'은 (2+(1)/(3))"""
+    commands = ('\\dfrac', '\\tfrac', '\\frac')
+    while True:
+        positions = [(text.find(command), command) for command in commands if command in text]
+        if not positions:
+            return text
+        start, command = min(positions)
+        index = start + len(command)
+        parts = []
+        for _ in range(2):
+            while index < len(text) and text[index] == ' ':
+                index += 1
+            if index >= len(text) or text[index] != '{':
+                raise UnsupportedExpression("malformed \\frac")
+            depth, begin = 0, index
+            for index in range(begin, len(text)):
+                if text[index] == '{':
+                    depth += 1
+                elif text[index] == '}':
+                    depth -= 1
+                    if depth == 0:
+                        break
+            else:
+                raise UnsupportedExpression("unbalanced braces in \\frac")
+            parts.append(text[begin + 1:index])
+            index += 1
+        fraction = f"(({parts[0]})/({parts[1]}))"
+        whole = re.search(r"(\d+(?:\.\d+)?)\s*$", text[:start])
+        if whole:
+            # 대분수
+            start = whole.start()
+            fraction = f"({whole.group(1)}+{fraction})"
+        text = text[:start] + fraction + text[index:]
+
+
+def _normalize(expression: str) -> str:
+    text = expression.strip()
+    if len(text) > MAX_EXPRESSION_LENGTH:
+        raise UnsupportedExpression("expression too long")
+    text = text.rstrip('= ').strip()
+    for token in ('\\left', '\\right', '\\,', '\\!', '\\;', '\\ ', '~', '{,}'):
+        text = text.replace(token, '' if token != '\\ ' else ' ')
+    text = _replace_fractions(text)
+    replacements = {
+        '\\times': '*', '\\cdot': '*', '×': '*', '\\div': '/', '÷': '/',
+        '\\%': '%', '−': '-', '–': '-', '{': '(', '}': ')', '[': '(', ']': ')', '**': '^',
+    }
+    for old, new in replacements.items():
+        text = text.replace(old, new)
+    if '\\' in text or re.search(r"[A-Za-z]", text):
+        raise UnsupportedExpression("unsupported symbol")
+    return text
+
+
+_TOKEN = re.compile(r"\s*(?:(\d+(?:\.\d+)?|\.\d+)|(.))")
+
+
+def _tokenize(text: str) -> List[str]:
+    tokens = []
+    for number, symbol in _TOKEN.findall(text):
+        if number:
+            tokens.append(number)
+        elif symbol.strip():
+            if symbol not in '+-*/^()%':
+                raise UnsupportedExpression(f"unsupported symbol {symbol!r}")
+            tokens.append(symbol)
+    return tokens
+
+
+class _Parser:
+    """
+    재귀 하강 파서 (eval을 쓰지 않음). 모든 값은 Fraction으로 계산합니다.
+    expr := term (('+'|'-') term)* / term := unary (('*'|'/') unary | '(' expr ')')* /
+    unary := ('+'|'-') unary | power / power := postfix ('^' unary)? / postfix := atom '%'*
+    """
+
+    def __init__(self, tokens: List[str]):
+        self.tokens = tokens
+        self.position = 0
+
+    def _peek(self) -> Optional[str]:
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def _take(self) -> str:
+        token = self._peek()
+        if token is None:
+            raise UnsupportedExpression("unexpected end of expression")
+        self.position += 1
+        return token
+
+    def parse(self) -> Fraction:
+        if not self.tokens:
+            raise UnsupportedExpression("empty expression")
+        value = self._expr()
+        if self._peek() is not None:
+            raise UnsupportedExpression(f"unexpected token {self._peek()!r}")
+        return value
+
+    def _expr(self) -> Fraction:
+        value = self._term()
+        while self._peek() in ('+', '-'):
+            if self._take() == '+':
+                value += self._term()
+            else:
+                value -= self._term()
+        return value
+
+    def _term(self) -> Fraction:
+        value = self._unary()
+        divided = False
+        while self._peek() in ('*', '/', '('):
+            operator = self._peek()
+            if operator == '(':
+                # 괄호 앞 암묵적 곱셈: 3(2+4).
+                # 나눗셈 뒤(6 ÷ 2(1+2))에서는 암묵적 곱셈을 먼저 하는지 해석이 갈리므로 답을 내지 않음
+                if divided:
+                    raise UnsupportedExpression("ambiguous implicit multiplication after division")
+                value *= self._unary()
+                continue
+            self._take()
+            operand = self._unary()
+            if operator == '*':
+                value *= operand
+            elif operand == 0:
+                raise UnsupportedExpression("division by zero")
+            else:
+                value /= operand
+                divided = True
+        return value
+
+    def _unary(self) -> Fraction:
+        if self._peek() == '-':
+            self._take()
+            return -self._unary()
+        if self._peek() == '+':
+            self._take()
+            return self._unary()
+        return self._power()
+
+    def _power(self) -> Fraction:
+        base = self._postfix()
+        if self._peek() != '^':
+            return base
+        self._take()
+        exponent = self._unary()
+        if exponent.denominator != 1 or abs(exponent) > MAX_EXPONENT:
+            raise UnsupportedExpression("unsupported exponent")
+        if base == 0 and exponent < 0:
+            raise UnsupportedExpression("division by zero")
+        # 계산하기 전에 결과 크기를 어림해서 너무 크면 포기
+        if max(base.numerator.bit_length(), base.denominator.bit_length()) * abs(int(exponent)) > MAX_RESULT_BITS:
+            raise UnsupportedExpression("power result too large")
+        return base ** int(exponent)
+
+    def _postfix(self) -> Fraction:
+        value = self._atom()
+        while self._peek() == '%':
+            self._take()
+            value /= 100
+        return value
+
+    def _atom(self) -> Fraction:
+        token = self._take()
+        if token == '(':
+            value = self._expr()
+            if self._take() != ')':
+                raise UnsupportedExpression("unbalanced parentheses")
+            return value
+        if token[0].isdigit() or token[0] == '.':
+            if self._peek() is not None and (self._peek()[0].isdigit() or self._peek()[0] == '.'):
+                # '10 000'처럼 숫자가 이어지면 곱셈인지 자릿수 구분인지 알 수 없음
+                raise UnsupportedExpression("ambiguous adjacent numbers")
+            return Fraction(token)
+        raise UnsupportedExpression(f"unexpected token {token!r}")
+
+
+def evaluate(expression: str) -> Fraction:
+    """LaTeX/일반 표기 산술식을 정확히 계산. 계산할 수 없으면 UnsupportedExpression"""
+    return _Parser(_tokenize(_normalize(expression))).parse()
+
+
+def _strip_math(text: str) -> str:
+    match = _MATH_SEGMENT.fullmatch(text.strip())
+    if match:
+        return next(group for group in match.groups() if group is not None)
+    return text
+
+
+def _question_expression(question: str) -> Optional[str]:
+    """질문이 '식 하나 + (지시문)' 형태일 때 그 식을 반환"""
+    segments = [next(group for group in match.groups() if group is not None) for match in _MATH_SEGMENT.finditer(question)]
+    if segments:
+        if len(segments) != 1:
+            return None
+        prose = _MATH_SEGMENT.sub(' ', question)
+    else:
+        prose, segments = '', [_LEAD_IN.sub('', question.strip(), count=1)]
+    # 식 밖에는 지시문과 '?', '=' 정도만 허용
+    prose = _LEAD_IN.sub('', prose.strip(), count=1).strip(' ?=.:')
+    if prose:
+        return None
+    return segments[0].strip().rstrip('?').strip()
+
+
+def verify_arithmetic(question: str, choices: Dict[str, str]) -> Optional[ArithmeticVerdict]:
+    """
+    질문이 계산식 하나이고 네 선지가 모두 숫자로 계산될 때, 식의 값과 정확히 같은 선지가 하나뿐이면 그 선지를 반환.
+    그 외에는 None (LLM 검증으로 넘김)
+    """
+    if _SKIP_WORDS.search(question):
+        return None
+    expression = _question_expression(question)
+    if not expression:
+        return None
+    try:
+        target = evaluate(expression)
+        values = {option: evaluate(_strip_math(text)) for option, text in choices.items()}
+    except (UnsupportedExpression, ValueError, ZeroDivisionError, OverflowError):
+        return None
+
+    matches = [option for option, value in values.items() if value == target]
+    if len(matches) != 1:
+        return None
+    answer = matches[0]
+    return ArithmeticVerdict(answer, target, f"Arithmetic fast path: {expression.strip()} = {target}, matches choice {answer}")
@@ -1,39 +1,64 @@
 import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer
-from typing import Tuple
+from typing import List, Tuple
 import logging
-from config import Llama3_8b_PATH
+from src.config import Llama3_8b_PATH, MICRO_BATCH_MAX_SIZE, MICRO_BATCH_WAIT_SECONDS
+from src.model_loading import load_causal_lm
+from src.micro_batcher import MicroBatcher
+from src.prefix_cache import PrefixKVCache
+from src.ThirdModule.arithmetic_verifier import verify_arithmetic
+from src.ThirdModule.verification_cache import get_verification_cache
+import hashlib
 import re
 from collections import Counter
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
+SYSTEM_PROMPT = (
+    "You are an expert solution checker for multiple-choice questions. "
+    "You will be given a question and four choices (A, B, C, D). "
+    "Your job is to determine the single best answer. "
+    "You must reason step by step internally (chain-of-thought) but "
+    "DO NOT reveal your reasoning. "
+    "Output ONLY the final answer in the format: 'Answer: X' "
+    "with no extra text."
+)
+
+# 모든 검증 프롬프트가 공유하는 앞부분 (system 블록). KV cache를 한 번만 계산해 재사용하며,
+# 토큰 경계가 바뀌지 않도록 special token(<|eot_id|>)에서 끝남
+PROMPT_PREFIX = f"""
+            <|begin_of_text|>
+            <|start_header_id|>system<|end_header_id|>
+            {SYSTEM_PROMPT}
+            <|eot_id|>""".lstrip()
+
+# 샘플링 설정. 검증 캐시 키에도 들어가므로 바꾸면 이전 결과는 자동으로 재사용되지 않음
+# do_sample=True 이면 랜덤성 높아짐.
+# 다수결을 시험하기 위해 일단 do_sample=True 유지 가능.
+# 더 일관된 결과를 원한다면 do_sample=False, temperature=0 등으로 바꿀 수도 있음.
+SAMPLING_PARAMETERS = {
+    "max_new_tokens": 100,
+    "do_sample": True,
+    "temperature": 0.7,
+    "top_p": 0.9,
+}
+
 class SelfConsistencyChecker:
     def __init__(self, model_name: str = 'meta-llama/Meta-Llama-3-8B-Instruct'):
+        self.model_name = model_name
         self._load_model(model_name)
+        # 같은 문제/선지/설정의 검증 결과는 저장해 두고 재사용
+        self._verification_cache = get_verification_cache()
+        # 고정 system 블록(PROMPT_PREFIX)의 KV cache를 재사용해 요청마다 뒷부분만 prefill
+        self._prefix_cache = PrefixKVCache(self.model, self.tokenizer)
+        # 동시에 들어온 검증 요청(각각 num_inferences개의 샘플)을 모아 model.generate 한 번으로 처리
+        self._batcher = MicroBatcher(self._sample_texts, max_batch_size=MICRO_BATCH_MAX_SIZE,
+                                     max_wait_seconds=MICRO_BATCH_WAIT_SECONDS, name="self-consistency-batcher")
 
     def _load_model(self, model_name: str):
         """Load the language model for self-consistency checking."""
         logger.info(f"Loading model '{model_name}' from '{Llama3_8b_PATH}' for self-consistency check...")
-        self.tokenizer = AutoTokenizer.from_pretrained(
-            model_name,
-            cache_dir=Llama3_8b_PATH,
-            trust_remote_code=True
-        )
-        self.model = AutoModelForCausalLM.from_pretrained(
-            model_name,
-            cache_dir=Llama3_8b_PATH,
-            torch_dtype=torch.bfloat16 if torch.cuda.is_available() else torch.float32,
-            trust_remote_code=True,
-            device_map="auto"
-        )
-        self.model.eval()
-        if torch.cuda.is_available():
-            self.model.to('cuda')
-            logger.info("Model loaded on GPU for self-consistency.")
-        else:
-            logger.info("Model loaded on CPU for self-consistency.")
+        self.tokenizer, self.model = load_causal_lm(model_name)
 
     def _create_prompt(self, question: str, choices: dict) -> str:
         """
@@ -42,16 +67,6 @@ class SelfConsistencyChecker:
         
         이 예시 prompt는 "Reason carefully but provide only final answer" 컨셉의 구조입니다.
         """
-        system_prompt = (
-            "You are an expert solution checker for multiple-choice questions. "
-            "You will be given a question and four choices (A, B, C, D). "
-            "Your job is to determine the single best answer. "
-            "You must reason step by step internally (chain-of-thought) but "
-            "DO NOT reveal your reasoning. "
-            "Output ONLY the final answer in the format: 'Answer: X' "
-            "with no extra text."
-        )
-
         # 유저 질문은 보통 <|start_header_id|>user<|end_header_id|> 구간에 포함
         user_prompt = f"""
             Question: {question}
@@ -68,16 +83,12 @@ class SelfConsistencyChecker:
         # Llama/Chat류 모델에서 system vs. user 구분을 해줄 수도 있음
         # 여기서는 간단히 "<|begin_of_text|>" ~ 같은 태그를 붙이거나,
         # 또는 Chat형식의 meta-prompt를 구성할 수 있습니다.
-        combined_prompt = f"""
-            <|begin_of_text|>
-            <|start_header_id|>system<|end_header_id|>
-            {system_prompt}
-            <|eot_id|>
+        combined_prompt = PROMPT_PREFIX + f"""
             <|start_header_id|>user<|end_header_id|>
             {user_prompt}
             <|eot_id|>
             <|start_header_id|>assistant<|end_header_id|>
-                    """.strip()
+                    """.rstrip()
 
         return combined_prompt
 
@@ -93,39 +104,66 @@ class SelfConsistencyChecker:
         logger.warning(f"Failed to extract answer from text: {text}")
         return ""
 
+    def _sample_texts(self, items: List[Tuple[str, int]]) -> List[List[str]]:
+        """
+        (프롬프트, 샘플 수) 목록을 받아, 각 프롬프트를 샘플 수만큼 반복한 행들을 model.generate 한 번으로 생성.
+        공통 system 블록은 캐시된 KV를 재사용하고 뒷부분만 패딩해서 prefill 합니다. 프롬프트별로 새로 생성된 텍스트 리스트를 반환
+        """
+        prompts = [prompt for prompt, n in items for _ in range(n)]
+        device = self.model.device
+        inputs = self._prefix_cache.prepare(prompts, PROMPT_PREFIX, device)
+
+        prompt_length = inputs['input_ids'].shape[1]
+        with torch.no_grad():
+            outputs = self.model.generate(
+                **inputs,
+                **SAMPLING_PARAMETERS,
+                num_return_sequences=1,
+                eos_token_id=self.tokenizer.eos_token_id,
+                pad_token_id=self.tokenizer.pad_token_id
+            )
+        # 프롬프트 안의 "Answer: X" 예시가 섞이지 않도록 새로 생성된 부분만 디코딩
+        texts = self.tokenizer.batch_decode(outputs[:, prompt_length:], skip_special_tokens=True)
+
+        results, start = [], 0
+        for _, n in items:
+            results.append(texts[start:start + n])
+            start += n
+        return results
+
     def check_answer(self, question: str, choices: dict, num_inferences: int = 10) -> Tuple[str, str]:
         """
+        0) 식 하나로 된 계산 문제는 arithmetic_verifier로 정확히 계산 (풀 수 있을 때만)
         1) 동일 질문에 대해 num_inferences번 반복 추론
         2) 각각 "Answer: X" 형태를 파싱
         3) 최빈값(majority vote)을 최종 답으로 결정
         4) explanation에는 debug용으로 전체 투표 결과를 간단 출력
         """
 
+        # 단순 계산 문제는 LLM 없이 정확히 계산해서 바로 결정
+        verdict = verify_arithmetic(question, choices)
+        if verdict is not None:
+            logger.info(verdict.explanation)
+            return verdict.answer, verdict.explanation
+
+        # 같은 문제/선지를 같은 설정으로 검증한 적이 있으면 저장된 결과 사용
+        cache_config = {
+            'verifier': 'self_consistency',
+            'model': self.model_name,
+            'num_inferences': num_inferences,
+            'prompt': hashlib.sha256(PROMPT_PREFIX.encode('utf-8')).hexdigest(),
+            **SAMPLING_PARAMETERS,
+        }
+        cached = self._verification_cache.get(question, choices, cache_config)
+        if cached is not None:
+            return cached.answer, f"Cached counts: {cached.votes}, final: {cached.answer}"
+
         # 우선 프롬프트 생성
         prompt = self._create_prompt(question, choices)
 
-        # tokenizer 인풋
-        inputs = self.tokenizer(prompt, return_tensors='pt')
-        if torch.cuda.is_available():
-            inputs = {k: v.to('cuda') for k, v in inputs.items()}
-
-        # 여러 번(=num_inferences) 추론
+        # 여러 번(=num_inferences) 추론: 샘플들을 한 배치로 생성
         answers = []
-        for _ in range(num_inferences):
-            with torch.no_grad():
-                outputs = self.model.generate(
-                    **inputs,
-                    max_new_tokens=100,
-                    # do_sample=True 이면 랜덤성 높아짐.
-                    # 다수결을 시험하기 위해 일단 do_sample=True 유지 가능.
-                    # 더 일관된 결과를 원한다면 do_sample=False, temperature=0 등으로 바꿀 수도 있음.
-                    do_sample=True,
-                    temperature=0.7,
-                    top_p=0.9,
-                    num_return_sequences=1,
-                    eos_token_id=self.tokenizer.eos_token_id
-                )
-            generated_text = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
+        for generated_text in self._batcher.submit((prompt, num_inferences)):
             extracted = self._extract_answer(generated_text)
             if extracted in ["A", "B", "C", "D"]:
                 answers.append(extracted)
@@ -138,5 +176,6 @@ class SelfConsistencyChecker:
         counter = Counter(answers)
         final_answer = counter.most_common(1)[0][0]  # 가장 많이 나온 1개
         explanation = f"All answers: {answers}, counts: {dict(counter)}, final: {final_answer}"
+        self._verification_cache.put(question, choices, cache_config, final_answer, dict(counter))
 
         return final_answer, explanation
@@ -1,61 +1,218 @@
 # module3.py
 import requests
-from typing import Optional
+from requests.adapters import HTTPAdapter
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import hashlib
 import logging
-from dotenv import load_dotenv
-import os
+import re
+from src.config import (API_REQUEST_TIMEOUT_SECONDS, API_VERIFY_SAMPLES, HF_API_BATCH_INPUTS, MAX_VERIFY_SAMPLES,
+                        MICRO_BATCH_MAX_IN_FLIGHT, MICRO_BATCH_MAX_SIZE, MICRO_BATCH_WAIT_SECONDS,
+                        get_huggingface_api_key)
+from src.micro_batcher import MicroBatcher, split_generated_texts
+from src.rate_limiter import estimate_tokens, get_rate_limiter
+from src.resilience import ResilientCaller
+from src.singleflight import SingleFlight, request_key
+from src.ThirdModule.arithmetic_verifier import verify_arithmetic
+from src.ThirdModule.verification_cache import get_verification_cache
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
+# 로깅 설정은 진입점(app.py, server.py)에서 함
 logger = logging.getLogger(__name__)
 
-# .env 파일 로드
-load_dotenv()
-
-# Hugging Face API 정보
+# Hugging Face API 정보 (API 키는 get_huggingface_api_key()로 처음 필요할 때 읽음)
 API_URL = "https://api-inference.huggingface.co/models/meta-llama/Meta-Llama-3-8B-Instruct"
-API_KEY = os.getenv("HUGGINGFACE_API_KEY")
 
-if not API_KEY:
-    raise ValueError("API_KEY가 설정되지 않았습니다. .env 파일을 확인하세요.")
+# 정답 글자 하나만 필요하므로 짧게 생성하고, 보기 글자가 들어 있는 프롬프트는 돌려받지 않음
+VERIFY_PARAMETERS = {
+    "max_new_tokens": 5,
+    "return_full_text": False,
+    "stop": ["<|eot_id|>"],
+}
+
+# self-consistency 모드의 샘플링 설정. 같은 입력이 API 쪽 캐시에서 같은 결과로 돌아오지 않도록 use_cache를 끔
+SAMPLING_PARAMETERS = {
+    **VERIFY_PARAMETERS,
+    "do_sample": True,
+    "temperature": 0.7,
+    "top_p": 0.9,
+}
+SAMPLING_OPTIONS = {"use_cache": False}
+
+# 생성 텍스트 맨 앞의 정답 글자만 인정: "B", "B)", "(B)", "Answer: B" 등.
+# 글자가 문장 중간에 나오거나 관사로 쓰인 경우("Because ...", "A good choice is C")는 정답으로 보지 않음
+ANSWER_PATTERN = re.compile(
+    r"^\s*(?i:(?:the\s+)?(?:correct\s+)?answer\s*(?:is)?\s*[:：]?\s*)?\(?([ABCD])(?![A-Za-z])(?!(?<=A)\s+[a-z])"
+)
+
+# rate limiter 사용량 보고서에 표시되는 호출자 이름
+RATE_LIMIT_CALLER = "answer_verification"
+
+# 같은 문제/보기로 동시에 들어온 검증 요청은 한 번만 호출
+_verification_flight = SingleFlight()
+
+# 요청 제한 시간 / (설정 시) 헤지 요청 / 서킷 브레이커. 서킷이 열리면 검증 없이 None을 반환
+_verification_caller = ResilientCaller("answer_verification")
+
+
+# 동시 샘플 요청이 매번 TCP/TLS 연결을 새로 맺지 않도록 연결을 재사용하는 세션
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=max(MAX_VERIFY_SAMPLES, MICRO_BATCH_MAX_SIZE, 10)))
+
+
+def _post_prompts(prompts: List[str], parameters: Optional[dict] = None, options: Optional[dict] = None) -> List[str]:
+    """API를 한 번 호출해서 프롬프트별 생성 텍스트를 반환 (여러 개이면 리스트 입력)"""
+    parameters = parameters or VERIFY_PARAMETERS
+    headers = {"Authorization": f"Bearer {get_huggingface_api_key()}"}
+    limiter = get_rate_limiter()
+    prompt_tokens = sum(estimate_tokens(prompt) for prompt in prompts)
+    reserved_tokens = prompt_tokens + parameters["max_new_tokens"] * len(prompts)
+    limiter.acquire(reserved_tokens, caller=RATE_LIMIT_CALLER)
+    completion_tokens = 0
+    try:
+        payload = {"inputs": prompts[0] if len(prompts) == 1 else prompts, "parameters": parameters}
+        if options:
+            payload["options"] = options
+        response = _session.post(
+            API_URL,
+            headers=headers,
+            json=payload,
+            timeout=API_REQUEST_TIMEOUT_SECONDS,
+        )
+        response.raise_for_status()
+
+        response_data = response.json()
+        logger.debug(f"Raw API response: {response_data}")
+
+        generated_texts = split_generated_texts(response_data, len(prompts))
+        completion_tokens = sum(estimate_tokens(text) for text in generated_texts)
+        return generated_texts
+    finally:
+        # 실패한 호출도 잡아 둔 토큰을 정산해서 상위 API 장애 중에 버킷이 바닥나지 않게 함
+        limiter.record_usage(RATE_LIMIT_CALLER, prompt_tokens, completion_tokens, reserved_tokens)
+
+
+# 동시에 들어온 검증 요청을 모아 리스트 입력 한 번으로 보냄 (HF_API_BATCH_INPUTS가 켜진 경우)
+_verification_batcher = MicroBatcher(_post_prompts, max_batch_size=MICRO_BATCH_MAX_SIZE,
+                                     max_wait_seconds=MICRO_BATCH_WAIT_SECONDS, name="verification-batcher",
+                                     max_in_flight=MICRO_BATCH_MAX_IN_FLIGHT)
 
 class AnswerVerifier:
+    def __init__(self):
+        # 키가 없으면 검증기를 만들 때 바로 실패 (예전에는 import 시점에 실패)
+        get_huggingface_api_key()
+        # 프롬프트 템플릿이 바뀌면 예전 검증 결과를 쓰지 않도록 캐시 키에 템플릿 해시를 넣음
+        template = self._create_prompt("{question}", {option: f"{{{option}}}" for option in "ABCD"})
+        self._prompt_hash = hashlib.sha256(template.encode('utf-8')).hexdigest()
+
     def verify_answer(self, question: str, choices: dict) -> Optional[str]:
         """주어진 문제와 보기를 바탕으로 정답을 검증"""
+        if API_VERIFY_SAMPLES > 1:
+            answer, _ = self.verify_answer_votes(question, choices, API_VERIFY_SAMPLES)
+            return answer
         try:
+            # 단순 계산 문제는 API를 부르지 않고 정확히 계산
+            verdict = verify_arithmetic(question, choices)
+            if verdict is not None:
+                logger.info(verdict.explanation)
+                return verdict.answer
+
+            # 같은 문제/선지를 같은 설정으로 검증한 적이 있으면 저장된 결과 사용
+            cache = get_verification_cache()
+            cache_config = {'verifier': 'api', 'model': API_URL, 'prompt': self._prompt_hash, **VERIFY_PARAMETERS}
+            cached = cache.get(question, choices, cache_config)
+            if cached is not None:
+                logger.info(f"Verified answer (cached): {cached.answer}")
+                return cached.answer
+
             prompt = self._create_prompt(question, choices)
-            headers = {"Authorization": f"Bearer {API_KEY}"}
-            
-            response = requests.post(
-                API_URL,
-                headers=headers,
-                json={"inputs": prompt}
-            )
-            response.raise_for_status()
-            
-            response_data = response.json()
-            logger.debug(f"Raw API response: {response_data}")
-            
-            # API 응답 처리
-            generated_text = ""
-            if isinstance(response_data, list):
-                if response_data and isinstance(response_data[0], dict):
-                    generated_text = response_data[0].get('generated_text', '')
-                else:
-                    generated_text = response_data[0] if response_data else ''
-            elif isinstance(response_data, dict):
-                generated_text = response_data.get('generated_text', '')
-            else:
-                generated_text = str(response_data)
-            
-            verified_answer = self._extract_answer(generated_text)
+            verified_answer = _verification_flight.do(request_key(prompt, VERIFY_PARAMETERS),
+                                                   _verification_caller.call, self._request_answer, prompt)
             logger.info(f"Verified answer: {verified_answer}")
+            if verified_answer is not None:
+                cache.put(question, choices, cache_config, verified_answer, {verified_answer: 1})
             return verified_answer
 
         except Exception as e:
             logger.error(f"Error in verify_answer: {e}")
             return None
 
+    def verify_answer_votes(self, question: str, choices: dict,
+                            num_samples: int = API_VERIFY_SAMPLES) -> Tuple[Optional[str], Dict[str, int]]:
+        """
+        self-consistency 검증: 샘플링 요청 num_samples개를 동시에 보내고 (최다 득표 정답, 정답별 득표 수)를 반환.
+        요청을 동시에 보내므로 전체 지연 시간은 대략 가장 느린 한 번의 호출 정도입니다.
+        일부 요청이 실패해도 나머지 표로 결정하고, 유효한 표가 하나도 없으면 (None, {})
+        샘플 수는 1 ~ MAX_VERIFY_SAMPLES로 제한합니다.
+        """
+        num_samples = max(1, min(num_samples, MAX_VERIFY_SAMPLES))
+        try:
+            verdict = verify_arithmetic(question, choices)
+            if verdict is not None:
+                logger.info(verdict.explanation)
+                return verdict.answer, {verdict.answer: num_samples}
+
+            cache = get_verification_cache()
+            cache_config = {'verifier': 'api_self_consistency', 'model': API_URL, 'num_samples': num_samples,
+                            'prompt': self._prompt_hash, **SAMPLING_PARAMETERS}
+            cached = cache.get(question, choices, cache_config)
+            if cached is not None:
+                logger.info(f"Verified answer (cached): {cached.answer}, votes: {cached.votes}")
+                return cached.answer, cached.votes
+
+            prompt = self._create_prompt(question, choices)
+            answer, votes = _verification_flight.do(request_key(prompt, {**SAMPLING_PARAMETERS, 'num_samples': num_samples}),
+                                                    self._sample_votes, prompt, num_samples)
+            logger.info(f"Verified answer: {answer}, votes: {votes}")
+            if answer is not None:
+                cache.put(question, choices, cache_config, answer, votes)
+            return answer, votes
+
+        except Exception as e:
+            logger.error(f"Error in verify_answer_votes: {e}")
+            return None, {}
+
+    def _sample_votes(self, prompt: str, num_samples: int) -> Tuple[Optional[str], Dict[str, int]]:
+        # 호출마다 샘플 수만큼의 스레드를 써서, 다른 요청의 샘플 뒤에 줄 서지 않고 정말 동시에 보냄
+        # (전체 API 호출량은 rate limiter가 제한)
+        with ThreadPoolExecutor(max_workers=num_samples, thread_name_prefix="verification-sample") as executor:
+            futures = [
+                executor.submit(_verification_caller.call, self._request_sample, prompt)
+                for _ in range(num_samples)
+            ]
+            answers, errors = [], []
+            for future in futures:
+                try:
+                    answer = future.result()
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                if answer is not None:
+                    answers.append(answer)
+
+        if errors:
+            logger.warning(f"{len(errors)}/{num_samples} verification samples failed: {errors[0]}")
+        if not answers:
+            if errors:
+                raise errors[0]
+            return None, {}
+
+        counter = Counter(answers)
+        return counter.most_common(1)[0][0], dict(counter)
+
+    def _request_sample(self, prompt: str) -> Optional[str]:
+        """샘플링 설정으로 한 번 호출 (마이크로 배처는 기본 설정 전용이므로 거치지 않음)"""
+        generated_text = _post_prompts([prompt], SAMPLING_PARAMETERS, SAMPLING_OPTIONS)[0]
+        return self._extract_answer(generated_text)
+
+    def _request_answer(self, prompt: str) -> Optional[str]:
+        """API를 호출해서 응답에서 정답 글자를 추출"""
+        if HF_API_BATCH_INPUTS:
+            generated_text = _verification_batcher.submit(prompt)
+        else:
+            generated_text = _post_prompts([prompt])[0]
+        return self._extract_answer(generated_text)
+
     def _create_prompt(self, question: str, choices: dict) -> str:
         """검증을 위한 프롬프트 생성"""
         return f"""
@@ -79,13 +236,9 @@ class AnswerVerifier:
         """.strip()
 
     def _extract_answer(self, response: str) -> Optional[str]:
-        """응답에서 A, B, C, D 중 하나를 추출"""
-        response = response.strip().upper()
-        valid_answers = {'A', 'B', 'C', 'D'}
-        
-        # 응답에서 유효한 답안 찾기
-        for answer in valid_answers:
-            if answer in response:
-                return answer
-        
+        """응답 맨 앞의 A, B, C, D 중 하나를 추출 (ANSWER_PATTERN)"""
+        match = ANSWER_PATTERN.match(response or "")
+        if match:
+            return match.group(1).upper()
+        logger.warning(f"Failed to extract answer from response: {response!r}")
         return None
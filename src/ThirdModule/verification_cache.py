@@ -0,0 +1,103 @@
+# verification_cache.py
+# 같은 문제/선지를 같은 설정으로 다시 검증할 때(캐시된 유사 문제 재사용, main.py 재생성 루프의 반복 등)
+# 추론을 다시 하지 않도록 검증 결과(최종 답 + 투표 분포)를 SQLite에 저장합니다.
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from src.config import VERIFICATION_CACHE_PATH
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS verification_cache (
+    key TEXT PRIMARY KEY,
+    verifier TEXT NOT NULL,
+    question TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    votes TEXT NOT NULL,
+    created_at REAL NOT NULL
+)
+"""
+
+
+@dataclass
+class VerificationRecord:
+    answer: str
+    votes: Dict[str, int]
+
+
+def _normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", str(text)).strip().lower()
+
+
+def cache_key(question: str, choices: Dict[str, str], config: Dict[str, object]) -> str:
+    """공백/대소문자를 정규화한 문제와 선지, 검증 설정(모델, 샘플 수, temperature 등)으로 만든 키"""
+    payload = json.dumps({
+        'question': _normalize_text(question),
+        'choices': {option: _normalize_text(text) for option, text in sorted(choices.items())},
+        'config': config,
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class VerificationCache:
+    """프로세스 간에도 공유되는 검증 결과 캐시. path에 ':memory:'를 주면 프로세스 안에서만 유지"""
+
+    def __init__(self, path: str = VERIFICATION_CACHE_PATH):
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            if path != ':memory:':
+                # 여러 워커 프로세스가 동시에 읽고 써도 막히지 않도록
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(_SCHEMA)
+        # 적중 횟수는 메모리에서만 셈 (적중마다 UPDATE하면 읽기 경로가 WAL 쓰기가 됨)
+        self.stats = {'hits': 0, 'misses': 0, 'writes': 0}
+
+    def get(self, question: str, choices: Dict[str, str], config: Dict[str, object]) -> Optional[VerificationRecord]:
+        key = cache_key(question, choices, config)
+        with self._lock:
+            row = self._conn.execute("SELECT answer, votes FROM verification_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+            self.stats['hits'] += 1
+        return VerificationRecord(row[0], json.loads(row[1]))
+
+    def put(self, question: str, choices: Dict[str, str], config: Dict[str, object], answer: str, votes: Dict[str, int]):
+        key = cache_key(question, choices, config)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO verification_cache (key, verifier, question, answer, votes, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, str(config.get('verifier', '')), question, answer, json.dumps(votes), time.time()),
+            )
+            self.stats['writes'] += 1
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_shared_cache: Optional[VerificationCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_verification_cache() -> VerificationCache:
+    """프로세스 안에서 공유하는 검증 캐시 (VERIFICATION_CACHE_PATH)"""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = VerificationCache()
+        return _shared_cache
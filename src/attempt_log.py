@@ -0,0 +1,354 @@
+# attempt_log.py
+# 학생이 푼 문제(누가, 언제, 어떤 문제에 어떤 선지를 골랐는지)를 지우지 않고 쌓아 두는 기록과 집계 리포트.
+# 쓰기는 요청 스레드를 막지 않도록 백그라운드에서 모아서 하고, 같은 트랜잭션에서 일별 집계 테이블도 갱신하므로
+# 리포트는 원본 기록을 훑지 않고 작은 집계 테이블만 읽습니다.
+#
+# 리포트 예:
+#   python -m src.attempt_log --days 7
+import argparse
+import atexit
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import dataclass
+from typing import List, Optional
+
+import pandas as pd
+
+from src.config import ATTEMPT_LOG_BATCH_SIZE, ATTEMPT_LOG_ENABLED, ATTEMPT_LOG_FLUSH_SECONDS, ATTEMPT_LOG_PATH
+
+logger = logging.getLogger(__name__)
+
+# 쓰기가 밀려도 메모리가 끝없이 늘지 않도록 대기열 상한. 넘치면 가장 새 기록을 버리고 dropped로 셈
+MAX_PENDING_ATTEMPTS = 100_000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS attempts (
+    id INTEGER PRIMARY KEY,
+    student_id TEXT NOT NULL,
+    question_id INTEGER,
+    construct_id INTEGER,
+    construct_name TEXT,
+    subject_id INTEGER,
+    subject_name TEXT,
+    selected TEXT NOT NULL,
+    correct_answer TEXT NOT NULL,
+    is_correct INTEGER NOT NULL,
+    misconception_id INTEGER,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_attempts_student_time ON attempts (student_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_attempts_question ON attempts (question_id);
+CREATE INDEX IF NOT EXISTS idx_attempts_misconception_time ON attempts (misconception_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_attempts_time ON attempts (created_at);
+
+CREATE TABLE IF NOT EXISTS misconception_daily (
+    day TEXT NOT NULL,
+    misconception_id INTEGER NOT NULL,
+    attempts INTEGER NOT NULL,
+    PRIMARY KEY (day, misconception_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS construct_daily (
+    day TEXT NOT NULL,
+    construct_id INTEGER NOT NULL,
+    construct_name TEXT,
+    attempts INTEGER NOT NULL,
+    errors INTEGER NOT NULL,
+    PRIMARY KEY (day, construct_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS question_stats (
+    question_id INTEGER PRIMARY KEY,
+    attempts INTEGER NOT NULL,
+    errors INTEGER NOT NULL
+);
+"""
+
+_INSERT_ATTEMPT = (
+    "INSERT INTO attempts (student_id, question_id, construct_id, construct_name, subject_id, subject_name, "
+    "selected, correct_answer, is_correct, misconception_id, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+_UPSERT_MISCONCEPTION = (
+    "INSERT INTO misconception_daily (day, misconception_id, attempts) VALUES (?, ?, ?) "
+    "ON CONFLICT (day, misconception_id) DO UPDATE SET attempts = attempts + excluded.attempts"
+)
+_UPSERT_CONSTRUCT = (
+    "INSERT INTO construct_daily (day, construct_id, construct_name, attempts, errors) VALUES (?, ?, ?, ?, ?) "
+    "ON CONFLICT (day, construct_id) DO UPDATE SET attempts = attempts + excluded.attempts, "
+    "errors = errors + excluded.errors, construct_name = excluded.construct_name"
+)
+_UPSERT_QUESTION = (
+    "INSERT INTO question_stats (question_id, attempts, errors) VALUES (?, ?, ?) "
+    "ON CONFLICT (question_id) DO UPDATE SET attempts = attempts + excluded.attempts, errors = errors + excluded.errors"
+)
+
+
+def _optional_int(value) -> Optional[int]:
+    return None if value is None or pd.isna(value) else int(value)
+
+
+def _day(timestamp: float) -> str:
+    """집계 단위(UTC 날짜). rebuild_aggregates의 date(created_at, 'unixepoch')와 같은 형식"""
+    return time.strftime('%Y-%m-%d', time.gmtime(timestamp))
+
+
+@dataclass
+class Attempt:
+    student_id: str
+    question_id: Optional[int]
+    construct_id: Optional[int]
+    construct_name: Optional[str]
+    subject_id: Optional[int]
+    subject_name: Optional[str]
+    selected: str
+    correct_answer: str
+    is_correct: bool
+    misconception_id: Optional[int]
+    created_at: float
+
+    @classmethod
+    def from_question(cls, student_id: str, question, selected: str, created_at: Optional[float] = None) -> 'Attempt':
+        """train.csv 형식의 문제 행(Series/dict)과 고른 선지로 기록 생성. 오답이면 그 선지의 misconception을 함께 기록"""
+        correct_answer = str(question['CorrectAnswer'])
+        is_correct = selected == correct_answer
+        return cls(
+            student_id=student_id,
+            question_id=_optional_int(question.get('QuestionId')),
+            construct_id=_optional_int(question.get('ConstructId')),
+            construct_name=None if pd.isna(question.get('ConstructName')) else str(question.get('ConstructName')),
+            subject_id=_optional_int(question.get('SubjectId')),
+            subject_name=None if pd.isna(question.get('SubjectName')) else str(question.get('SubjectName')),
+            selected=selected,
+            correct_answer=correct_answer,
+            is_correct=is_correct,
+            misconception_id=None if is_correct else _optional_int(question.get(f'Misconception{selected}Id')),
+            created_at=time.time() if created_at is None else created_at,
+        )
+
+
+class AttemptLog:
+    """
+    record()는 대기열에 넣고 바로 반환합니다. 백그라운드 스레드가 flush_interval마다(또는 batch_size개가 모이면)
+    원본 기록 insert와 집계 테이블 갱신을 트랜잭션 한 번으로 처리합니다.
+    """
+
+    def __init__(self, path: str = ATTEMPT_LOG_PATH, flush_interval: float = ATTEMPT_LOG_FLUSH_SECONDS,
+                 batch_size: int = ATTEMPT_LOG_BATCH_SIZE):
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._db_lock = threading.Lock()
+        with self._db_lock, self._conn:
+            if path != ':memory:':
+                # 여러 replica/리포트가 읽는 동안에도 쓰기가 막히지 않도록
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+
+        self._pending: deque = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self.stats = {'recorded': 0, 'written': 0, 'batches': 0, 'dropped': 0, 'errors': 0}
+        self._worker = threading.Thread(target=self._run, name='attempt-log-writer', daemon=True)
+        self._worker.start()
+
+    # ---- 쓰기 ----
+
+    def record(self, attempt: Attempt):
+        with self._cond:
+            if len(self._pending) >= MAX_PENDING_ATTEMPTS:
+                self.stats['dropped'] += 1
+                return
+            self._pending.append(attempt)
+            self.stats['recorded'] += 1
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed or len(self._pending) >= self.batch_size,
+                                    timeout=self.flush_interval)
+                if self._closed:
+                    return
+            self.flush()
+
+    def flush(self):
+        """대기 중인 기록을 모두 씀 (배치 단위)"""
+        while True:
+            with self._cond:
+                batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+            if not batch:
+                return
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                logger.error(f"Failed to write {len(batch)} attempt(s): {e}")
+                with self._cond:
+                    self.stats['errors'] += 1
+                    # 다음 flush에서 다시 시도 (순서 유지)
+                    self._pending.extendleft(reversed(batch))
+                return
+            with self._cond:
+                self.stats['written'] += len(batch)
+                self.stats['batches'] += 1
+
+    def _write_batch(self, batch: List[Attempt]):
+        # 집계는 배치 안에서 먼저 합친 뒤 키마다 upsert 한 번
+        misconceptions, constructs, questions = Counter(), {}, {}
+        for attempt in batch:
+            day = _day(attempt.created_at)
+            error = 0 if attempt.is_correct else 1
+            if attempt.misconception_id is not None:
+                misconceptions[(day, attempt.misconception_id)] += 1
+            if attempt.construct_id is not None:
+                name, attempts, errors = constructs.get((day, attempt.construct_id), (attempt.construct_name, 0, 0))
+                constructs[(day, attempt.construct_id)] = (name, attempts + 1, errors + error)
+            if attempt.question_id is not None:
+                attempts, errors = questions.get(attempt.question_id, (0, 0))
+                questions[attempt.question_id] = (attempts + 1, errors + error)
+
+        rows = [
+            (a.student_id, a.question_id, a.construct_id, a.construct_name, a.subject_id, a.subject_name,
+             a.selected, a.correct_answer, int(a.is_correct), a.misconception_id, a.created_at)
+            for a in batch
+        ]
+        with self._db_lock, self._conn:
+            self._conn.executemany(_INSERT_ATTEMPT, rows)
+            self._conn.executemany(_UPSERT_MISCONCEPTION,
+                                   [(day, mid, count) for (day, mid), count in misconceptions.items()])
+            self._conn.executemany(_UPSERT_CONSTRUCT,
+                                   [(day, cid, name, attempts, errors)
+                                    for (day, cid), (name, attempts, errors) in constructs.items()])
+            self._conn.executemany(_UPSERT_QUESTION,
+                                   [(qid, attempts, errors) for qid, (attempts, errors) in questions.items()])
+
+    def rebuild_aggregates(self):
+        """원본 기록에서 집계 테이블을 다시 계산 (스키마 변경이나 수동 정정 후)"""
+        self.flush()
+        with self._db_lock, self._conn:
+            self._conn.execute("DELETE FROM misconception_daily")
+            self._conn.execute("DELETE FROM construct_daily")
+            self._conn.execute("DELETE FROM question_stats")
+            self._conn.execute(
+                "INSERT INTO misconception_daily (day, misconception_id, attempts) "
+                "SELECT date(created_at, 'unixepoch'), misconception_id, COUNT(*) FROM attempts "
+                "WHERE misconception_id IS NOT NULL GROUP BY 1, 2"
+            )
+            self._conn.execute(
+                "INSERT INTO construct_daily (day, construct_id, construct_name, attempts, errors) "
+                "SELECT date(created_at, 'unixepoch'), construct_id, MAX(construct_name), COUNT(*), SUM(1 - is_correct) "
+                "FROM attempts WHERE construct_id IS NOT NULL GROUP BY 1, 2"
+            )
+            self._conn.execute(
+                "INSERT INTO question_stats (question_id, attempts, errors) "
+                "SELECT question_id, COUNT(*), SUM(1 - is_correct) FROM attempts WHERE question_id IS NOT NULL GROUP BY 1"
+            )
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._worker.join(timeout=5)
+        self.flush()
+        with self._db_lock:
+            self._conn.close()
+
+    def metrics(self) -> dict:
+        with self._cond:
+            return dict(self.stats, pending=len(self._pending))
+
+    # ---- 리포트 (집계 테이블만 읽음) ----
+
+    def _query(self, sql: str, params: tuple = ()) -> pd.DataFrame:
+        with self._db_lock:
+            return pd.read_sql_query(sql, self._conn, params=params)
+
+    @staticmethod
+    def _since_day(days: Optional[int], now: Optional[float] = None) -> str:
+        if days is None:
+            return ''
+        return _day((time.time() if now is None else now) - (days - 1) * 86400)
+
+    def top_misconceptions(self, days: Optional[int] = 7, limit: int = 10, now: Optional[float] = None) -> pd.DataFrame:
+        """최근 days일(오늘 포함, None이면 전체) 동안 가장 많이 나온 misconception"""
+        return self._query(
+            "SELECT misconception_id, SUM(attempts) AS attempts FROM misconception_daily WHERE day >= ? "
+            "GROUP BY misconception_id ORDER BY attempts DESC, misconception_id LIMIT ?",
+            (self._since_day(days, now), limit),
+        )
+
+    def construct_error_rates(self, days: Optional[int] = None, min_attempts: int = 1,
+                              now: Optional[float] = None) -> pd.DataFrame:
+        """개념(construct)별 오답률. 시도 수가 min_attempts 미만인 개념은 제외"""
+        df = self._query(
+            "SELECT construct_id, MAX(construct_name) AS construct_name, SUM(attempts) AS attempts, SUM(errors) AS errors "
+            "FROM construct_daily WHERE day >= ? GROUP BY construct_id HAVING SUM(attempts) >= ?",
+            (self._since_day(days, now), min_attempts),
+        )
+        df['error_rate'] = df['errors'] / df['attempts']
+        return df.sort_values(['error_rate', 'attempts'], ascending=False, ignore_index=True)
+
+    def question_error_rates(self, min_attempts: int = 1, limit: int = 20) -> pd.DataFrame:
+        """문제별 오답률 (전체 기간)"""
+        return self._query(
+            "SELECT question_id, attempts, errors, CAST(errors AS REAL) / attempts AS error_rate FROM question_stats "
+            "WHERE attempts >= ? ORDER BY error_rate DESC, attempts DESC LIMIT ?",
+            (min_attempts, limit),
+        )
+
+    def student_history(self, student_id: str, limit: int = 100) -> pd.DataFrame:
+        """학생 한 명의 최근 기록 (student_id, created_at 인덱스 사용)"""
+        return self._query(
+            "SELECT question_id, selected, correct_answer, is_correct, misconception_id, created_at FROM attempts "
+            "WHERE student_id = ? ORDER BY created_at DESC LIMIT ?",
+            (student_id, limit),
+        )
+
+
+_shared_log: Optional[AttemptLog] = None
+_shared_lock = threading.Lock()
+
+
+def get_attempt_log() -> Optional[AttemptLog]:
+    """프로세스 안에서 공유하는 기록 (ATTEMPT_LOG_ENABLED가 꺼져 있으면 None). 종료 시 남은 기록을 씀"""
+    global _shared_log
+    if not ATTEMPT_LOG_ENABLED:
+        return None
+    with _shared_lock:
+        if _shared_log is None:
+            _shared_log = AttemptLog()
+            atexit.register(_shared_log.close)
+        return _shared_log
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cohort reports from the student attempt log")
+    parser.add_argument('--path', default=ATTEMPT_LOG_PATH)
+    parser.add_argument('--days', type=int, default=7, help="misconception/construct 리포트 기간(일)")
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--min-attempts', type=int, default=5)
+    parser.add_argument('--rebuild', action='store_true', help="원본 기록에서 집계 테이블을 다시 계산")
+    args = parser.parse_args(argv)
+
+    log = AttemptLog(args.path)
+    try:
+        if args.rebuild:
+            log.rebuild_aggregates()
+        print(f"== Most common misconceptions (last {args.days} days)")
+        print(log.top_misconceptions(args.days, args.limit).to_string(index=False))
+        print(f"\n== Construct error rates (last {args.days} days, >= {args.min_attempts} attempts)")
+        print(log.construct_error_rates(args.days, args.min_attempts).head(args.limit).to_string(index=False))
+        print(f"\n== Hardest questions (>= {args.min_attempts} attempts)")
+        print(log.question_error_rates(args.min_attempts, args.limit).to_string(index=False))
+    finally:
+        log.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -1 +1,94 @@
-Llama3_8b_PATH = "Your-Model-Path"
\ No newline at end of file
+import os
+from typing import Optional
+
+Llama3_8b_PATH = "Your-Model-Path"
+
+# 유사 문제 생성 대기 한도(초). 넘으면 문제 은행의 같은 misconception 문제를 대신 보여줌
+GENERATION_DEADLINE_SECONDS = float(os.getenv("GENERATION_DEADLINE_SECONDS", "8"))
+
+# 모든 세션이 공유하는 생성기의 상위 API 동시 호출 한도
+GENERATION_MAX_CONCURRENCY = int(os.getenv("GENERATION_MAX_CONCURRENCY", "4"))
+# 세션 하나가 생성 대기열에 쌓을 수 있는 작업 수 (넘으면 바로 문제 은행 문제로 대체)
+GENERATION_MAX_QUEUE_PER_SESSION = int(os.getenv("GENERATION_MAX_QUEUE_PER_SESSION", "8"))
+
+# 유사 문제 의미 기반 캐시: 기존 misconception 임베딩 모델을 사용하고, 코사인 유사도가 임계값 이상이면 재사용
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "minsuas/Misconceptions__1")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+
+# Hugging Face 추론 API 클라이언트 측 한도 (0 이하이면 제한 없음)와 허가를 기다리는 최대 시간(초)
+HF_REQUESTS_PER_MINUTE = float(os.getenv("HF_REQUESTS_PER_MINUTE", "60"))
+HF_TOKENS_PER_MINUTE = float(os.getenv("HF_TOKENS_PER_MINUTE", "60000"))
+RATE_LIMIT_QUEUE_TIMEOUT_SECONDS = float(os.getenv("RATE_LIMIT_QUEUE_TIMEOUT_SECONDS", "30"))
+
+# 추론 API 한 번의 HTTP 요청 제한 시간(초). 없으면 느린 요청 하나가 꼬리 지연을 무한정 늘림
+API_REQUEST_TIMEOUT_SECONDS = float(os.getenv("API_REQUEST_TIMEOUT_SECONDS", "20"))
+
+# 헤지 요청: 최근 지연 시간의 HEDGE_PERCENTILE 분위만큼 기다려도 응답이 없으면 같은 요청을 한 번 더 보내고 먼저 온 결과를 사용
+HEDGE_REQUESTS = os.getenv("HEDGE_REQUESTS", "false").lower() in ("1", "true", "yes")
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_INITIAL_DELAY_SECONDS = float(os.getenv("HEDGE_INITIAL_DELAY_SECONDS", "4"))
+
+# 서킷 브레이커: 최근 호출 중 실패 비율이 임계값을 넘으면 일정 시간 동안 API를 부르지 않고 바로 대체 경로로 보냄
+CIRCUIT_FAILURE_THRESHOLD = float(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "0.5"))
+CIRCUIT_MIN_CALLS = int(os.getenv("CIRCUIT_MIN_CALLS", "10"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+
+# 마이크로 배칭: 짧은 시간(MICRO_BATCH_WAIT_SECONDS) 안에 모인 프롬프트를 한 번의 호출로 처리
+# 추론 엔드포인트가 리스트 입력을 지원할 때만 HF_API_BATCH_INPUTS를 켬 (로컬 모델은 항상 배치 generate 사용)
+HF_API_BATCH_INPUTS = os.getenv("HF_API_BATCH_INPUTS", "false").lower() in ("1", "true", "yes")
+MICRO_BATCH_MAX_SIZE = int(os.getenv("MICRO_BATCH_MAX_SIZE", "8"))
+MICRO_BATCH_WAIT_SECONDS = float(os.getenv("MICRO_BATCH_WAIT_SECONDS", "0.02"))
+# HTTP 배치 호출을 동시에 몇 개까지 보낼지 (기본은 생성 동시 실행 한도와 같음. 로컬 모델 배치는 항상 하나씩)
+MICRO_BATCH_MAX_IN_FLIGHT = int(os.getenv("MICRO_BATCH_MAX_IN_FLIGHT", str(GENERATION_MAX_CONCURRENCY)))
+
+# 로컬 모델로 여러 문제를 한꺼번에 생성할 때(generate_batch) model.generate 한 번에 넣는 프롬프트 수
+LOCAL_GENERATION_BATCH_SIZE = int(os.getenv("LOCAL_GENERATION_BATCH_SIZE", "8"))
+
+# GPU가 없을 때 로컬 Llama 모델을 올리는 방식: "float32"(기본), "bfloat16"(메모리 절반), "int8"(Linear 레이어 동적 양자화)
+CPU_PRECISION = os.getenv("CPU_PRECISION", "float32").lower()
+
+# 정답 검증 결과 캐시 (SQLite). 같은 문제/선지/검증 설정이면 다시 추론하지 않음
+VERIFICATION_CACHE_PATH = os.getenv(
+    "VERIFICATION_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Data', '.cache', 'verification_cache.sqlite3'),
+)
+
+# HTTP 정답 검증 self-consistency: 1보다 크면 샘플링 요청을 이만큼 동시에 보내고 다수결로 정답을 정함 (1이면 기존처럼 한 번 호출)
+API_VERIFY_SAMPLES = int(os.getenv("API_VERIFY_SAMPLES", "1"))
+# 요청 하나가 보낼 수 있는 최대 샘플 수 (/verify의 samples 상한이자 호출별 동시 요청 수 상한)
+MAX_VERIFY_SAMPLES = int(os.getenv("MAX_VERIFY_SAMPLES", "16"))
+
+# 퀴즈 진행 상태 저장소: "sqlite"(기본), "file"(세션별 JSON 파일), "none"(프로세스 안에서만 유지).
+# 여러 replica가 세션을 공유하려면 SESSION_STORE_PATH를 공유 볼륨에 둠
+SESSION_STORE = os.getenv("SESSION_STORE", "sqlite").lower()
+SESSION_STORE_PATH = os.getenv(
+    "SESSION_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Data', '.cache',
+                 'sessions' if SESSION_STORE == "file" else 'sessions.sqlite3'),
+)
+# 세션 스냅샷을 모아서 쓰는 간격(초). 이 안에서 여러 번 바뀐 세션은 마지막 상태만 씀
+SESSION_WRITE_INTERVAL_SECONDS = float(os.getenv("SESSION_WRITE_INTERVAL_SECONDS", "0.5"))
+
+# 학생 풀이 기록(append-only SQLite)과 집계 리포트. 쓰기는 ATTEMPT_LOG_FLUSH_SECONDS마다 최대 ATTEMPT_LOG_BATCH_SIZE개씩 모아서 함
+ATTEMPT_LOG_ENABLED = os.getenv("ATTEMPT_LOG_ENABLED", "true").lower() in ("1", "true", "yes")
+ATTEMPT_LOG_PATH = os.getenv(
+    "ATTEMPT_LOG_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Data', 'attempt_log.sqlite3'),
+)
+ATTEMPT_LOG_FLUSH_SECONDS = float(os.getenv("ATTEMPT_LOG_FLUSH_SECONDS", "1.0"))
+ATTEMPT_LOG_BATCH_SIZE = int(os.getenv("ATTEMPT_LOG_BATCH_SIZE", "500"))
+
+# Hugging Face API 키는 처음 필요할 때 .env에서 읽음 (모듈 import만으로 .env를 읽거나 키가 없다고 실패하지 않도록)
+_huggingface_api_key: Optional[str] = None
+
+
+def get_huggingface_api_key() -> str:
+    global _huggingface_api_key
+    if _huggingface_api_key is None:
+        from dotenv import load_dotenv
+        load_dotenv()
+        api_key = os.getenv("HUGGINGFACE_API_KEY")
+        if not api_key:
+            raise ValueError("API_KEY가 설정되지 않았습니다. .env 파일을 확인하세요.")
+        _huggingface_api_key = api_key
+    return _huggingface_api_key
@@ -0,0 +1,156 @@
+# data_store.py
+# CSV 원본을 한 번만 파싱해서 바이너리 컬럼 캐시(pickle)로 저장하고, 이후 실행에서는 캐시를 바로 로드합니다.
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from typing import Dict, Iterable, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# 캐시 포맷이 바뀌면 올려서 기존 캐시를 무효화
+CACHE_VERSION = 1
+CACHE_DIR_NAME = '.cache'
+
+TRAIN_CATEGORICAL_COLUMNS = ('ConstructName', 'SubjectName')
+TRAIN_DTYPES = {
+    'QuestionId': 'int32',
+    'ConstructId': 'int32',
+    'SubjectId': 'int32',
+}
+MISCONCEPTION_DTYPES = {
+    'MisconceptionId': 'int32',
+}
+
+
+def _file_sha1(path: str) -> str:
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _cache_paths(csv_path: str, cache_dir: Optional[str]) -> tuple:
+    cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(csv_path)), CACHE_DIR_NAME)
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(cache_dir, f"{name}.pkl"), os.path.join(cache_dir, f"{name}.meta.json")
+
+
+def _read_meta(meta_path: str) -> Optional[dict]:
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _atomic_write(path: str, write, mode: str = 'w'):
+    """
+    같은 디렉터리의 고유한 임시 파일에 쓴 뒤 이름을 바꿈.
+    여러 프로세스가 동시에 캐시를 만들어도 서로의 임시 파일을 덮어쓰지 않고, 읽는 쪽은 반쯤 쓰인 파일을 보지 않음
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode, **({} if 'b' in mode else {'encoding': 'utf-8'})) as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _write_meta(meta_path: str, meta: dict):
+    _atomic_write(meta_path, lambda f: json.dump(meta, f))
+
+
+def _is_cache_valid(meta: Optional[dict], stat: os.stat_result, csv_path: str, options: dict) -> bool:
+    """mtime/size가 같으면 바로 유효, mtime만 바뀐 경우에는 해시로 다시 확인"""
+    if not meta or meta.get('version') != CACHE_VERSION or meta.get('options') != options:
+        return False
+    if meta.get('size') != stat.st_size:
+        return False
+    if meta.get('mtime_ns') == stat.st_mtime_ns:
+        return True
+    return meta.get('sha1') == _file_sha1(csv_path)
+
+
+def read_csv_cached(csv_path: str,
+                    categorical_columns: Iterable[str] = (),
+                    dtypes: Optional[Dict[str, str]] = None,
+                    cache_dir: Optional[str] = None) -> pd.DataFrame:
+    """
+    CSV를 바이너리 캐시를 거쳐 로드합니다.
+    캐시는 원본의 mtime/size/sha1로 무효화되며, 캐시를 쓸 수 없는 환경이면 CSV 파싱 결과를 그대로 반환합니다.
+    """
+    stat = os.stat(csv_path)  # 원본이 없으면 FileNotFoundError를 그대로 전달
+    cache_path, meta_path = _cache_paths(csv_path, cache_dir)
+    options = {
+        'categorical_columns': sorted(categorical_columns),
+        'dtypes': dict(sorted((dtypes or {}).items())),
+    }
+
+    meta = _read_meta(meta_path)
+    if os.path.exists(cache_path) and _is_cache_valid(meta, stat, csv_path, options):
+        try:
+            df = pd.read_pickle(cache_path)
+        except Exception as e:
+            logger.warning(f"Failed to read cache {cache_path}, rebuilding: {e}")
+        else:
+            if meta.get('mtime_ns') != stat.st_mtime_ns:
+                # 내용은 같고 mtime만 바뀐 경우: 다음 로드에서 해시 계산을 건너뛰도록 갱신.
+                # 캐시 디렉터리에 쓸 수 없어도(읽기 전용, 디스크 가득 참) 읽어 온 캐시는 그대로 사용
+                meta['mtime_ns'] = stat.st_mtime_ns
+                try:
+                    _write_meta(meta_path, meta)
+                except OSError as e:
+                    logger.warning(f"Could not refresh cache metadata {meta_path}: {e}")
+            logger.info(f"Loaded cached data for {csv_path}")
+            return df
+
+    logger.info(f"Parsing CSV {csv_path}...")
+    df = pd.read_csv(csv_path)
+    for col in options['categorical_columns']:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    for col, dtype in options['dtypes'].items():
+        if col in df.columns and not df[col].isna().any():
+            df[col] = df[col].astype(dtype)
+
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        _atomic_write(cache_path, df.to_pickle, mode='wb')
+        _write_meta(meta_path, {
+            'version': CACHE_VERSION,
+            'options': options,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha1': _file_sha1(csv_path),
+        })
+        logger.info(f"Wrote data cache {cache_path}")
+    except OSError as e:
+        logger.warning(f"Could not write data cache for {csv_path}: {e}")
+
+    return df
+
+
+def load_train_data(csv_path: str, cache_dir: Optional[str] = None) -> pd.DataFrame:
+    """train.csv 형식의 문제 데이터 로드 (ConstructName/SubjectName은 category로 인코딩)"""
+    return read_csv_cached(csv_path, TRAIN_CATEGORICAL_COLUMNS, TRAIN_DTYPES, cache_dir)
+
+
+def load_misconception_mapping(csv_path: str, cache_dir: Optional[str] = None) -> pd.DataFrame:
+    """misconception_mapping.csv 로드"""
+    return read_csv_cached(csv_path, dtypes=MISCONCEPTION_DTYPES, cache_dir=cache_dir)
+
+
+if __name__ == "__main__":
+    # 배포 전에 미리 캐시를 만들어 두기 위한 용도: python -m src.data_store
+    logging.basicConfig(level=logging.INFO)
+    data_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Data')
+    load_train_data(os.path.join(data_path, 'train.csv'))
+    load_misconception_mapping(os.path.join(data_path, 'misconception_mapping.csv'))
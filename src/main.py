@@ -1,11 +1,11 @@
-import pandas as pd
+from src.data_store import load_train_data
 from module1 import MisconceptionPredictor
 from module2 import SimilarQuestionGenerator
 from module3 import SelfConsistencyChecker
 
 if __name__ == "__main__":
     # train.csv 로드
-    df = pd.read_csv('train_updated.csv')
+    df = load_train_data('train_updated.csv')
 
     # 모듈 초기화
     predictor = MisconceptionPredictor(misconception_csv_path='misconception_mapping.csv')
@@ -68,8 +68,16 @@ if __name__ == "__main__":
             )
 
             if not gen_question:
-                print("[Module2 Output] No valid question generated. Skipping Module3.")
-                break
+                if raw_output is None:
+                    print("[Module2 Output] No valid question generated. Skipping Module3.")
+                    break
+                # 구조 검증에서 거절된 문제: 10번 추론으로 검증하지 않고 바로 재생성
+                mismatch_count += 1
+                print("[Module2 Output] Malformed question rejected, regenerating.")
+                if mismatch_count >= max_retries:
+                    print("재생성 한도 초과! 문항 생성을 중단합니다.")
+                    break
+                continue
 
             # 출력
             print("\n[Module2 Output] Generated Similar Question:")
@@ -0,0 +1,139 @@
+# micro_batcher.py
+# 여러 호출자가 짧은 시간 안에 보낸 요청을 모아 한 번의 배치 호출(API 리스트 입력 / model.generate)로 처리하고,
+# 결과를 각 호출자에게 다시 나눠 줍니다.
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    submit()으로 들어온 항목을 첫 항목 도착 후 max_wait_seconds 동안(또는 max_batch_size개가 찰 때까지) 모아
+    batch_fn(items)을 한 번 호출합니다. batch_fn은 items와 같은 길이의 결과 리스트를 반환해야 하며,
+    결과가 Exception 인스턴스이면 해당 호출자에게만 그 예외를 전달합니다.
+    batch_fn 자체가 실패하면 배치 안의 모든 호출자가 같은 예외를 받습니다.
+    max_in_flight개까지의 배치를 동시에 실행합니다 (HTTP 호출은 여러 개, 한 GPU의 model.generate는 1개).
+    실행 중인 배치가 가득 차 있는 동안 들어온 항목은 다음 배치로 모입니다.
+    """
+
+    def __init__(self, batch_fn: Callable[[List[Any]], Sequence[Any]], max_batch_size: int = 8,
+                 max_wait_seconds: float = 0.02, name: str = 'micro-batcher', max_in_flight: int = 1):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: List[tuple] = []
+        self._cond = threading.Condition()
+        self._worker: Optional[threading.Thread] = None
+        self.stats = {'items': 0, 'batches': 0, 'max_batch': 0}
+
+    def submit_async(self, item: Any) -> Future:
+        future: Future = Future()
+        with self._cond:
+            if self._worker is None:
+                # 사용하지 않는 프로세스에서는 스레드를 만들지 않도록 첫 요청 때 시작
+                if self.max_in_flight > 1:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix=self.name)
+                self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._worker.start()
+            self._pending.append((item, future))
+            self._cond.notify()
+        return future
+
+    def submit(self, item: Any, timeout: Optional[float] = None) -> Any:
+        """배치로 처리된 이 항목의 결과를 기다려 반환"""
+        return self.submit_async(item).result(timeout)
+
+    def _take_batch(self) -> List[tuple]:
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            deadline = time.monotonic() + self.max_wait_seconds
+            while len(self._pending) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:self.max_batch_size]
+            return batch
+
+    def _run(self):
+        while True:
+            # 실행 슬롯이 빌 때까지 기다린 뒤 배치를 만듦 (그동안 들어온 항목은 같은 배치로 모임)
+            self._slots.acquire()
+            batch = self._take_batch()
+            # 기다리다 취소된 항목은 배치에서 제외
+            batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                self._slots.release()
+                continue
+            self.stats['items'] += len(batch)
+            self.stats['batches'] += 1
+            self.stats['max_batch'] = max(self.stats['max_batch'], len(batch))
+            if self._executor is None:
+                self._run_batch(batch)
+            else:
+                self._executor.submit(self._run_batch, batch)
+
+    def _run_batch(self, batch: List[tuple]):
+        try:
+            try:
+                results = self.batch_fn([item for item, _ in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f"{self.name}: batch_fn returned {len(results)} results for {len(batch)} items")
+            except BaseException as e:
+                logger.error(f"{self.name}: batch of {len(batch)} failed: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                return
+
+            for (_, future), result in zip(batch, results):
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+        finally:
+            self._slots.release()
+
+    def metrics(self) -> dict:
+        with self._cond:
+            pending = len(self._pending)
+        stats = dict(self.stats, pending=pending)
+        stats['mean_batch'] = round(stats['items'] / stats['batches'], 2) if stats['batches'] else 0.0
+        return stats
+
+
+def split_generated_texts(response_data: Any, count: int) -> List[str]:
+    """
+    Hugging Face text-generation 응답을 프롬프트별 generated_text 리스트로 변환합니다.
+    단일 입력 응답({..} / [{..}])과 리스트 입력 응답([{..}, ..] / [[{..}], ..])을 모두 처리합니다.
+    """
+    if isinstance(response_data, dict):
+        items = [response_data]
+    elif isinstance(response_data, list):
+        items = response_data
+    else:
+        items = [str(response_data)]
+    if count == 1:
+        items = items[:1] or ['']
+    if len(items) != count:
+        raise ValueError(f"Expected {count} generations in API response, got {len(items)}")
+
+    texts = []
+    for item in items:
+        if isinstance(item, list):
+            item = item[0] if item else ''
+        texts.append(item.get('generated_text', '') if isinstance(item, dict) else str(item))
+    return texts
@@ -0,0 +1,138 @@
+# model_loading.py
+# module2_ori.py(유사 문제 생성)와 module3.py(self-consistency 검증)가 함께 쓰는 로컬 Llama 로더
+import logging
+import os
+import time
+from typing import Dict, Tuple
+
+import torch
+from torch import nn
+from transformers import AutoModelForCausalLM, AutoTokenizer
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from src.config import CPU_PRECISION, Llama3_8b_PATH
+
+logger = logging.getLogger(__name__)
+
+PRECISION_FLOAT32 = 'float32'
+PRECISION_BFLOAT16 = 'bfloat16'
+PRECISION_INT8 = 'int8'
+CPU_PRECISIONS = (PRECISION_FLOAT32, PRECISION_BFLOAT16, PRECISION_INT8)
+
+
+def load_tokenizer(model_name: str, cache_dir: str = Llama3_8b_PATH):
+    tokenizer = AutoTokenizer.from_pretrained(model_name, cache_dir=cache_dir, trust_remote_code=True)
+    # 배치 생성: 프롬프트 끝이 맞춰지도록 왼쪽 패딩 (Llama 3에는 pad 토큰이 없으므로 eos 사용)
+    tokenizer.padding_side = 'left'
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    return tokenizer
+
+
+def quantize_linear_int8(model: nn.Module) -> nn.Module:
+    """
+    Linear 레이어를 int8 동적 양자화 (가중치 int8, 활성값은 실행 중 양자화).
+    동적 양자화는 float32 가중치가 필요하므로, 디코더 블록(ModuleList 원소)을 하나씩 float32로 바꾼 직후 양자화해서
+    전체 모델이 float32로 올라가는 순간이 없도록 합니다.
+    """
+    for module in list(model.modules()):
+        if isinstance(module, nn.ModuleList):
+            for block in module:
+                block.float()
+                torch.ao.quantization.quantize_dynamic(block, {nn.Linear}, dtype=torch.qint8, inplace=True)
+    # 남은 부분(임베딩, 최종 norm, lm_head)
+    model.float()
+    torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8, inplace=True)
+    return model
+
+
+def _rss_mb() -> float:
+    """현재 RSS (MB). /proc가 없는 환경에서는 최대 RSS로 대신함"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return _peak_rss_mb()
+
+
+def _peak_rss_mb() -> float:
+    if resource is None:
+        return 0.0
+    # Linux에서 ru_maxrss 단위는 KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def warm_up(tokenizer, model):
+    """더미 입력으로 forward 한 번: 첫 요청이 커널 초기화/메모리 할당 비용을 떠안지 않도록 함"""
+    inputs = tokenizer("Warm-up", return_tensors='pt')
+    inputs = {k: v.to(model.device) for k, v in inputs.items()}
+    with torch.no_grad():
+        model(**inputs)
+
+
+def load_causal_lm(model_name: str, cache_dir: str = Llama3_8b_PATH, cpu_precision: str = CPU_PRECISION,
+                   warmup: bool = True) -> Tuple[object, nn.Module]:
+    """
+    (tokenizer, model)을 반환합니다.
+    GPU가 있으면 bfloat16 + device_map="auto", 없으면 cpu_precision에 따라 float32 / bfloat16 / int8(동적 양자화)로 올립니다.
+
+    safetensors 가중치를 mmap으로 읽고 low_cpu_mem_usage로 무작위 초기화 없이 바로 채워서
+    가중치가 메모리에 두 벌 올라가지 않게 합니다. 단계별 소요 시간과 RSS는 로그로 남기고 model.load_report에도 저장합니다.
+    """
+    if cpu_precision not in CPU_PRECISIONS:
+        raise ValueError(f"Unknown CPU precision '{cpu_precision}'. Expected one of {CPU_PRECISIONS}")
+
+    report: Dict[str, float] = {}
+
+    def _phase(name: str, started: float):
+        report[f'{name}_seconds'] = time.perf_counter() - started
+        report[f'{name}_rss_mb'] = _rss_mb()
+
+    started = time.perf_counter()
+    tokenizer = load_tokenizer(model_name, cache_dir)
+    _phase('tokenizer', started)
+
+    use_cuda = torch.cuda.is_available()
+    if use_cuda:
+        torch_dtype = torch.bfloat16
+    elif cpu_precision == PRECISION_FLOAT32:
+        torch_dtype = torch.float32
+    else:
+        # int8은 bfloat16으로 읽은 뒤 블록 단위로 양자화
+        torch_dtype = torch.bfloat16
+
+    started = time.perf_counter()
+    model = AutoModelForCausalLM.from_pretrained(
+        model_name,
+        cache_dir=cache_dir,
+        torch_dtype=torch_dtype,
+        trust_remote_code=True,
+        use_safetensors=True,
+        low_cpu_mem_usage=True,
+        # device_map이 이미 GPU에 올려 주므로 뒤에서 .to('cuda')를 다시 하지 않음
+        device_map="auto" if use_cuda else None,
+    )
+    model.eval()
+    _phase('weights', started)
+
+    if not use_cuda and cpu_precision == PRECISION_INT8:
+        started = time.perf_counter()
+        quantize_linear_int8(model)
+        _phase('quantize', started)
+
+    if warmup:
+        started = time.perf_counter()
+        warm_up(tokenizer, model)
+        _phase('warmup', started)
+
+    report['peak_rss_mb'] = _peak_rss_mb()
+    model.load_report = report
+    device = 'GPU' if use_cuda else f"CPU ({cpu_precision})"
+    phases = ', '.join(f"{key[:-len('_seconds')]} {value:.1f}s" for key, value in report.items() if key.endswith('_seconds'))
+    logger.info(f"Model '{model_name}' loaded on {device}: {phases}; "
+                f"RSS {_rss_mb():.0f} MB, peak RSS {report['peak_rss_mb']:.0f} MB")
+    return tokenizer, model
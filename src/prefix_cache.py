@@ -0,0 +1,103 @@
+# prefix_cache.py
+# 로컬 transformers 경로에서 모든 프롬프트가 공유하는 고정 system 블록의 KV cache를 한 번만 계산해 두고,
+# 요청마다 뒷부분(suffix)만 prefill 하도록 합니다.
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List
+
+import torch
+
+try:
+    from transformers import DynamicCache
+except ImportError:  # transformers < 4.36: prefix 캐시 없이 전체 프롬프트를 prefill
+    DynamicCache = None
+
+logger = logging.getLogger(__name__)
+
+
+class _PrefixEntry:
+    __slots__ = ('input_ids', 'key_values')
+
+    def __init__(self, input_ids: torch.Tensor, key_values: tuple):
+        self.input_ids = input_ids
+        self.key_values = key_values
+
+
+class PrefixKVCache:
+    """
+    prefix 텍스트의 해시별로 (토큰, 레이어별 key/value)를 보관합니다. 템플릿이 바뀌면 해시가 달라지므로 새로 계산되고,
+    오래된 항목은 max_entries를 넘을 때 밀려납니다.
+
+    prefix는 special token(예: <|eot_id|>)에서 끝나야 합니다. 그래야 prefix와 suffix를 따로 토크나이즈해도
+    전체 프롬프트를 한 번에 토크나이즈한 것과 토큰 경계가 같습니다.
+    """
+
+    def __init__(self, model, tokenizer, max_entries: int = 4):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_entries = max_entries
+        self.enabled = DynamicCache is not None
+        self._entries: "OrderedDict[str, _PrefixEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'fallbacks': 0}
+
+    def _entry(self, prefix: str, device) -> _PrefixEntry:
+        key = hashlib.sha256(prefix.encode('utf-8')).hexdigest()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return entry
+
+            self.stats['misses'] += 1
+            input_ids = self.tokenizer(prefix, return_tensors='pt')['input_ids'].to(device)
+            with torch.no_grad():
+                outputs = self.model(input_ids=input_ids, past_key_values=DynamicCache(), use_cache=True)
+            entry = _PrefixEntry(input_ids, outputs.past_key_values.to_legacy_cache())
+            logger.info(f"Cached KV for a {input_ids.shape[1]}-token prompt prefix")
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def prepare(self, prompts: List[str], prefix: str, device) -> Dict[str, object]:
+        """
+        model.generate(**inputs)에 넘길 입력을 만듭니다.
+        모든 프롬프트가 prefix로 시작하면 [prefix][패딩][suffix] 형태로 만들고, 캐시된 prefix KV를 past_key_values로 넘깁니다.
+        (패딩 위치는 attention mask가 0이므로 position id는 prefix 바로 뒤에서 이어짐)
+        그렇지 않으면 기존처럼 왼쪽 패딩으로 전체 프롬프트를 토크나이즈합니다.
+        """
+        if not self.enabled or not all(prompt.startswith(prefix) for prompt in prompts):
+            self.stats['fallbacks'] += 1
+            inputs = self.tokenizer(prompts, return_tensors='pt', padding=True)
+            return {k: v.to(device) for k, v in inputs.items()}
+
+        entry = self._entry(prefix, device)
+        batch_size = len(prompts)
+        suffixes = self.tokenizer([prompt[len(prefix):] for prompt in prompts], return_tensors='pt',
+                                  padding=True, add_special_tokens=False)
+        prefix_ids = entry.input_ids.expand(batch_size, -1)
+        input_ids = torch.cat([prefix_ids, suffixes['input_ids'].to(device)], dim=1)
+        attention_mask = torch.cat([torch.ones_like(prefix_ids), suffixes['attention_mask'].to(device)], dim=1)
+
+        # generate는 캐시에 새 key/value를 이어 붙인 새 텐서를 만들 뿐이므로, 저장된 prefix 텐서는 요청 간에 공유해도 안전
+        key_values = tuple(
+            (key.expand(batch_size, -1, -1, -1), value.expand(batch_size, -1, -1, -1))
+            for key, value in entry.key_values
+        )
+        return {
+            'input_ids': input_ids,
+            'attention_mask': attention_mask,
+            'past_key_values': DynamicCache.from_legacy_cache(key_values),
+        }
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries))
@@ -0,0 +1,141 @@
+# question_bank.py
+# train.csv 문제들을 정수 인덱스로 묶어 두고, 요청 경로에서 pandas 전체 스캔 없이 문제를 고를 수 있게 합니다.
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.data_store import load_train_data
+
+logger = logging.getLogger(__name__)
+
+OPTIONS = ('A', 'B', 'C', 'D')
+
+
+def _group_positions(values: np.ndarray) -> Dict[int, np.ndarray]:
+    """값 -> 해당 값을 가진 행 위치(정렬된 int 배열) 딕셔너리. stable 정렬이라 그룹 안의 위치는 오름차순"""
+    order = np.argsort(values, kind='stable')
+    keys, starts = np.unique(values[order], return_index=True)
+    return {int(k): positions for k, positions in zip(keys, np.split(order, starts[1:]))}
+
+
+def _intersect_sorted(small: np.ndarray, large: np.ndarray) -> np.ndarray:
+    """정렬된 두 위치 배열의 교집합. 다시 정렬하지 않고 small의 각 값을 large에서 이진 탐색 (O(len(small) log len(large)))"""
+    if len(small) == 0 or len(large) == 0:
+        return small[:0]
+    index = np.minimum(np.searchsorted(large, small), len(large) - 1)
+    return small[large[index] == small]
+
+
+def _remove_sorted(positions: np.ndarray, exclude: np.ndarray) -> np.ndarray:
+    """정렬된 positions에서 exclude에 있는 값을 제거 (exclude는 정렬/중복 제거가 필요 없음)"""
+    if len(positions) == 0 or len(exclude) == 0:
+        return positions
+    index = np.minimum(np.searchsorted(positions, exclude), len(positions) - 1)
+    return np.delete(positions, index[positions[index] == exclude])
+
+
+class QuestionBank:
+    """
+    읽기 전용 문제 은행.
+    SubjectId / ConstructId 별 행 위치와 MisconceptionId -> (QuestionId, 선지) 역색인을 미리 계산해 둡니다.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df.reset_index(drop=True)
+        self.question_ids = self.df['QuestionId'].to_numpy()
+        self._position_by_question_id = {int(qid): pos for pos, qid in enumerate(self.question_ids)}
+        self._by_subject = _group_positions(self.df['SubjectId'].to_numpy())
+        self._by_construct = _group_positions(self.df['ConstructId'].to_numpy())
+
+        self._by_misconception: Dict[int, List[Tuple[int, str]]] = {}
+        misconception_positions: Dict[int, List[int]] = {}
+        for option in OPTIONS:
+            column = self.df[f'Misconception{option}Id'].to_numpy()
+            for pos in np.flatnonzero(~pd.isna(column)):
+                misconception_id = int(column[pos])
+                self._by_misconception.setdefault(misconception_id, []).append((int(self.question_ids[pos]), option))
+                misconception_positions.setdefault(misconception_id, []).append(int(pos))
+        self._misconception_positions = {
+            mid: np.unique(np.asarray(positions, dtype=np.intp)) for mid, positions in misconception_positions.items()
+        }
+        self._all_positions = np.arange(len(self.df), dtype=np.intp)
+        logger.info(f"QuestionBank built: {len(self.df)} questions, {len(self._by_misconception)} misconceptions indexed")
+
+    @classmethod
+    def from_csv(cls, csv_path: str) -> 'QuestionBank':
+        return cls(load_train_data(csv_path))
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    def row(self, position: int) -> pd.Series:
+        """행 위치로 문제 한 개 조회"""
+        return self.df.iloc[int(position)]
+
+    def position_of(self, question_id: int) -> Optional[int]:
+        return self._position_by_question_id.get(int(question_id))
+
+    def subject_positions(self, subject_id: int) -> np.ndarray:
+        return self._by_subject.get(int(subject_id), self._all_positions[:0])
+
+    def construct_positions(self, construct_id: int) -> np.ndarray:
+        return self._by_construct.get(int(construct_id), self._all_positions[:0])
+
+    def misconception_positions(self, misconception_id: int) -> np.ndarray:
+        return self._misconception_positions.get(int(misconception_id), self._all_positions[:0])
+
+    def questions_for_misconception(self, misconception_id: int) -> List[Tuple[int, str]]:
+        """해당 misconception을 유발하는 (QuestionId, 선지) 목록"""
+        return self._by_misconception.get(int(misconception_id), [])
+
+    def select(self,
+               subject_id: Optional[int] = None,
+               construct_id: Optional[int] = None,
+               misconception_id: Optional[int] = None,
+               exclude: Iterable[int] = ()) -> np.ndarray:
+        """
+        조건에 맞는 행 위치(정렬된 배열). 조건이 여러 개면 미리 정렬해 둔 버킷 중 가장 작은 것을 기준으로
+        나머지 버킷을 이진 탐색해서 교집합을 구하므로, 호출마다 큰 배열을 다시 정렬하지 않습니다.
+        """
+        buckets = []
+        if subject_id is not None:
+            buckets.append(self.subject_positions(subject_id))
+        if construct_id is not None:
+            buckets.append(self.construct_positions(construct_id))
+        if misconception_id is not None:
+            buckets.append(self.misconception_positions(misconception_id))
+
+        if not buckets:
+            positions = self._all_positions
+        else:
+            buckets.sort(key=len)
+            positions = buckets[0]
+            for bucket in buckets[1:]:
+                positions = _intersect_sorted(positions, bucket)
+
+        return _remove_sorted(positions, np.asarray(list(exclude), dtype=np.intp))
+
+    def sample(self, n: int, random_state: Optional[int] = None,
+               exclude: Iterable[int] = (), **filters) -> np.ndarray:
+        """
+        조건에 맞는 문제 중 n개의 행 위치를 비복원 추출 (순서는 무작위, random_state가 같으면 같은 결과).
+        Generator.choice는 n이 후보 수에 비해 작으면 전체 순열을 만들지 않고 뽑으므로 문제 은행 크기에 거의 비례하지 않습니다.
+        제외할 위치는 후보 배열에서 지우는 대신 그 수만큼 더 뽑은 뒤 걸러 냅니다.
+        """
+        positions = self.select(**filters)
+        exclude = np.unique(np.asarray(list(exclude), dtype=np.intp))
+        if n <= 0 or len(positions) == 0:
+            return positions[:0]
+        rng = np.random.default_rng(random_state)
+        size = min(len(positions), n + len(exclude))
+        picked = positions[rng.choice(len(positions), size=size, replace=False, shuffle=False)]
+        if len(exclude):
+            picked = picked[~np.isin(picked, exclude)]
+        picked = picked[:n]
+        rng.shuffle(picked)
+        return picked
+
+    def rows(self, positions: Iterable[int]) -> pd.DataFrame:
+        return self.df.iloc[list(positions)]
@@ -0,0 +1,169 @@
+# rate_limiter.py
+# Hugging Face 추론 API 호출을 분당 요청 수 / 분당 토큰 수 한도 안으로 제한하고, 호출한 기능별로 토큰 사용량을 집계합니다.
+import json
+import logging
+import math
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+from src.config import HF_REQUESTS_PER_MINUTE, HF_TOKENS_PER_MINUTE, RATE_LIMIT_QUEUE_TIMEOUT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitExceeded(TimeoutError):
+    """대기 한도 안에 호출 허가를 받지 못한 경우"""
+
+
+def estimate_tokens(text: str) -> int:
+    """토크나이저 없이 쓰는 대략적인 토큰 수 (영어 기준 약 4글자당 1토큰)"""
+    return max(1, math.ceil(len(text) / 4)) if text else 0
+
+
+class TokenBucket:
+    """rate_per_minute 속도로 채워지는 토큰 버킷. 실제 사용량 정산으로 잠시 음수가 될 수 있음"""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate_per_second)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """amount만큼 꺼낼 수 있을 때까지 남은 시간(초). capacity보다 큰 요청은 가득 찼을 때 허용"""
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate_per_second
+
+    def take(self, amount: float):
+        self.level -= amount
+
+    def adjust(self, amount: float):
+        self.level = min(self.capacity, self.level + amount)
+
+
+class RateLimiter:
+    """
+    분당 요청 수와 분당 토큰 수 두 개의 버킷을 함께 적용합니다.
+    대기하는 호출은 도착 순서(FIFO)대로 허가되며, timeout 안에 허가받지 못하면 RateLimitExceeded가 발생합니다.
+    한도가 0 이하이면 해당 버킷은 적용하지 않습니다.
+    """
+
+    def __init__(self, requests_per_minute: float = HF_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float = HF_TOKENS_PER_MINUTE,
+                 default_timeout: Optional[float] = RATE_LIMIT_QUEUE_TIMEOUT_SECONDS):
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.default_timeout = default_timeout
+        self._cond = threading.Condition()
+        self._queue: deque = deque()
+        self._next_ticket = 0
+        self._usage: Dict[str, Dict[str, float]] = {}
+
+    def _caller_usage(self, caller: str) -> Dict[str, float]:
+        return self._usage.setdefault(caller, {
+            'requests': 0,
+            'prompt_tokens': 0,
+            'completion_tokens': 0,
+            'throttled_requests': 0,
+            'rejected_requests': 0,
+            'wait_seconds': 0.0,
+        })
+
+    def _wait_time(self, tokens: int) -> float:
+        now = time.monotonic()
+        wait = 0.0
+        if self.request_bucket is not None:
+            self.request_bucket.refill(now)
+            wait = max(wait, self.request_bucket.wait_time(1))
+        if self.token_bucket is not None:
+            self.token_bucket.refill(now)
+            wait = max(wait, self.token_bucket.wait_time(tokens))
+        return wait
+
+    def acquire(self, tokens: int = 0, caller: str = 'default', timeout: Optional[float] = None):
+        """
+        호출 한 번과 예상 토큰 수(tokens)만큼의 허가를 받을 때까지 기다립니다.
+        timeout(초)을 넘기거나, 기다려도 timeout 안에 허가받을 수 없으면 바로 RateLimitExceeded.
+        """
+        timeout = self.default_timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout if timeout is not None else None
+
+        with self._cond:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            self._queue.append(ticket)
+            usage = self._caller_usage(caller)
+            try:
+                while True:
+                    wait = None
+                    if self._queue[0] == ticket:
+                        wait = self._wait_time(tokens)
+                        if wait <= 0:
+                            if self.request_bucket is not None:
+                                self.request_bucket.take(1)
+                            if self.token_bucket is not None:
+                                self.token_bucket.take(tokens)
+                            break
+
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0 or (wait is not None and wait > remaining):
+                            usage['rejected_requests'] += 1
+                            raise RateLimitExceeded(f"Rate limit: could not acquire within {timeout}s for '{caller}'")
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self._cond.wait(wait)
+            finally:
+                self._queue.remove(ticket)
+                self._cond.notify_all()
+
+            waited = time.monotonic() - started
+            usage['requests'] += 1
+            usage['wait_seconds'] += waited
+            if waited > 0.001:
+                usage['throttled_requests'] += 1
+
+    def record_usage(self, caller: str, prompt_tokens: int, completion_tokens: int, reserved_tokens: int = 0):
+        """응답을 받은 뒤 실제 토큰 사용량을 기록하고, 미리 잡아 둔 토큰(reserved_tokens)과의 차이를 버킷에 정산"""
+        with self._cond:
+            usage = self._caller_usage(caller)
+            usage['prompt_tokens'] += prompt_tokens
+            usage['completion_tokens'] += completion_tokens
+            if self.token_bucket is not None:
+                self.token_bucket.adjust(reserved_tokens - (prompt_tokens + completion_tokens))
+            self._cond.notify_all()
+
+    def usage_report(self) -> Dict[str, Dict[str, float]]:
+        """호출한 기능별 사용량"""
+        with self._cond:
+            report = {}
+            for caller, usage in self._usage.items():
+                report[caller] = dict(usage, total_tokens=usage['prompt_tokens'] + usage['completion_tokens'])
+            return report
+
+    def export_usage(self, path: str):
+        """사용량 보고서를 JSON 파일로 저장"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.usage_report(), f, indent=2)
+        logger.info(f"Usage report exported to {path}")
+
+
+_shared_limiter: Optional[RateLimiter] = None
+_shared_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """프로세스 전체가 공유하는 Hugging Face API rate limiter"""
+    global _shared_limiter
+    with _shared_lock:
+        if _shared_limiter is None:
+            _shared_limiter = RateLimiter()
+        return _shared_limiter
@@ -0,0 +1,246 @@
+# resilience.py
+# 추론 API 꼬리 지연을 제한하기 위한 헤지 요청(hedged request)과 서킷 브레이커
+import logging
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, List, Optional
+
+from src.config import (
+    API_REQUEST_TIMEOUT_SECONDS,
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_MIN_CALLS,
+    CIRCUIT_RESET_SECONDS,
+    HEDGE_INITIAL_DELAY_SECONDS,
+    HEDGE_PERCENTILE,
+    HEDGE_REQUESTS,
+)
+from src.rate_limiter import RateLimitExceeded
+
+logger = logging.getLogger(__name__)
+
+# /metrics 등에서 모아 보기 위해 생성된 호출자를 기록
+_callers: List['ResilientCaller'] = []
+_callers_lock = threading.Lock()
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(RuntimeError):
+    """서킷이 열려 있어 호출하지 않고 바로 실패한 경우"""
+
+
+class HedgeQueueTimeout(TimeoutError):
+    """헤지 실행기 대기열이 밀려 timeout 안에 호출을 시작하지도 못한 경우 (상위 API 실패가 아님)"""
+
+
+class CircuitBreaker:
+    """
+    최근 window번의 호출 결과를 보고, 호출이 min_calls 이상이면서 실패 비율이 failure_threshold 이상이면 서킷을 엽니다.
+    열린 뒤 reset_seconds가 지나면 한 번의 시험 호출(half-open)을 허용하고, 성공하면 닫고 실패하면 다시 엽니다.
+    """
+
+    def __init__(self, name: str, failure_threshold: float = CIRCUIT_FAILURE_THRESHOLD,
+                 min_calls: int = CIRCUIT_MIN_CALLS, reset_seconds: float = CIRCUIT_RESET_SECONDS, window: int = 50):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.min_calls = min_calls
+        self.reset_seconds = reset_seconds
+        self._outcomes: deque = deque(maxlen=window)
+        self._state = STATE_CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self.stats = {'rejected': 0, 'opened': 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def allow(self):
+        """호출해도 되면 그대로 반환하고, 아니면 CircuitOpenError"""
+        with self._lock:
+            if self._state == STATE_OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self._state = STATE_HALF_OPEN
+                self._probe_in_flight = False
+            if self._state == STATE_CLOSED:
+                return
+            if self._state == STATE_HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            self.stats['rejected'] += 1
+        raise CircuitOpenError(f"Circuit '{self.name}' is open")
+
+    def record_success(self):
+        with self._lock:
+            if self._state == STATE_HALF_OPEN:
+                logger.info(f"Circuit '{self.name}' closed")
+                self._state = STATE_CLOSED
+                self._outcomes.clear()
+            self._outcomes.append(True)
+
+    def release(self):
+        """성공도 실패도 아닌 경우(클라이언트 쪽 rate limit 거절 등): 기록하지 않고 half-open 시험 호출 자리만 돌려줌"""
+        with self._lock:
+            if self._state == STATE_HALF_OPEN:
+                self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._outcomes.append(False)
+            if self._state == STATE_HALF_OPEN:
+                self._open()
+                return
+            failures = self._outcomes.count(False)
+            if (self._state == STATE_CLOSED and len(self._outcomes) >= self.min_calls
+                    and failures / len(self._outcomes) >= self.failure_threshold):
+                self._open()
+
+    def _open(self):
+        logger.warning(f"Circuit '{self.name}' opened")
+        self._state = STATE_OPEN
+        self._opened_at = time.monotonic()
+        self.stats['opened'] += 1
+
+    def metrics(self) -> dict:
+        with self._lock:
+            failures = self._outcomes.count(False)
+            return dict(self.stats, state=self._state, recent_calls=len(self._outcomes), recent_failures=failures)
+
+
+class ResilientCaller:
+    """
+    서킷 브레이커를 거쳐 fn을 호출합니다.
+    hedge가 켜져 있으면 최근 성공 지연 시간의 hedge_percentile 분위만큼 기다린 뒤에도 응답이 없을 때
+    같은 호출을 한 번 더 보내 먼저 성공한 결과를 사용합니다.
+    전체 대기는 timeout(초)으로 제한되며, 늦게 끝난 쪽의 결과는 버립니다.
+    헤지 지연과 timeout은 첫 호출이 실행기에서 실제로 시작된 시점부터 재므로, 로컬 대기열에서 기다린 시간 때문에 헤지가 나가지 않습니다.
+    서킷에는 Exception만 실패로 기록하고, GeneratorExit 같은 BaseException이나 로컬 거절은 기록하지 않습니다.
+    """
+
+    def __init__(self, name: str, breaker: Optional[CircuitBreaker] = None, hedge: bool = HEDGE_REQUESTS,
+                 hedge_percentile: float = HEDGE_PERCENTILE, initial_hedge_delay: float = HEDGE_INITIAL_DELAY_SECONDS,
+                 timeout: float = API_REQUEST_TIMEOUT_SECONDS, latency_window: int = 200, min_samples: int = 20,
+                 max_workers: int = 8):
+        self.name = name
+        self.breaker = breaker or CircuitBreaker(name)
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.initial_hedge_delay = initial_hedge_delay
+        self.timeout = timeout
+        self.min_samples = min_samples
+        self._latencies: deque = deque(maxlen=latency_window)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-hedge")
+        self.stats = {'calls': 0, 'hedged': 0, 'hedge_wins': 0, 'timeouts': 0, 'failures': 0, 'throttled': 0,
+                      'queue_timeouts': 0}
+        with _callers_lock:
+            _callers.append(self)
+
+    def hedge_delay(self) -> float:
+        """최근 지연 시간 분포의 분위수. 표본이 적으면 초기값 사용"""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return self.initial_hedge_delay
+            latencies = sorted(self._latencies)
+        index = min(len(latencies) - 1, max(0, math.ceil(self.hedge_percentile / 100 * len(latencies)) - 1))
+        return latencies[index]
+
+    def _timed(self, fn: Callable[..., Any], *args, **kwargs):
+        started = time.monotonic()
+        result = fn(*args, **kwargs)
+        return result, time.monotonic() - started
+
+    def call(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        self.breaker.allow()
+        with self._lock:
+            self.stats['calls'] += 1
+
+        try:
+            if self.hedge:
+                result, latency = self._call_hedged(fn, *args, **kwargs)
+            else:
+                result, latency = self._timed(fn, *args, **kwargs)
+        except (RateLimitExceeded, HedgeQueueTimeout) as e:
+            # 우리 쪽 rate limiter 거절/실행기 대기열 초과는 상위 API 장애가 아니므로 서킷 실패로 세지 않음
+            self.breaker.release()
+            with self._lock:
+                self.stats['throttled' if isinstance(e, RateLimitExceeded) else 'queue_timeouts'] += 1
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            with self._lock:
+                self.stats['failures'] += 1
+            raise
+        except BaseException:
+            # 호출한 쪽이 스트림을 닫거나(GeneratorExit) 프로세스가 중단된 경우: 결과를 알 수 없으므로 기록하지 않음
+            self.breaker.release()
+            raise
+
+        self.breaker.record_success()
+        with self._lock:
+            self._latencies.append(latency)
+        return result
+
+    def _call_hedged(self, fn: Callable[..., Any], *args, **kwargs):
+        started_at: List[float] = []
+        started = threading.Event()
+
+        def run_primary():
+            started_at.append(time.monotonic())
+            started.set()
+            return self._timed(fn, *args, **kwargs)
+
+        primary = self._executor.submit(run_primary)
+        # 헤지 지연과 timeout은 첫 호출이 실제로 시작된 뒤부터 잼 (실행기 대기열에서 기다린 시간은 제외)
+        if not started.wait(self.timeout):
+            if primary.cancel():
+                raise HedgeQueueTimeout(f"'{self.name}' call did not start within {self.timeout}s")
+            started.wait()
+        deadline = started_at[0] + self.timeout
+        hedge_at = started_at[0] + min(self.hedge_delay(), self.timeout)
+        done, pending = wait({primary}, timeout=max(0.0, hedge_at - time.monotonic()))
+        hedge_future = None
+        if not done:
+            hedge_future = self._executor.submit(self._timed, fn, *args, **kwargs)
+            pending.add(hedge_future)
+            with self._lock:
+                self.stats['hedged'] += 1
+
+        error: Optional[BaseException] = None
+        while True:
+            for future in done:
+                if future.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    if future is hedge_future:
+                        with self._lock:
+                            self.stats['hedge_wins'] += 1
+                    return future.result()
+                error = future.exception()
+            if not pending:
+                raise error
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                with self._lock:
+                    self.stats['timeouts'] += 1
+                raise TimeoutError(f"'{self.name}' call timed out after {self.timeout}s")
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+        stats['hedge_delay_seconds'] = round(self.hedge_delay(), 3)
+        stats['circuit'] = self.breaker.metrics()
+        return stats
+
+
+def api_callers() -> List[ResilientCaller]:
+    """지금까지 만들어진 ResilientCaller 목록"""
+    with _callers_lock:
+        return list(_callers)
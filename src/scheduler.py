@@ -0,0 +1,168 @@
+# scheduler.py
+# 여러 Streamlit 세션이 공유하는 생성기 호출을 전역 동시 실행 한도 안에서 세션별로 공평하게(round-robin) 처리합니다.
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Callable, Dict
+
+from src.config import GENERATION_MAX_QUEUE_PER_SESSION
+
+logger = logging.getLogger(__name__)
+
+# 숫자가 작을수록 먼저 처리
+PRIORITY_INTERACTIVE = 0
+PRIORITY_PREFETCH = 1
+PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_PREFETCH)
+
+
+class SchedulerQueueFull(RuntimeError):
+    """세션의 대기열이 max_queue_per_session개로 가득 차서 작업을 받지 않음"""
+
+
+class _Task:
+    __slots__ = ('future', 'fn', 'args', 'kwargs', 'enqueued_at')
+
+    def __init__(self, fn: Callable, args: tuple, kwargs: dict):
+        self.future = Future()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.enqueued_at = time.monotonic()
+
+
+class GenerationScheduler:
+    """
+    우선순위별로 세션마다 FIFO 큐를 두고, 같은 우선순위 안에서는 세션을 돌아가며 한 건씩 꺼냅니다.
+    실제 실행은 max_concurrency개의 워커 스레드가 담당하므로 상위 API 동시 호출 수가 그 이상으로 늘지 않습니다.
+    세션별 대기 작업은 우선순위마다 max_queue_per_session개까지이며, 넘으면 submit()이 SchedulerQueueFull을 냅니다.
+    대기 중에 취소된 작업(Future.cancel())은 실행하지 않고 버립니다.
+    """
+
+    def __init__(self, max_concurrency: int = 4, name: str = 'generation',
+                 max_queue_per_session: int = GENERATION_MAX_QUEUE_PER_SESSION):
+        self.max_concurrency = max_concurrency
+        self.max_queue_per_session = max_queue_per_session
+        self._queues: Dict[int, 'OrderedDict[str, deque]'] = {p: OrderedDict() for p in PRIORITIES}
+        self._cond = threading.Condition()
+        self._shutdown = False
+        self._running = 0
+        self._stats = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'cancelled': 0,
+            'rejected': 0,
+            'max_queue_depth': 0,
+            'total_wait_seconds': 0.0,
+            'max_wait_seconds': 0.0,
+        }
+        self._workers = [
+            threading.Thread(target=self._worker, name=f'{name}-worker-{i}', daemon=True)
+            for i in range(max_concurrency)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def _queue_depth(self) -> int:
+        return sum(len(q) for sessions in self._queues.values() for q in sessions.values())
+
+    def submit(self, session_id: str, fn: Callable, *args, priority: int = PRIORITY_INTERACTIVE, **kwargs) -> Future:
+        if priority not in self._queues:
+            raise ValueError(f"Unknown priority: {priority}")
+        task = _Task(fn, args, kwargs)
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError("Scheduler has been shut down.")
+            sessions = self._queues[priority]
+            queue = sessions.setdefault(session_id, deque())
+            if len(queue) >= self.max_queue_per_session:
+                # 취소된 작업이 자리를 차지하고 있으면 먼저 비움
+                live = deque(t for t in queue if not t.future.cancelled())
+                self._stats['cancelled'] += len(queue) - len(live)
+                sessions[session_id] = queue = live
+            if len(queue) >= self.max_queue_per_session:
+                self._stats['rejected'] += 1
+                raise SchedulerQueueFull(f"Session {session_id} already has {len(queue)} queued generation(s)")
+            queue.append(task)
+            self._stats['submitted'] += 1
+            self._stats['max_queue_depth'] = max(self._stats['max_queue_depth'], self._queue_depth())
+            self._cond.notify()
+        return task.future
+
+    def _next_task(self):
+        """가장 높은 우선순위에서 맨 앞 세션의 작업 하나를 꺼내고, 남은 작업이 있으면 그 세션을 맨 뒤로 보냄"""
+        for priority in PRIORITIES:
+            sessions = self._queues[priority]
+            if not sessions:
+                continue
+            session_id, queue = next(iter(sessions.items()))
+            task = queue.popleft()
+            if queue:
+                sessions.move_to_end(session_id)
+            else:
+                del sessions[session_id]
+            return task
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                task = self._next_task()
+                while task is None:
+                    if self._shutdown:
+                        return
+                    self._cond.wait()
+                    task = self._next_task()
+                if not task.future.set_running_or_notify_cancel():
+                    self._stats['cancelled'] += 1
+                    continue
+                wait_seconds = time.monotonic() - task.enqueued_at
+                self._stats['total_wait_seconds'] += wait_seconds
+                self._stats['max_wait_seconds'] = max(self._stats['max_wait_seconds'], wait_seconds)
+                self._running += 1
+
+            try:
+                result = task.fn(*task.args, **task.kwargs)
+            except BaseException as e:
+                task.future.set_exception(e)
+                succeeded = False
+            else:
+                task.future.set_result(result)
+                succeeded = True
+
+            with self._cond:
+                self._running -= 1
+                self._stats['completed' if succeeded else 'failed'] += 1
+
+    def metrics(self) -> dict:
+        """큐 깊이와 누적 통계"""
+        with self._cond:
+            dispatched = self._stats['completed'] + self._stats['failed'] + self._running
+            return {
+                'running': self._running,
+                'max_concurrency': self.max_concurrency,
+                'queue_depth': self._queue_depth(),
+                'queue_depth_by_priority': {
+                    p: sum(len(q) for q in sessions.values()) for p, sessions in self._queues.items()
+                },
+                'waiting_sessions': len({s for sessions in self._queues.values() for s in sessions}),
+                'avg_wait_seconds': self._stats['total_wait_seconds'] / dispatched if dispatched else 0.0,
+                **self._stats,
+            }
+
+    def shutdown(self, wait: bool = True):
+        """대기 중인 작업은 취소하고 워커를 종료"""
+        with self._cond:
+            self._shutdown = True
+            for sessions in self._queues.values():
+                for queue in sessions.values():
+                    for task in queue:
+                        task.future.cancel()
+                        self._stats['cancelled'] += 1
+                sessions.clear()
+            self._cond.notify_all()
+        if wait:
+            for worker in self._workers:
+                worker.join()
@@ -0,0 +1,286 @@
+# server.py
+# Streamlit 없이 misconception 예측 / 유사 문제 생성 / 정답 검증을 JSON HTTP API로 제공하는 서버 (표준 라이브러리 기반)
+#
+# 실행: python -m src.server --port 8000 --workers 8
+#
+# POST /predict        {"question_id": 0, "wrong_answer": "B"}
+# POST /generate       {"construct_name": ..., "subject_name": ..., "question_text": ...,
+#                       "correct_answer_text": ..., "wrong_answer_text": ..., "misconception_id": 1672}
+# POST /verify         {"question": ..., "choices": {"A": ..., "B": ..., "C": ..., "D": ...}}
+# POST /batch/<name>   {"items": [<위 요청 본문>, ...]}
+# GET  /health, GET /metrics
+# 모든 POST 본문에는 선택적으로 "timeout"(초)을 넣을 수 있습니다.
+import argparse
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
+from dataclasses import asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional
+
+from src.config import MAX_VERIFY_SAMPLES
+from src.rate_limiter import get_rate_limiter
+from src.resilience import api_callers
+
+logger = logging.getLogger(__name__)
+
+base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+data_path = os.path.join(base_path, 'Data')
+
+DEFAULT_TIMEOUT_SECONDS = 30.0
+# /generate의 생성 한도는 요청 timeout보다 이만큼 짧게 잡아, 바깥 대기(run_one)가 끝나기 전에 문제 은행 대체 문제를 돌려줌
+GENERATE_DEADLINE_SLACK_SECONDS = 1.0
+MAX_BATCH_SIZE = 64
+
+
+class RequestError(Exception):
+    """클라이언트 요청 오류 (HTTP 상태 코드 포함)"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class Services:
+    """
+    서버 프로세스가 시작될 때 한 번만 로드되는 모델/데이터 묶음.
+    모든 요청 스레드가 공유합니다.
+    """
+
+    def __init__(self, train_csv_path: str, misconception_csv_path: str):
+        # 무거운 모듈은 서버 프로세스에서만 import
+        from src.FisrtModule.module1 import MisconceptionPredictor
+        from src.question_bank import QuestionBank
+        from src.SecondModule.budgeted_generator import BudgetedQuestionGenerator
+        from src.SecondModule.module2 import SimilarQuestionGenerator
+        from src.ThirdModule.module3_current import AnswerVerifier
+
+        self.bank = QuestionBank.from_csv(train_csv_path)
+        self.predictor = MisconceptionPredictor(misconception_csv_path=misconception_csv_path)
+        self.generator = SimilarQuestionGenerator(misconception_csv_path=misconception_csv_path)
+        self.budgeted_generator = BudgetedQuestionGenerator(self.generator, self.bank)
+        self.verifier = AnswerVerifier()
+
+    def predict(self, body: dict, timeout: float) -> dict:
+        position = self.bank.position_of(_require_int(body, 'question_id'))
+        if position is None:
+            raise RequestError(404, f"Unknown question_id: {body['question_id']}")
+        wrong_answer = str(_require(body, 'wrong_answer')).upper()
+        if wrong_answer not in ('A', 'B', 'C', 'D'):
+            raise RequestError(400, "wrong_answer must be one of A, B, C, D")
+
+        row = self.bank.row(position)
+        misconception_id, misconception_text = self.predictor.predict_misconception(
+            construct_name=row['ConstructName'],
+            subject_name=row['SubjectName'],
+            question_text=row['QuestionText'],
+            correct_answer_text=row[f"Answer{row['CorrectAnswer']}Text"],
+            wrong_answer_text=row[f'Answer{wrong_answer}Text'],
+            wrong_answer=wrong_answer,
+            row=row,
+        )
+        return {'misconception_id': misconception_id, 'misconception_text': misconception_text}
+
+    def generate(self, body: dict, timeout: float) -> dict:
+        generated_question, source = self.budgeted_generator.generate(
+            construct_name=str(body.get('construct_name', '')),
+            subject_name=str(body.get('subject_name', '')),
+            question_text=str(_require(body, 'question_text')),
+            correct_answer_text=str(body.get('correct_answer_text', '')),
+            wrong_answer_text=str(body.get('wrong_answer_text', '')),
+            misconception_id=_require_int(body, 'misconception_id'),
+            exclude_question_id=_require_int(body, 'question_id') if body.get('question_id') is not None else None,
+            deadline_seconds=generation_deadline(timeout),
+            session_id=str(body.get('session_id', 'http')),
+        )
+        if generated_question is None:
+            raise RequestError(503, "Could not generate a similar question.")
+        return {'question': asdict(generated_question), 'source': source}
+
+    def verify(self, body: dict, timeout: float) -> dict:
+        choices = _require(body, 'choices')
+        if not isinstance(choices, dict) or any(option not in choices for option in ('A', 'B', 'C', 'D')):
+            raise RequestError(400, "choices must contain A, B, C and D")
+        samples = _require_int(body, 'samples') if 'samples' in body else 1
+        if not 1 <= samples <= MAX_VERIFY_SAMPLES:
+            raise RequestError(400, f"samples must be between 1 and {MAX_VERIFY_SAMPLES}")
+        if samples > 1:
+            # self-consistency: 샘플 요청을 동시에 보내 다수결, 득표 분포도 함께 반환
+            answer, votes = self.verifier.verify_answer_votes(str(_require(body, 'question')), choices, samples)
+            return {'answer': answer, 'votes': votes}
+        answer = self.verifier.verify_answer(str(_require(body, 'question')), choices)
+        return {'answer': answer}
+
+
+def generation_deadline(timeout: float) -> float:
+    """요청 timeout 안에서 생성에 쓸 시간. 짧은 timeout에서는 절반만 여유로 남김"""
+    return max(0.0, timeout - min(GENERATE_DEADLINE_SLACK_SECONDS, timeout / 2))
+
+
+def _require(body: dict, key: str):
+    if key not in body:
+        raise RequestError(400, f"Missing field: {key}")
+    return body[key]
+
+
+def _require_int(body: dict, key: str) -> int:
+    """정수 필드. 숫자가 아니면 500 대신 400"""
+    value = _require(body, key)
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise RequestError(400, f"{key} must be an integer")
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise RequestError(400, f"{key} must be an integer")
+
+
+class InferenceServer(ThreadingHTTPServer):
+    """HTTP 요청은 연결마다 스레드에서 받고, 실제 추론은 고정 크기 worker pool에서 실행"""
+
+    daemon_threads = True
+
+    def __init__(self, address, services: Services, workers: int = 8,
+                 default_timeout: float = DEFAULT_TIMEOUT_SECONDS):
+        super().__init__(address, RequestHandler)
+        self.services = services
+        self.default_timeout = default_timeout
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='inference')
+        self.endpoints: Dict[str, Callable[[dict, float], dict]] = {
+            'predict': services.predict,
+            'generate': services.generate,
+            'verify': services.verify,
+        }
+        self._stats_lock = threading.Lock()
+        self.stats = {'requests': 0, 'errors': 0, 'timeouts': 0}
+
+    def count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def run_one(self, name: str, body: dict, timeout: float) -> dict:
+        future = self.pool.submit(self.endpoints[name], body, timeout)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            self.count('timeouts')
+            raise RequestError(504, f"{name} timed out after {timeout}s")
+
+    def run_batch(self, name: str, items: list, timeout: float) -> list:
+        """배치 항목을 worker pool에 한 번에 올리고, 전체 timeout 안에 끝난 결과만 모아 항목별로 반환"""
+        futures = [self.pool.submit(self.endpoints[name], item, timeout) for item in items]
+        wait(futures, timeout=timeout)
+        results = []
+        for future in futures:
+            if not future.done():
+                future.cancel()
+                self.count('timeouts')
+                results.append({'error': 'timeout', 'status': 504})
+                continue
+            try:
+                results.append({'result': future.result(), 'status': 200})
+            except RequestError as e:
+                results.append({'error': str(e), 'status': e.status})
+            except Exception as e:
+                logger.error(f"Batch item failed in {name}: {e}")
+                results.append({'error': str(e), 'status': 500})
+        return results
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    server: InferenceServer
+
+    def _send_json(self, status: int, payload: dict):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_body(self) -> dict:
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            raise RequestError(400, "Request body must be JSON.")
+        if not isinstance(body, dict):
+            raise RequestError(400, "Request body must be a JSON object.")
+        return body
+
+    def _timeout(self, body: dict) -> float:
+        try:
+            return float(body.get('timeout', self.server.default_timeout))
+        except (TypeError, ValueError):
+            raise RequestError(400, "timeout must be a number of seconds")
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send_json(200, {'status': 'ok'})
+        elif self.path == '/metrics':
+            self._send_json(200, {
+                'server': dict(self.server.stats),
+                'scheduler': self.server.services.budgeted_generator.scheduler.metrics(),
+                'api_usage': get_rate_limiter().usage_report(),
+                'api_resilience': {caller.name: caller.metrics() for caller in api_callers()},
+            })
+        else:
+            self._send_json(404, {'error': f"Unknown path: {self.path}"})
+
+    def do_POST(self):
+        self.server.count('requests')
+        parts = self.path.strip('/').split('/')
+        try:
+            body = self._read_body()
+            timeout = self._timeout(body)
+            if len(parts) == 1 and parts[0] in self.server.endpoints:
+                self._send_json(200, self.server.run_one(parts[0], body, timeout))
+            elif len(parts) == 2 and parts[0] == 'batch' and parts[1] in self.server.endpoints:
+                items = body.get('items')
+                if not isinstance(items, list) or not items:
+                    raise RequestError(400, "items must be a non-empty list")
+                if len(items) > MAX_BATCH_SIZE:
+                    raise RequestError(413, f"Batch size exceeds {MAX_BATCH_SIZE}")
+                self._send_json(200, {'results': self.server.run_batch(parts[1], items, timeout)})
+            else:
+                raise RequestError(404, f"Unknown path: {self.path}")
+        except RequestError as e:
+            self.server.count('errors')
+            self._send_json(e.status, {'error': str(e)})
+        except Exception as e:
+            self.server.count('errors')
+            logger.error(f"Unhandled error for {self.path}: {e}")
+            self._send_json(500, {'error': str(e)})
+
+    def log_message(self, format, *args):
+        logger.info(f"{self.address_string()} - {format % args}")
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description="MisconcepTutor inference API server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT_SECONDS, help="기본 요청 timeout(초)")
+    parser.add_argument('--train-csv', default=os.path.join(data_path, 'train.csv'))
+    parser.add_argument('--misconception-csv', default=os.path.join(data_path, 'misconception_mapping.csv'))
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    logger.info("Loading models and data...")
+    services = Services(args.train_csv, args.misconception_csv)
+    server = InferenceServer((args.host, args.port), services, workers=args.workers, default_timeout=args.timeout)
+    logger.info(f"Serving on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.pool.shutdown(wait=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+# session_store.py
+# 퀴즈 진행 상태(st.session_state)를 프로세스 밖에 저장해서, 재시작하거나 다른 replica로 다시 연결돼도
+# 같은 세션 id(?sid=...)로 이어서 풀 수 있게 합니다.
+# 저장소는 SQLite(기본)와 파일(JSON) 두 가지이며, 같은 인터페이스로 다른 저장소(Redis 등)를 붙일 수 있습니다.
+import atexit
+import json
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Dict, MutableMapping, Optional
+
+from src.config import SESSION_STORE, SESSION_STORE_PATH, SESSION_WRITE_INTERVAL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+STORE_SQLITE = 'sqlite'
+STORE_FILE = 'file'
+STORE_NONE = 'none'
+SESSION_STORES = (STORE_SQLITE, STORE_FILE, STORE_NONE)
+
+# 저장하는 세션 상태. 문제 본문은 문제 은행에 있으므로 행 위치와 고른 선지만 저장해 스냅샷이 작음
+PERSISTED_KEYS = (
+    'session_id',
+    'current_step',
+    'questions',
+    'current_question_index',
+    'wrong_questions',
+    'misconceptions',
+)
+# 틀린 문제별 유사 문제 상태 (show_similar_question_{i}, similar_question_{i} 등)
+_PERSISTED_KEY_PATTERN = re.compile(r"^(?:show_similar_question|similar_question_answered|selected_answer|similar_question)_\d+$")
+
+_SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def is_valid_session_id(session_id: Optional[str]) -> bool:
+    """URL로 들어오는 값이므로 파일 이름/키로 써도 안전한 형식만 허용"""
+    return bool(session_id) and bool(_SESSION_ID_PATTERN.match(session_id))
+
+
+def snapshot_state(session_state: MutableMapping) -> Dict[str, object]:
+    """세션 상태에서 저장할 키만 골라 JSON으로 직렬화 가능한 dict로 만듦"""
+    snapshot = {}
+    for key in list(session_state.keys()):
+        if key in PERSISTED_KEYS or _PERSISTED_KEY_PATTERN.match(str(key)):
+            snapshot[str(key)] = session_state[key]
+    return snapshot
+
+
+def restore_state(session_state: MutableMapping, snapshot: Dict[str, object]):
+    """snapshot_state의 결과를 세션 상태에 되돌림 (JSON에서 리스트가 된 (위치, 선지) 튜플 복원)"""
+    for key, value in snapshot.items():
+        if key == 'wrong_questions':
+            value = [tuple(item) for item in value]
+        session_state[key] = value
+
+
+class SessionStore:
+    """세션 id별 스냅샷(dict) 저장소 인터페이스"""
+
+    def load(self, session_id: str) -> Optional[Dict[str, object]]:
+        raise NotImplementedError
+
+    def save_many(self, snapshots: Dict[str, Dict[str, object]]):
+        raise NotImplementedError
+
+    def delete(self, session_id: str):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    세션 하나가 한 행. replica들이 같은 파일(공유 볼륨)을 보면 세션을 공유합니다.
+    WAL 모드라 한 replica가 쓰는 동안 다른 replica의 읽기가 막히지 않습니다.
+    """
+
+    def __init__(self, path: str):
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            if path != ':memory:':
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, state TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def load(self, session_id: str) -> Optional[Dict[str, object]]:
+        with self._lock:
+            row = self._conn.execute("SELECT state FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_many(self, snapshots: Dict[str, Dict[str, object]]):
+        now = time.time()
+        rows = [(session_id, json.dumps(snapshot, separators=(',', ':')), now) for session_id, snapshot in snapshots.items()]
+        # 모아 둔 스냅샷을 트랜잭션 한 번으로 씀
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO sessions (session_id, state, updated_at) VALUES (?, ?, ?)", rows)
+
+    def delete(self, session_id: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class FileSessionStore(SessionStore):
+    """세션마다 JSON 파일 하나. 임시 파일에 쓴 뒤 이름을 바꿔서 읽는 쪽이 반쯤 쓰인 파일을 보지 않음"""
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+
+    def _path(self, session_id: str) -> str:
+        return os.path.join(self.directory, f"{session_id}.json")
+
+    def load(self, session_id: str) -> Optional[Dict[str, object]]:
+        try:
+            with open(self._path(session_id), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read session snapshot {session_id}: {e}")
+            return None
+
+    def save_many(self, snapshots: Dict[str, Dict[str, object]]):
+        for session_id, snapshot in snapshots.items():
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(snapshot, f, separators=(',', ':'))
+                os.replace(tmp_path, self._path(session_id))
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+    def delete(self, session_id: str):
+        try:
+            os.remove(self._path(session_id))
+        except FileNotFoundError:
+            pass
+
+
+class CoalescingSessionWriter:
+    """
+    스냅샷 쓰기를 모아서 처리합니다. save()는 세션별 최신 스냅샷만 메모리에 남기고 바로 반환하며,
+    백그라운드 스레드가 flush_interval마다 바뀐 세션만 한 번에 씁니다. 한 구간 안에서 여러 번 바뀐 세션은 마지막 상태만 쓰입니다.
+    load()는 아직 쓰이지 않은 스냅샷이 있으면 그것을 먼저 돌려줍니다.
+    """
+
+    def __init__(self, store: SessionStore, flush_interval: float = SESSION_WRITE_INTERVAL_SECONDS):
+        self.store = store
+        self.flush_interval = flush_interval
+        self._pending: Dict[str, Dict[str, object]] = {}
+        # 마지막으로 쓴 스냅샷의 직렬화 결과. 바뀌지 않은 rerun은 쓰지 않음
+        self._written: Dict[str, str] = {}
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self.stats = {'saves': 0, 'unchanged': 0, 'writes': 0, 'flushes': 0, 'errors': 0}
+        self._worker = threading.Thread(target=self._run, name='session-writer', daemon=True)
+        self._worker.start()
+
+    def load(self, session_id: str) -> Optional[Dict[str, object]]:
+        with self._cond:
+            pending = self._pending.get(session_id)
+        if pending is not None:
+            return pending
+        snapshot = self.store.load(session_id)
+        if snapshot is not None:
+            with self._cond:
+                self._written[session_id] = json.dumps(snapshot, sort_keys=True)
+        return snapshot
+
+    def save(self, session_id: str, snapshot: Dict[str, object]):
+        serialized = json.dumps(snapshot, sort_keys=True)
+        with self._cond:
+            self.stats['saves'] += 1
+            if self._written.get(session_id) == serialized and session_id not in self._pending:
+                self.stats['unchanged'] += 1
+                return
+            self._pending[session_id] = json.loads(serialized)
+            self._cond.notify()
+
+    def delete(self, session_id: str):
+        # 진행 중인 flush가 이미 꺼내 간 스냅샷을 지운 뒤에 다시 쓰지 않도록 flush가 끝나기를 기다렸다가 지움
+        with self._flush_lock:
+            with self._cond:
+                self._pending.pop(session_id, None)
+                self._written.pop(session_id, None)
+            self.store.delete(session_id)
+
+    def flush(self):
+        with self._flush_lock:
+            with self._cond:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return
+            try:
+                self.store.save_many(batch)
+            except Exception as e:
+                logger.error(f"Failed to write {len(batch)} session snapshot(s): {e}")
+                with self._cond:
+                    self.stats['errors'] += 1
+                    # 실패한 스냅샷은 더 새로운 스냅샷이 없을 때만 다시 쓰도록 되돌림
+                    for session_id, snapshot in batch.items():
+                        self._pending.setdefault(session_id, snapshot)
+                return
+            with self._cond:
+                for session_id, snapshot in batch.items():
+                    self._written[session_id] = json.dumps(snapshot, sort_keys=True)
+                self.stats['writes'] += len(batch)
+                self.stats['flushes'] += 1
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+            # 쓰기를 모으기 위해 잠시 기다렸다가 한 번에 씀
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self.flush()
+        self.store.close()
+
+    def metrics(self) -> dict:
+        with self._cond:
+            return dict(self.stats, pending=len(self._pending))
+
+
+def create_session_store(kind: str = SESSION_STORE, path: str = SESSION_STORE_PATH) -> Optional[SessionStore]:
+    """SESSION_STORE 설정에 맞는 저장소. 'none'이면 None (기존처럼 프로세스 안에서만 유지)"""
+    if kind == STORE_SQLITE:
+        return SQLiteSessionStore(path)
+    if kind == STORE_FILE:
+        return FileSessionStore(path)
+    if kind == STORE_NONE:
+        return None
+    raise ValueError(f"Unknown session store '{kind}'. Expected one of {SESSION_STORES}")
+
+
+_shared_writer: Optional[CoalescingSessionWriter] = None
+_shared_lock = threading.Lock()
+
+
+def get_session_writer() -> Optional[CoalescingSessionWriter]:
+    """프로세스 안에서 공유하는 세션 저장소 writer (SESSION_STORE가 'none'이면 None). 종료 시 남은 스냅샷을 씀"""
+    global _shared_writer
+    with _shared_lock:
+        if _shared_writer is None:
+            store = create_session_store()
+            if store is None:
+                return None
+            _shared_writer = CoalescingSessionWriter(store)
+            atexit.register(_shared_writer.close)
+        return _shared_writer
@@ -0,0 +1,74 @@
+# singleflight.py
+# 같은 요청이 동시에 여러 번 들어오면 상위 호출은 한 번만 하고, 기다리던 호출들이 그 결과(또는 예외)를 함께 받게 합니다.
+import hashlib
+import json
+import re
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    key별로 진행 중인 호출을 하나만 유지합니다.
+    먼저 들어온 호출(leader)이 fn을 실행하고, 같은 key로 들어온 나머지는 끝날 때까지 기다렸다가 같은 결과를 받습니다.
+    leader에서 예외가 나면(취소 포함) 기다리던 호출에도 같은 예외가 전달됩니다.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.stats = {'calls': 0, 'coalesced': 0}
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """
+        timeout은 기다리는 쪽에만 적용됩니다. 시간이 지나면 TimeoutError가 나지만 leader의 호출은 계속 진행됩니다.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self.stats['calls'] += 1
+            else:
+                call.waiters += 1
+                self.stats['coalesced'] += 1
+
+        if not leader:
+            if not call.event.wait(timeout):
+                raise TimeoutError(f"Timed out after {timeout}s waiting for in-flight call")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+def request_key(prompt: str, parameters: Optional[dict] = None) -> str:
+    """공백 차이를 무시한 프롬프트와 생성 파라미터로 요청 key 생성"""
+    normalized_prompt = re.sub(r"\s+", " ", prompt).strip()
+    payload = json.dumps({'prompt': normalized_prompt, 'parameters': parameters or {}}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
@@ -0,0 +1,79 @@
+# test_server.py
+# /generate가 요청 timeout 안에 생성이 끝나지 않으면 504가 아니라 문제 은행 대체 문제(200)를 돌려주는지 확인
+import json
+import threading
+import time
+import unittest
+import urllib.request
+
+from src.scheduler import GenerationScheduler
+from src.SecondModule.budgeted_generator import SOURCE_BANK, BudgetedQuestionGenerator
+from src.server import InferenceServer, Services
+
+
+class SlowGenerator:
+    """요청 timeout보다 오래 걸리는 생성기"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def generate_similar_question_with_text(self, **kwargs):
+        time.sleep(self.delay)
+        return None, ''
+
+
+class StubBank:
+    """misconception 1672를 가진 문제 하나만 있는 문제 은행"""
+
+    _ROW = {
+        'QuestionText': 'What is 1/2 + 1/4?',
+        'AnswerAText': '3/4', 'AnswerBText': '2/6', 'AnswerCText': '1/6', 'AnswerDText': '2/4',
+        'CorrectAnswer': 'A',
+    }
+
+    def questions_for_misconception(self, misconception_id: int):
+        return [(7, 'B')] if misconception_id == 1672 else []
+
+    def position_of(self, question_id: int):
+        return 0 if question_id == 7 else None
+
+    def row(self, position: int):
+        return self._ROW
+
+
+class GenerateTimeoutTest(unittest.TestCase):
+    def setUp(self):
+        services = Services.__new__(Services)
+        services.budgeted_generator = BudgetedQuestionGenerator(
+            SlowGenerator(delay=5.0), StubBank(), scheduler=GenerationScheduler(max_concurrency=1, name='test'),
+        )
+        self.server = InferenceServer(('127.0.0.1', 0), services, workers=2)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.server.pool.shutdown(wait=False)
+
+    def test_slow_generation_falls_back_to_bank(self):
+        body = json.dumps({
+            'question_text': 'What is 1/3 + 1/6?',
+            'misconception_id': 1672,
+            'timeout': 1.0,
+        }).encode('utf-8')
+        request = urllib.request.Request(
+            f"http://127.0.0.1:{self.server.server_address[1]}/generate",
+            data=body, headers={'Content-Type': 'application/json'},
+        )
+        with urllib.request.urlopen(request, timeout=5) as response:
+            status = response.status
+            payload = json.loads(response.read())
+
+        self.assertEqual(status, 200)
+        self.assertEqual(payload['source'], SOURCE_BANK)
+        self.assertEqual(payload['question']['question'], StubBank._ROW['QuestionText'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,6 +2,7 @@ import requests
 import json
 from dotenv import load_dotenv
 import os
+from src.rate_limiter import estimate_tokens, get_rate_limiter
 
 # .env 파일 로드
 load_dotenv()
@@ -13,15 +14,22 @@ API_KEY = os.getenv("HUGGINGFACE_API_KEY")
 # 프롬프트 설정
 prompt = "Explain the concept of gravitational force."
 
-# API 요청
+# API 요청 (다른 모듈과 같은 rate limiter를 거침)
 headers = {"Authorization": f"Bearer {API_KEY}"}
 data = {"inputs": prompt}
 
+limiter = get_rate_limiter()
+prompt_tokens = estimate_tokens(prompt)
+limiter.acquire(prompt_tokens, caller="trying")
 response = requests.post(API_URL, headers=headers, json=data)
 
 # 결과 출력
 if response.status_code == 200:
     result = response.json()
+    generated_text = result[0].get("generated_text", "") if isinstance(result, list) and result else ""
+    limiter.record_usage("trying", prompt_tokens, estimate_tokens(generated_text), prompt_tokens)
     print("Response:", result)
 else:
     print(f"Error: {response.status_code}, {response.text}")
+
+print("Usage:", json.dumps(limiter.usage_report(), indent=2))